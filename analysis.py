@@ -1,11 +1,33 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 import io
 import csv
 from datetime import datetime, timezone, timedelta
 import json
 
+from instrument import instrumented
+from records import EMPTY_PLAYER, is_records, parse_battle_time
+import user_store
 
+
+def _is_columnar(data) -> bool:
+    """True for `columnar` tables and slices (memory-mapped column views)."""
+    return hasattr(data, "column")
+
+
+@instrumented("analysis")
 def compute_win_rate(battlelog: List[Dict]) -> float:
+    if _is_columnar(battlelog):
+        pvp = battlelog["pvp"]
+        total = int(pvp.sum())
+        wins = int(((battlelog["team_crowns"] > battlelog["opp_crowns"]) & pvp).sum())
+        return wins / total if total > 0 else 0.0
+    if is_records(battlelog):
+        total = wins = 0
+        for battle in battlelog:
+            if battle.type == "PvP" and battle.team is not EMPTY_PLAYER and battle.opponent is not EMPTY_PLAYER:
+                total += 1
+                wins += battle.team.crowns > battle.opponent.crowns
+        return wins / total if total > 0 else 0.0
     if not battlelog:
         return 0.0
     wins = 0
@@ -23,6 +45,7 @@ def compute_win_rate(battlelog: List[Dict]) -> float:
     return wins / total if total > 0 else 0.0
 
 
+@instrumented("analysis")
 def compute_deck_rating(deck: List[str], card_data: List[Dict]) -> Dict:
     """Compute average elixir and a simple score with tips."""
     cost_lookup = {c["name"].lower(): c.get("elixirCost", 0) for c in card_data}
@@ -36,16 +59,39 @@ def compute_deck_rating(deck: List[str], card_data: List[Dict]) -> Dict:
         count += 1
     avg = total / count if count else 0
     score = max(0.0, min(100.0, 100 - abs(avg - 3.5) * 20))
-    tips = []
+    return {"average_elixir": avg, "score": score, "tips": deck_tips(avg)}
+
+
+def deck_tips(avg: float) -> List[str]:
+    """Tips for a deck with average elixir `avg`."""
     if avg > 4.5:
-        tips.append("Deck is heavy; consider cheaper cards.")
-    elif avg < 3:
-        tips.append("Deck may lack win conditions; add a heavier card.")
-    return {"average_elixir": avg, "score": score, "tips": tips}
+        return ["Deck is heavy; consider cheaper cards."]
+    if avg < 3:
+        return ["Deck may lack win conditions; add a heavier card."]
+    return []
 
 
+@instrumented("analysis")
 def detect_tilt(battlelog: List[Dict], limit: int = 3, minutes: int = 15) -> bool:
     """Return True if the last `limit` battles are losses within `minutes`."""
+    if _is_columnar(battlelog):
+        # oldest first: the newest PvP battles are the last pvp rows
+        rows = battlelog["pvp"].nonzero()[0][-limit:]
+        if len(rows) < limit or (battlelog["team_crowns"][rows] > battlelog["opp_crowns"][rows]).any():
+            return False
+        times = battlelog["time"][rows]
+        return int(times[-1] - times[0]) <= minutes * 60
+    if is_records(battlelog):
+        losses = []
+        for battle in battlelog:
+            if battle.type != "PvP" or battle.team is EMPTY_PLAYER or battle.opponent is EMPTY_PLAYER:
+                continue
+            if not battle.time or battle.team.crowns > battle.opponent.crowns:
+                break
+            losses.append(battle.time)
+            if len(losses) >= limit:
+                return losses[0] - battle.time <= minutes * 60
+        return False
     consecutive = 0
     first_time = None
     for battle in battlelog:
@@ -104,6 +150,7 @@ def classify_card(name: str) -> Dict[str, bool]:
     }
 
 
+@instrumented("analysis")
 def analyze_cycle(plays: List[Dict[str, str]], window: int = 4) -> Dict[str, bool]:
     """Check if at any point the player lacks a role in a hand-sized window."""
     hand: List[str] = []
@@ -129,6 +176,7 @@ def analyze_cycle(plays: List[Dict[str, str]], window: int = 4) -> Dict[str, boo
     return {k: not v for k, v in issues.items()}
 
 
+@instrumented("analysis")
 def aggro_meter(events: List[Dict], seconds: int = 60) -> float:
     """Return ratio of elixir spent by player vs opponent in first `seconds`."""
     player = 0.0
@@ -145,62 +193,89 @@ def aggro_meter(events: List[Dict], seconds: int = 60) -> float:
     return player / opp if opp > 0 else float("inf")
 
 
-def classify_playstyle(deck: List[str]) -> str:
-    """Return a simple playstyle category."""
-    avg_cost = 0
+def classify_playstyle(deck: List, card_data: Optional[List[Dict]] = None) -> str:
+    """Return a simple playstyle category.
+
+    `deck` holds card names or API card dicts. Elixir costs come from
+    `card_data` (as for `compute_deck_rating`) or an `elixirCost` in the
+    card dicts; without any known cost the elixir-based styles (Cycle,
+    Beatdown) are not assigned.
+    """
+    cost_lookup = {c["name"].lower(): c.get("elixirCost", 0) for c in card_data or ()}
     spells = buildings = wincon = 0
+    total = known = 0
     for card in deck:
-        c = card.lower()
+        cost = None
+        if isinstance(card, dict):
+            cost = card.get("elixirCost")
+            card = card.get("name", "")
+        c = card.strip().lower()
         if c in SPELLS:
             spells += 1
         if "building" in c:
             buildings += 1
         if c in WIN_CONDITIONS:
             wincon += 1
-        avg_cost += 1
-    avg_cost = avg_cost / len(deck) if deck else 0
+        cost = cost_lookup.get(c, cost)
+        if cost is not None:
+            total += cost
+            known += 1
+    avg_cost = total / known if known else None
     if buildings > 0 and wincon <= 1:
         return "Siege"
-    if avg_cost <= 3.0:
+    if avg_cost is not None and avg_cost <= 3.0:
         return "Cycle"
     if spells >= 3:
         return "Control"
-    if avg_cost >= 4.0:
+    if avg_cost is not None and avg_cost >= 4.0:
         return "Beatdown"
     return "Bait"
 
 # --- Event tracker utilities ---
 
-def collect_event_stats(battlelog: List[Dict], path: str = "event_stats.json") -> List[Dict]:
-    """Collect win/loss counts for non-ranked modes and persist to JSON."""
-    stats: Dict[str, Dict] = {}
+def _event_battles(battlelog):
+    """Yield (event id, won, deck, battleTime) for the non-ranked battles (API dicts or records)."""
+    if is_records(battlelog):
+        for battle in battlelog:
+            if battle.type != "PvP" and battle.type != "ranked":
+                yield battle.event_key, battle.won, battle.team.deck.cards, battle.battle_time
+        return
     for battle in battlelog:
         if battle.get("type") == "PvP" or battle.get("type") == "ranked":
             continue
         event = battle.get("eventMode", {})
-        event_id = str(event.get("id", event.get("name", "unknown")))
         team = battle.get("team", [{}])[0]
         opp = battle.get("opponent", [{}])[0]
-        won = team.get("crowns", 0) > opp.get("crowns", 0)
-        entry = stats.setdefault(
-            event_id,
-            {
-                "event_id": event_id,
-                "wins": 0,
-                "losses": 0,
-                "deck": [c.get("name") for c in team.get("cards", [])],
-                "date": battle.get("battleTime"),
-            },
+        yield (
+            str(event.get("id", event.get("name", "unknown"))),
+            team.get("crowns", 0) > opp.get("crowns", 0),
+            [c.get("name") for c in team.get("cards", [])],
+            battle.get("battleTime"),
         )
-        if won:
-            entry["wins"] += 1
-        else:
-            entry["losses"] += 1
-        entry["date"] = battle.get("battleTime")
+
+
+@instrumented("analysis")
+def collect_event_stats(
+    battlelog: List[Dict], path: str = "event_stats.json", user: Optional[str] = None
+) -> List[Dict]:
+    """Collect win/loss counts for non-ranked modes and persist them.
+
+    With `user` they are stored in that user's `user_store` rows instead of the shared JSON file.
+    """
+    stats: Dict[str, Dict] = {}
+    for event_id, won, deck, played in _event_battles(battlelog):
+        entry = stats.get(event_id)
+        if entry is None:
+            entry = stats[event_id] = {"event_id": event_id, "wins": 0, "losses": 0, "deck": list(deck)}
+        entry["wins" if won else "losses"] += 1
+        entry["date"] = played
     for entry in stats.values():
         total = entry["wins"] + entry["losses"]
         entry["WR"] = entry["wins"] / total if total else 0
     results = list(stats.values())
+    if user is not None:
+        user_store.save_event_stats(user, results)
+        return results
     try:
         with open(path, "w") as fh:
             json.dump(results, fh)
@@ -209,27 +284,17 @@ def collect_event_stats(battlelog: List[Dict], path: str = "event_stats.json") -
     return results
 
 
+@instrumented("analysis")
 def daily_event_wr(battlelog: List[Dict], days: int = 30) -> List[Dict]:
     """Return daily win rate for events in the last `days`."""
-    start = datetime.now(timezone.utc) - timedelta(days=days)
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).timestamp()
     by_date: Dict[str, Dict[str, int]] = {}
-    for battle in battlelog:
-        if battle.get("type") == "PvP" or battle.get("type") == "ranked":
+    for _, won, _, played in _event_battles(battlelog):
+        ts = parse_battle_time(played)
+        if not ts or ts < cutoff:
             continue
-        ts_str = battle.get("battleTime")
-        try:
-            ts = datetime.strptime(ts_str, "%Y%m%dT%H%M%S.000Z").replace(tzinfo=timezone.utc)
-        except Exception:
-            continue
-        if ts < start:
-            continue
-        date_key = ts.date().isoformat()
-        team = battle.get("team", [{}])[0]
-        opp = battle.get("opponent", [{}])[0]
-        won = team.get("crowns", 0) > opp.get("crowns", 0)
-        rec = by_date.setdefault(date_key, {"wins": 0, "total": 0})
-        if won:
-            rec["wins"] += 1
+        rec = by_date.setdefault(f"{played[:4]}-{played[4:6]}-{played[6:8]}", {"wins": 0, "total": 0})
+        rec["wins"] += won
         rec["total"] += 1
     chart = []
     for date in sorted(by_date.keys()):
@@ -240,23 +305,32 @@ def daily_event_wr(battlelog: List[Dict], days: int = 30) -> List[Dict]:
 
 
 # --- Daily progress utilities ---
+@instrumented("analysis")
 def record_daily_progress(
     battlelog: List[Dict],
     trophies: int,
     league_rank: int,
     path: str = "progress.json",
+    user: Optional[str] = None,
 ) -> None:
-    """Append today's trophy count, league rank and win rate to the progress file."""
+    """Append today's trophy count, league rank and win rate to the progress file (or `user`'s store)."""
     today = datetime.now(timezone.utc).date().isoformat()
-    wr = compute_win_rate(
-        [b for b in battlelog if b.get("battleTime", "").startswith(today.replace("-", ""))]
-    )
+    if is_records(battlelog):
+        day = today.replace("-", "")
+        wr = compute_win_rate([b for b in battlelog if b.time and b.battle_time.startswith(day)])
+    else:
+        wr = compute_win_rate(
+            [b for b in battlelog if b.get("battleTime", "").startswith(today.replace("-", ""))]
+        )
     entry = {
         "date": today,
         "trophies": trophies,
         "league_rank": league_rank,
         "win_rate": wr,
     }
+    if user is not None:
+        user_store.record_progress(user, entry)
+        return
     try:
         with open(path) as fh:
             data = json.load(fh)
@@ -272,8 +346,11 @@ def record_daily_progress(
         pass
 
 
-def load_progress(path: str = "progress.json") -> List[Dict]:
+@instrumented("analysis")
+def load_progress(path: str = "progress.json", user: Optional[str] = None) -> List[Dict]:
     """Return list of recorded progress entries."""
+    if user is not None:
+        return user_store.load_progress(user)
     try:
         with open(path) as fh:
             return json.load(fh)
@@ -281,8 +358,11 @@ def load_progress(path: str = "progress.json") -> List[Dict]:
         return []
 
 
-def reset_progress(path: str = "progress.json") -> None:
+def reset_progress(path: str = "progress.json", user: Optional[str] = None) -> None:
     """Clear all recorded progress."""
+    if user is not None:
+        user_store.reset_progress(user)
+        return
     try:
         with open(path, "w") as fh:
             fh.write("[]")
@@ -315,6 +395,7 @@ def card_cycle_trainer(deck: List[str], plays: List[str]) -> List[List[str]]:
 
 ELIXIR_REGEN = 1 / 2.8
 
+@instrumented("analysis")
 def elixir_diff_timeline(events: List[Dict]) -> List[Dict]:
     """Return timeline of elixir difference (player - opponent)."""
     events = sorted(events, key=lambda e: e.get("time", 0))
@@ -333,4 +414,24 @@ def elixir_diff_timeline(events: List[Dict]) -> List[Dict]:
             opp -= spent
         timeline.append({"time": t, "diff": player - opp, "player": player, "opponent": opp})
         t_prev = t
-    return timeline
\ No newline at end of file
+    return timeline
+
+
+@instrumented("analysis")
+def elixir_leak(events: List[Dict]) -> float:
+    """Return seconds the player spent sitting at full elixir."""
+    events = sorted(events, key=lambda e: e.get("time", 0))
+    player = 5.0
+    t_prev = 0.0
+    leaked = 0.0
+    for e in events:
+        t = float(e.get("time", 0))
+        dt = t - t_prev
+        to_full = (10.0 - player) / ELIXIR_REGEN
+        if dt > to_full:
+            leaked += dt - to_full
+        player = min(10.0, player + dt * ELIXIR_REGEN)
+        if e.get("side") == "player":
+            player -= float(e.get("elixir", 0))
+        t_prev = t
+    return leaked
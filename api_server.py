@@ -0,0 +1,395 @@
+"""Headless JSON API over the analysis functions.
+
+A small asyncio HTTP/1.1 server (stdlib only) with keep-alive, gzip,
+a TTL response cache and coalescing of identical in-flight requests.
+Blocking upstream calls and analysis run in a thread pool so one process
+serves many clients concurrently.
+
+    python api_server.py --port 8080
+    curl localhost:8080/players/ABC123/summary
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from analysis import compute_deck_rating, compute_win_rate, detect_tilt, load_progress
+from clash_api import get_battlelog, get_cards, get_player
+from deck_optimizer import smart_swap, upgrade_optimizer
+from instrument import count, observe, render_prometheus
+from profiler import new_job_id, profile_job
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+}
+
+# Seconds a response stays cached, by route name.
+CACHE_TTL = {
+    "summary": 60,
+    "win_rate": 60,
+    "tilt": 60,
+    "benchmarks": 600,
+    "rating": 3600,
+    "rank": 3600,
+    "scouting": 600,
+    "progress": 10,
+}
+
+GZIP_MIN_BYTES = 512
+MAX_BODY_BYTES = 1 << 20
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _int_param(value, name: str, default: Optional[int], low: int = 1, high: Optional[int] = None) -> Optional[int]:
+    """Parse a client supplied integer, clamped to `high`; bad input is a 400."""
+    if value is None:
+        return default
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        raise HttpError(400, f"'{name}' must be an integer")
+    if n < low:
+        raise HttpError(400, f"'{name}' must be at least {low}")
+    return n if high is None else min(n, high)
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a per-entry TTL."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.data: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple):
+        entry = self.data.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            self.misses += 1
+            return None
+        self.data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: tuple, value, ttl: float) -> None:
+        self.data[key] = (value, time.monotonic() + ttl)
+        self.data.move_to_end(key)
+        while len(self.data) > self.max_entries:
+            self.data.popitem(last=False)
+
+
+def _top_players() -> list:
+    from meta import get_top_players
+
+    return get_top_players(limit=1000)
+
+
+class ApiServer:
+    """Routes requests to analysis functions; upstream fetchers are injectable for tests."""
+
+    def __init__(
+        self,
+        fetch_player: Callable[[str], dict] = get_player,
+        fetch_battlelog: Callable[[str], list] = get_battlelog,
+        fetch_cards: Callable[[], list] = get_cards,
+        fetch_top_players: Callable[[], list] = _top_players,
+        workers: int = 16,
+        matrix=None,
+    ):
+        self.fetch_player = fetch_player
+        self.fetch_battlelog = fetch_battlelog
+        self.fetch_cards = fetch_cards
+        self.fetch_top_players = fetch_top_players
+        self.matrix = matrix
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.cache = TTLCache()
+        self.inflight: Dict[tuple, asyncio.Future] = {}
+        self.requests = 0
+
+    # --- handlers (run in the thread pool) ---
+
+    def player_data(self, tag: str) -> Tuple[dict, list]:
+        return self.fetch_player(tag), self.fetch_battlelog(tag)
+
+    def summary(self, tag: str) -> Dict:
+        player, battles = self.player_data(tag)
+        return {
+            "tag": tag,
+            "name": player.get("name"),
+            "trophies": player.get("trophies", 0),
+            "league_rank": player.get("leagueRank", 0),
+            "win_rate": compute_win_rate(battles),
+            "tilt": detect_tilt(battles),
+        }
+
+    def win_rate(self, tag: str) -> Dict:
+        return {"tag": tag, "win_rate": compute_win_rate(self.fetch_battlelog(tag))}
+
+    def tilt(self, tag: str) -> Dict:
+        return {"tag": tag, "tilt": detect_tilt(self.fetch_battlelog(tag))}
+
+    def scouting(self, tag: str) -> Dict:
+        from scouting import faced_decks, opponent_tags, scout
+
+        player, battles = self.player_data(tag)
+        scouted = scout(opponent_tags(battles, limit=25), self.fetch_player, self.fetch_battlelog)
+        return {
+            "tag": tag,
+            "opponents": len(scouted),
+            "decks": faced_decks(scouted.values(), player.get("trophies", 0)),
+        }
+
+    def progress(self, tag: str) -> Dict:
+        return {"tag": tag, "progress": load_progress(user=tag)}
+
+    def rating(self, body: Dict) -> Dict:
+        cards = body.get("cards")
+        if not isinstance(cards, list) or not cards:
+            raise HttpError(400, "body must contain a non-empty 'cards' list")
+        return compute_deck_rating(cards, self.fetch_cards())
+
+    def rank(self, body: Dict) -> Dict:
+        from card_index import CardIndex
+        from deck_batch import PLAYSTYLES, deck_rating, encode_decks, rank_decks, rate_decks
+
+        decks = body.get("decks")
+        if not isinstance(decks, list) or not all(isinstance(d, list) for d in decks):
+            raise HttpError(400, "body must contain a 'decks' list of card name lists")
+        playstyle = body.get("playstyle")
+        if playstyle is not None and playstyle not in PLAYSTYLES:
+            raise HttpError(400, f"'playstyle' must be one of {', '.join(PLAYSTYLES)}")
+        cards = CardIndex()
+        ratings = rate_decks(encode_decks(decks, cards), self.fetch_cards(), cards)
+        top = rank_decks(ratings, playstyle=playstyle, limit=_int_param(body.get("limit"), "limit", 20, high=500))
+        return {"total": len(decks), "decks": [dict(deck_rating(ratings, i), cards=decks[i]) for i in top]}
+
+    def optimize(self, body: Dict) -> Dict:
+        cards = body.get("cards")
+        if not isinstance(cards, list) or not cards:
+            raise HttpError(400, "body must contain a non-empty 'cards' list")
+        card_data = self.fetch_cards()
+        pool = [c["name"] for c in card_data]
+        objective = body.get("objective", "score")
+        if objective == "meta":
+            from matchups import get_matrix, meta_fitness
+
+            matrix = get_matrix() if self.matrix is None else self.matrix
+            matrix.sync()
+            fitness = meta_fitness(matrix)
+        elif objective == "score":
+            fitness = lambda d: compute_deck_rating(d, card_data)["score"]
+        else:
+            raise HttpError(400, "'objective' must be 'score' or 'meta'")
+        generations = _int_param(body.get("generations"), "generations", 3, high=50)
+        with profile_job(new_job_id("optimize")):
+            return {"suggestions": smart_swap(cards, pool, fitness, generations=generations)}
+
+    def upgrades(self, body: Dict) -> Dict:
+        try:
+            with profile_job(new_job_id("upgrades")):
+                picks = upgrade_optimizer(body["levels"], body["costs"], int(body["gold"]))
+        except (KeyError, TypeError, ValueError):
+            raise HttpError(400, "body must contain 'levels', 'costs' and 'gold'")
+        return {"upgrades": picks}
+
+    def benchmarks(self, league_rank: Optional[int]) -> Dict:
+        from meta import league_benchmarks, quartile_benchmarks
+
+        players = self.fetch_top_players()
+        for p in players:
+            total = p.get("wins", 0) + p.get("losses", 0)
+            p["win_rate"] = p.get("wins", 0) / total if total else 0
+        result = {"quartiles": quartile_benchmarks(players, key="trophies")}
+        if league_rank:
+            result["league"] = league_benchmarks(league_rank, players=players)
+        return result
+
+    # --- routing ---
+
+    def route(self, method: str, path: str, query: Dict, body: Dict) -> Tuple[str, Callable[[], Dict], bool]:
+        """Return (route name, thunk, cacheable) for a request."""
+        parts = [unquote(p) for p in path.strip("/").split("/") if p]
+        if method == "GET":
+            if parts == ["health"]:
+                return "health", lambda: {"status": "ok"}, False
+            if parts == ["metrics"]:
+                return "metrics", render_prometheus, False
+            if parts == ["benchmarks"]:
+                rank = query.get("league_rank", [None])[0]
+                rank = _int_param(rank, "league_rank", None, low=0) if rank else None
+                return "benchmarks", lambda: self.benchmarks(rank), True
+            if len(parts) == 3 and parts[0] == "players":
+                tag = parts[1].lstrip("#").upper()
+                handler = {
+                    "summary": self.summary,
+                    "win_rate": self.win_rate,
+                    "tilt": self.tilt,
+                    "scouting": self.scouting,
+                    "progress": self.progress,
+                }.get(parts[2])
+                if handler:
+                    return parts[2], lambda: handler(tag), True
+        elif method == "POST":
+            if parts == ["decks", "rating"]:
+                return "rating", lambda: self.rating(body), True
+            if parts == ["decks", "rank"]:
+                return "rank", lambda: self.rank(body), True
+            if parts == ["decks", "optimize"]:
+                return "optimize", lambda: self.optimize(body), False
+            if parts == ["upgrades"]:
+                return "upgrades", lambda: self.upgrades(body), False
+        else:
+            raise HttpError(405, f"method {method} not allowed")
+        raise HttpError(404, f"no route for {method} {path}")
+
+    @staticmethod
+    async def _result(name: str, future: asyncio.Future) -> Dict:
+        """Await a handler's result, reporting failures other than `HttpError` as 502."""
+        try:
+            return await future
+        except HttpError:
+            raise
+        except Exception as e:
+            raise HttpError(502, f"{name} failed: {e}")
+
+    async def dispatch(self, method: str, target: str, body_raw: bytes) -> Tuple[int, Dict]:
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        try:
+            body = json.loads(body_raw) if body_raw else {}
+        except ValueError:
+            raise HttpError(400, "invalid JSON body")
+        if not isinstance(body, dict):
+            raise HttpError(400, "JSON body must be an object")
+        name, thunk, cacheable = self.route(method, url.path, query, body)
+        key = (method, url.path, url.query, body_raw)
+        if cacheable:
+            hit = self.cache.get(key)
+            if hit is not None:
+                count("crtool_cache_requests_total", cache="api", result="hit")
+                return 200, hit
+            pending = self.inflight.get(key)
+            if pending is not None:
+                count("crtool_cache_requests_total", cache="api", result="coalesced")
+                return 200, await self._result(name, asyncio.shield(pending))
+            count("crtool_cache_requests_total", cache="api", result="miss")
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, thunk)
+        if cacheable:
+            self.inflight[key] = future
+        try:
+            result = await self._result(name, future)
+        finally:
+            if cacheable:
+                self.inflight.pop(key, None)
+        if cacheable:
+            self.cache.put(key, result, CACHE_TTL.get(name, 60))
+        return 200, result
+
+    # --- HTTP plumbing ---
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", "0") or 0)
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= MAX_BODY_BYTES:
+                    # the body is not read, so the connection cannot be reused
+                    status = 413 if length > MAX_BODY_BYTES else 400
+                    count("crtool_http_requests_total", status=str(status))
+                    self.write_response(writer, status, {"error": REASONS[status]}, headers, False)
+                    await writer.drain()
+                    break
+                body_raw = await reader.readexactly(length) if length else b""
+                self.requests += 1
+                start = time.perf_counter()
+                try:
+                    status, payload = await self.dispatch(method.upper(), target, body_raw)
+                except HttpError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:  # pragma: no cover - defensive
+                    status, payload = 500, {"error": str(e)}
+                count("crtool_http_requests_total", status=str(status))
+                observe("crtool_http_request_seconds", time.perf_counter() - start)
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                self.write_response(writer, status, payload, headers, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def write_response(writer, status: int, payload, headers: Dict, keep_alive: bool) -> None:
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode(), "application/json"
+        extra = ""
+        if len(body) >= GZIP_MIN_BYTES and "gzip" in headers.get("accept-encoding", ""):
+            body = gzip.compress(body, compresslevel=5)
+            extra = "Content-Encoding: gzip\r\nVary: Accept-Encoding\r\n"
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"{extra}"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, host, port)
+
+
+async def serve(host: str, port: int) -> None:
+    server = await ApiServer().start(host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Clash Royale analysis JSON API")
+    parser.add_argument("--host", default=os.getenv("API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", "8080")))
+    args = parser.parse_args(argv)
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
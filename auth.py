@@ -2,9 +2,12 @@ import sqlite3
 import bcrypt
 from typing import Optional
 
+from instrument import instrumented
+
 DB_PATH = "users.db"
 
 
+@instrumented("auth")
 def init_db(path: str = DB_PATH) -> None:
     conn = sqlite3.connect(path)
     cur = conn.cursor()
@@ -19,6 +22,7 @@ def init_db(path: str = DB_PATH) -> None:
     conn.close()
 
 
+@instrumented("auth")
 def register_user(email: str, password: str, tag: str, playstyle: str, path: str = DB_PATH) -> None:
     pw_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
     conn = sqlite3.connect(path)
@@ -31,6 +35,7 @@ def register_user(email: str, password: str, tag: str, playstyle: str, path: str
     conn.close()
 
 
+@instrumented("auth")
 def get_user(email: str, path: str = DB_PATH) -> Optional[dict]:
     conn = sqlite3.connect(path)
     cur = conn.cursor()
@@ -48,6 +53,7 @@ def get_user(email: str, path: str = DB_PATH) -> Optional[dict]:
     return None
 
 
+@instrumented("auth")
 def load_credentials(path: str = DB_PATH) -> dict:
     conn = sqlite3.connect(path)
     cur = conn.cursor()
@@ -60,6 +66,7 @@ def load_credentials(path: str = DB_PATH) -> dict:
     return {"usernames": creds}
 
 
+@instrumented("auth")
 def update_playstyle(email: str, playstyle: str, path: str = DB_PATH) -> None:
     conn = sqlite3.connect(path)
     cur = conn.cursor()
@@ -68,6 +75,7 @@ def update_playstyle(email: str, playstyle: str, path: str = DB_PATH) -> None:
     conn.close()
 
 
+@instrumented("auth")
 def update_mute_toast(email: str, mute: bool, path: str = DB_PATH) -> None:
     conn = sqlite3.connect(path)
     cur = conn.cursor()
@@ -0,0 +1,422 @@
+"""Compact binary archive for battle history.
+
+A battlelog as returned by the API repeats full card dicts (name, id, icon
+URLs, max level) and player details for every battle. The archive stores
+battles oldest first in compressed, columnar blocks:
+
+* cards become 2-byte ids from a shared `CardIndex` kept in the footer,
+* battle times are second deltas from the block's first battle,
+* crowns and per-side player counts are packed into one byte each,
+* battle modes and player details are dictionary-encoded per block,
+* each block is compressed with zstd (if installed) or zlib.
+
+A footer lists every block's offset and time range, so a reader memory-maps
+the file and decodes only the blocks overlapping the requested range.
+
+    save("history.crba", battles)
+    append("history.crba", get_battlelog(tag))       # only newer battles are added
+    recent = load("history.crba", start=datetime(2024, 7, 1, tzinfo=timezone.utc))
+
+Fields the archive does not model explicitly are kept in the dictionary-
+encoded battle and player tables, so decoding returns API-shaped dicts.
+"""
+import array
+import calendar
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from card_index import CardIndex
+from records import norm_tag
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+MAGIC = b"CRBA"
+VERSION = 1
+HEADER = struct.Struct("<4sH")
+TRAILER = struct.Struct("<Q4s")
+BLOCK_SIZE = 4096
+ARCHIVE_DIR = "battle_archive"
+TIME_FORMAT = "%Y%m%dT%H%M%S.000Z"
+
+ZLIB, ZSTD = "zlib", "zstd"
+
+NO_TROPHIES = -32768
+NO_START = -1
+NO_LEVEL = 255
+NO_VALUE = -1
+NO_LIST = -2
+CARD_LEVELS = ("level", "evolutionLevel", "starLevel")
+PLAYER_FIELDS = (
+    "crowns", "trophyChange", "startingTrophies", "cards", "kingTowerHitPoints", "princessTowersHitPoints", "elixirLeaked"
+)
+
+Timestamp = Union[None, int, float, str, datetime]
+
+
+def default_codec() -> str:
+    codec = os.getenv("CRTOOL_ARCHIVE_CODEC")
+    if codec:
+        return codec
+    return ZSTD if zstandard is not None else ZLIB
+
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed; use codec='zlib'")
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    return zlib.compress(data, 9)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("archive uses zstd but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def parse_time(battle_time: str) -> int:
+    return calendar.timegm(time.strptime(battle_time, TIME_FORMAT))
+
+
+def format_time(ts: int) -> str:
+    return time.strftime(TIME_FORMAT, time.gmtime(ts))
+
+
+def _epoch(value: Timestamp) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    if isinstance(value, str):
+        return parse_time(value)
+    return int(value)
+
+
+# --- block encoding ---
+
+def _pack(arrays: Dict[str, array.array], tables: Dict[str, List[str]]) -> bytes:
+    out = [struct.pack("<B", len(arrays) + len(tables))]
+    for name, values in arrays.items():
+        if sys.byteorder == "big":  # pragma: no cover - archives are little-endian
+            values = array.array(values.typecode, values)
+            values.byteswap()
+        raw = values.tobytes()
+        out.append(struct.pack("<B", len(name)) + name.encode() + values.typecode.encode() + struct.pack("<I", len(raw)))
+        out.append(raw)
+    for name, strings in tables.items():
+        raw = json.dumps(strings, separators=(",", ":")).encode()
+        out.append(struct.pack("<B", len(name)) + name.encode() + b"s" + struct.pack("<I", len(raw)))
+        out.append(raw)
+    return b"".join(out)
+
+
+def _unpack(data: bytes) -> Tuple[Dict[str, array.array], Dict[str, List[str]]]:
+    arrays, tables = {}, {}
+    (count,) = struct.unpack_from("<B", data, 0)
+    pos = 1
+    for _ in range(count):
+        (n,) = struct.unpack_from("<B", data, pos)
+        name = data[pos + 1:pos + 1 + n].decode()
+        typecode = chr(data[pos + 1 + n])
+        (length,) = struct.unpack_from("<I", data, pos + 2 + n)
+        pos += 6 + n
+        raw = data[pos:pos + length]
+        pos += length
+        if typecode == "s":
+            tables[name] = json.loads(raw)
+        else:
+            values = array.array(typecode)
+            values.frombytes(raw)
+            if sys.byteorder == "big":  # pragma: no cover
+                values.byteswap()
+            arrays[name] = values
+    return arrays, tables
+
+
+class _Table:
+    """Block-local dictionary of JSON-encoded values."""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.ids: Dict[str, int] = {}
+
+    def add(self, value: Dict) -> int:
+        key = json.dumps(value, sort_keys=True, separators=(",", ":"))
+        idx = self.ids.get(key)
+        if idx is None:
+            idx = self.ids[key] = len(self.values)
+            self.values.append(key)
+        return idx
+
+
+def encode_block(battles: List[Tuple[int, Dict]], cards: CardIndex) -> bytes:
+    """Encode (epoch, battle) pairs sorted by time into one uncompressed block."""
+    base = battles[0][0]
+    cols = {
+        "dt": array.array("I"), "mode": array.array("H"), "crowns": array.array("B"), "np": array.array("B"),
+        "who": array.array("I"), "dtrophy": array.array("h"), "start": array.array("i"), "nc": array.array("B"),
+        "king": array.array("i"), "princess": array.array("i"), "leak": array.array("i"),
+        "card": array.array("H"), "level": array.array("B"), "evolutionLevel": array.array("B"), "starLevel": array.array("B"),
+    }
+    modes, players = _Table(), _Table()
+    for ts, battle in battles:
+        team, opp = battle.get("team", []), battle.get("opponent", [])
+        cols["dt"].append(ts - base)
+        cols["mode"].append(modes.add({k: v for k, v in battle.items() if k not in ("battleTime", "team", "opponent")}))
+        team_crowns = team[0].get("crowns", 0) if team else 0
+        opp_crowns = opp[0].get("crowns", 0) if opp else 0
+        cols["crowns"].append(min(team_crowns, 15) << 4 | min(opp_crowns, 15))
+        cols["np"].append(min(len(team), 15) << 4 | min(len(opp), 15))
+        for player in team[:15] + opp[:15]:
+            cols["who"].append(players.add({k: v for k, v in player.items() if k not in PLAYER_FIELDS}))
+            change = player.get("trophyChange")
+            cols["dtrophy"].append(NO_TROPHIES if change is None else max(-32767, min(32767, change)))
+            start = player.get("startingTrophies")
+            cols["start"].append(NO_START if start is None else start)
+            cols["king"].append(player.get("kingTowerHitPoints", NO_VALUE))
+            towers = player.get("princessTowersHitPoints")
+            towers = [NO_LIST, NO_VALUE] if towers is None else (list(towers[:2]) + [NO_VALUE, NO_VALUE])[:2]
+            cols["princess"].extend(towers)
+            leak = player.get("elixirLeaked")
+            cols["leak"].append(NO_VALUE if leak is None else round(leak * 100))
+            deck = player.get("cards", [])[:255]
+            cols["nc"].append(len(deck))
+            for card in deck:
+                cols["card"].append(cards.add(card))
+                for field in CARD_LEVELS:
+                    value = card.get(field)
+                    cols[field].append(NO_LEVEL if value is None else min(value, 254))
+    return _pack(cols, {"modes": modes.values, "players": players.values})
+
+
+class _Block:
+    """Decoded columns of one block with row offsets into the player/card columns."""
+
+    def __init__(self, data: bytes, t_first: int):
+        self.cols, tables = _unpack(data)
+        self.modes = json.loads("[" + ",".join(tables["modes"]) + "]")
+        self.players = json.loads("[" + ",".join(tables["players"]) + "]")
+        self.times = [t_first + d for d in self.cols["dt"]]
+        self.player_start = [0]
+        for packed in self.cols["np"]:
+            self.player_start.append(self.player_start[-1] + (packed >> 4) + (packed & 15))
+        self.card_start = [0]
+        for n in self.cols["nc"]:
+            self.card_start.append(self.card_start[-1] + n)
+        c = self.cols
+        self.card_keys = list(zip(c["card"], c["level"], c["evolutionLevel"], c["starLevel"]))
+        self._templates: Dict[tuple, Dict] = {}
+
+    def _card(self, key: tuple, cards: CardIndex) -> Dict:
+        template = self._templates.get(key)
+        if template is None:
+            dynamic = {f: v for f, v in zip(CARD_LEVELS, key[1:]) if v != NO_LEVEL}
+            template = self._templates[key] = cards.card(key[0], **dynamic)
+        return dict(template)
+
+    def battle(self, i: int, cards: CardIndex) -> Dict:
+        c = self.cols
+        crowns, np_ = c["crowns"][i], c["np"][i]
+        keys, card_start = self.card_keys, self.card_start
+        sides = ([], [])
+        p = self.player_start[i]
+        for side, n, side_crowns in ((0, np_ >> 4, crowns >> 4), (1, np_ & 15, crowns & 15)):
+            for _ in range(n):
+                player = dict(self.players[c["who"][p]])
+                player["crowns"] = side_crowns
+                if c["dtrophy"][p] != NO_TROPHIES:
+                    player["trophyChange"] = c["dtrophy"][p]
+                if c["start"][p] != NO_START:
+                    player["startingTrophies"] = c["start"][p]
+                if c["king"][p] != NO_VALUE:
+                    player["kingTowerHitPoints"] = c["king"][p]
+                towers = c["princess"][2 * p:2 * p + 2]
+                if towers[0] != NO_LIST:
+                    player["princessTowersHitPoints"] = [t for t in towers if t != NO_VALUE]
+                if c["leak"][p] != NO_VALUE:
+                    player["elixirLeaked"] = c["leak"][p] / 100
+                player["cards"] = [self._card(key, cards) for key in keys[card_start[p]:card_start[p + 1]]]
+                sides[side].append(player)
+                p += 1
+        battle = dict(self.modes[c["mode"][i]])
+        battle["battleTime"] = format_time(self.times[i])
+        battle["team"], battle["opponent"] = sides
+        return battle
+
+
+# --- files ---
+
+def _write(fh, battles: List[Tuple[int, Dict]], cards: CardIndex, blocks: List[Dict], codec: str, block_size: int) -> None:
+    for i in range(0, len(battles), block_size):
+        chunk = battles[i:i + block_size]
+        raw = encode_block(chunk, cards)
+        data = _compress(codec, raw)
+        blocks.append(
+            {"offset": fh.tell(), "length": len(data), "count": len(chunk), "t_first": chunk[0][0], "t_last": chunk[-1][0], "codec": codec}
+        )
+        fh.write(data)
+    footer = zlib.compress(json.dumps({"version": VERSION, "cards": cards.to_list(), "blocks": blocks}).encode())
+    offset = fh.tell()
+    fh.write(footer)
+    fh.write(TRAILER.pack(offset, MAGIC))
+    fh.truncate()
+
+
+def _sorted(battles: List[Dict]) -> List[Tuple[int, Dict]]:
+    return sorted(((parse_time(b["battleTime"]), b) for b in battles if b.get("battleTime")), key=lambda tb: tb[0])
+
+
+@contextmanager
+def locked(path: str):
+    """Exclusive writer lock on `path` (a sidecar lock file; a no-op where fcntl is missing)."""
+    with open(f"{path}.lock", "a+b") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+def save(path: str, battles: List[Dict], codec: Optional[str] = None, block_size: int = BLOCK_SIZE) -> None:
+    """Write `battles` (any order) to a new archive, replacing `path` atomically."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(HEADER.pack(MAGIC, VERSION))
+        _write(fh, _sorted(battles), CardIndex(), [], codec or default_codec(), block_size)
+    os.replace(tmp, path)
+
+
+class ArchiveReader:
+    """Memory-mapped reader; only blocks overlapping a scan are decompressed."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = open(path, "rb")
+        self._map = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self._map, 0)
+        offset, trailer = TRAILER.unpack_from(self._map, len(self._map) - TRAILER.size)
+        if magic != MAGIC or trailer != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a battle archive")
+        footer = json.loads(zlib.decompress(self._map[offset:len(self._map) - TRAILER.size]))
+        self.footer_offset = offset
+        self.cards = CardIndex.from_list(footer["cards"])
+        self.blocks: List[Dict] = footer["blocks"]
+        self._last = [b["t_last"] for b in self.blocks]
+
+    def __enter__(self) -> "ArchiveReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._map.close()
+        self._fh.close()
+
+    def __len__(self) -> int:
+        return sum(b["count"] for b in self.blocks)
+
+    @property
+    def time_range(self) -> Optional[Tuple[int, int]]:
+        if not self.blocks:
+            return None
+        return self.blocks[0]["t_first"], self.blocks[-1]["t_last"]
+
+    def _block(self, meta: Dict) -> _Block:
+        data = _decompress(meta["codec"], self._map[meta["offset"]:meta["offset"] + meta["length"]])
+        return _Block(data, meta["t_first"])
+
+    def scan(self, start: Timestamp = None, end: Timestamp = None) -> Iterator[Dict]:
+        """Yield battles with start <= time <= end, oldest first."""
+        lo, hi = _epoch(start), _epoch(end)
+        first = bisect_left(self._last, lo) if lo is not None else 0
+        for meta in self.blocks[first:]:
+            if hi is not None and meta["t_first"] > hi:
+                break
+            block = self._block(meta)
+            i = bisect_left(block.times, lo) if lo is not None else 0
+            while i < meta["count"] and (hi is None or block.times[i] <= hi):
+                yield block.battle(i, self.cards)
+                i += 1
+
+
+def load(path: str, start: Timestamp = None, end: Timestamp = None) -> List[Dict]:
+    """Return archived battles in the range, newest first like the battlelog API."""
+    with ArchiveReader(path) as reader:
+        battles = list(reader.scan(start, end))
+    battles.reverse()
+    return battles
+
+
+def append(path: str, battles: List[Dict], codec: Optional[str] = None, block_size: int = BLOCK_SIZE) -> int:
+    """Add battles newer than the archive's last one; return how many were added.
+
+    A partly filled last block is re-encoded together with the new battles so
+    frequent small appends do not fragment the file into tiny blocks. Writers
+    take a lock and build the new file next to the old one, which is then
+    swapped in with `os.replace`: a crash leaves the old archive intact, and
+    readers that have the old file mapped keep reading it.
+
+    The price is that every append rewrites the file, so its cost grows with
+    the archive. Most of it is re-encoding the partial last block (up to
+    `block_size` battles, ~100-400 ms); the complete blocks are copied as raw
+    bytes, ~3 ms for a 100k-battle (4 MB) archive. Appending in place would
+    save only that copy but would need readers to cope with half-written tails.
+    """
+    with locked(path):
+        if not os.path.exists(path):
+            save(path, battles, codec, block_size)
+            return len([b for b in battles if b.get("battleTime")])
+        with ArchiveReader(path) as reader:
+            last = reader.time_range[1] if reader.blocks else None
+            new = [tb for tb in _sorted(battles) if last is None or tb[0] > last]
+            if not new:
+                return 0
+            cards, blocks = reader.cards, list(reader.blocks)
+            carry: List[Tuple[int, Dict]] = []
+            keep = reader.footer_offset
+            if blocks and blocks[-1]["count"] < block_size:
+                tail = blocks.pop()
+                block = reader._block(tail)
+                carry = [(block.times[i], block.battle(i, cards)) for i in range(tail["count"])]
+                keep = tail["offset"]
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as fh:
+                fh.write(reader._map[:keep])
+                _write(fh, carry + new, cards, blocks, codec or default_codec(), block_size)
+                fh.flush()
+                os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    return len(new)
+
+
+def archive_path(player_tag: str, root: str = ARCHIVE_DIR) -> str:
+    return os.path.join(root, f"{norm_tag(player_tag)}.crba")
+
+
+def record_battles(player_tag: str, battles: List[Dict], root: str = ARCHIVE_DIR) -> int:
+    """Append a fetched battlelog to the player's archive."""
+    os.makedirs(root, exist_ok=True)
+    return append(archive_path(player_tag, root), battles)
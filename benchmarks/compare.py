@@ -0,0 +1,51 @@
+"""Compare two benchmark result files produced by benchmarks/run.py.
+
+    python benchmarks/compare.py benchmarks/results/abc123.json benchmarks/results/def456.json
+
+Exits non-zero when any case got slower than the threshold ratio.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+
+def load(path: str) -> Dict[Tuple[str, int], Dict]:
+    with open(path) as fh:
+        report = json.load(fh)
+    return {(r["name"], r["size"]): r for r in report["results"]}
+
+
+def compare(old: Dict, new: Dict, threshold: float) -> List[Dict]:
+    rows = []
+    for key in sorted(old.keys() & new.keys()):
+        ratio = new[key]["best_s"] / old[key]["best_s"] if old[key]["best_s"] else float("inf")
+        rows.append(
+            {
+                "name": key[0],
+                "size": key[1],
+                "old_s": old[key]["best_s"],
+                "new_s": new[key]["best_s"],
+                "ratio": ratio,
+                "regression": ratio > threshold,
+            }
+        )
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=1.10, help="slowdown ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    rows = compare(load(args.old), load(args.new), args.threshold)
+    for r in rows:
+        flag = "REGRESSION" if r["regression"] else ""
+        print(f"{r['name']:28s} {r['size']:>9d}  {r['old_s'] * 1e6:12.1f} -> {r['new_s'] * 1e6:12.1f} us  x{r['ratio']:.2f} {flag}")
+    return 1 if any(r["regression"] for r in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
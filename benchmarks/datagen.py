@@ -0,0 +1,97 @@
+"""Deterministic synthetic data shaped like the upstream API payloads."""
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from analysis import ANTI_AIR, SPELLS, WIN_CONDITIONS
+
+FILLER = [
+    "knight", "ice spirit", "skeletons", "goblins", "valkyrie", "mini p.e.k.k.a",
+    "cannon", "tesla", "inferno tower", "bomb tower", "tombstone", "ice golem",
+    "dark prince", "prince", "lumberjack", "bandit", "royal ghost", "fisherman",
+]
+
+CARD_NAMES = sorted(ANTI_AIR | SPELLS | WIN_CONDITIONS | set(FILLER))
+CARD_IDS = {name: 26000000 + i for i, name in enumerate(CARD_NAMES)}
+EVENT_MODES = [{"id": 72000000 + i, "name": f"Event {i}"} for i in range(6)]
+START = datetime(2024, 7, 16, 12, 0, tzinfo=timezone.utc)
+
+
+def card_pool(n: int = len(CARD_NAMES), seed: int = 0) -> List[Dict]:
+    """Return `n` cards with names and elixir costs (synthetic names past the real ones)."""
+    rng = random.Random(seed)
+    names = CARD_NAMES + [f"card {i}" for i in range(max(0, n - len(CARD_NAMES)))]
+    return [{"id": 26000000 + i, "name": name.title(), "elixirCost": rng.randint(1, 7)} for i, name in enumerate(names[:n])]
+
+
+def deck(rng: random.Random, names: List[str] = CARD_NAMES) -> List[str]:
+    return rng.sample(names, 8)
+
+
+def _side(rng: random.Random, crowns: int) -> Dict:
+    return {
+        "tag": f"#P{rng.randrange(10**6)}",
+        "crowns": crowns,
+        "trophyChange": rng.choice([30, -30, 28, -29]),
+        "cards": [
+            {"name": name.title(), "id": CARD_IDS[name], "level": rng.randint(9, 14)}
+            for name in deck(rng)
+        ],
+    }
+
+
+def battlelog(n: int = 25, seed: int = 0, pvp_ratio: float = 0.7) -> List[Dict]:
+    """Return `n` battles newest first, mixing PvP and event modes."""
+    rng = random.Random(seed)
+    battles = []
+    ts = START
+    for _ in range(n):
+        ts -= timedelta(seconds=rng.randint(120, 3600))
+        pvp = rng.random() < pvp_ratio
+        team_crowns, opp_crowns = rng.randint(0, 3), rng.randint(0, 3)
+        battles.append(
+            {
+                "type": "PvP" if pvp else "challenge",
+                "battleTime": ts.strftime("%Y%m%dT%H%M%S.000Z"),
+                "gameMode": {"id": 72000006, "name": "Ladder"},
+                "eventMode": {} if pvp else rng.choice(EVENT_MODES),
+                "team": [_side(rng, team_crowns)],
+                "opponent": [_side(rng, opp_crowns)],
+            }
+        )
+    return battles
+
+
+def events(n: int = 100, seed: int = 0) -> List[Dict]:
+    """Return `n` card plays over a match, alternating sides at random."""
+    rng = random.Random(seed)
+    plays = []
+    t = 0.0
+    for _ in range(n):
+        t += rng.uniform(0.5, 6.0)
+        plays.append(
+            {
+                "time": round(t, 1),
+                "side": rng.choice(["player", "opponent"]),
+                "card": rng.choice(CARD_NAMES),
+                "elixir": rng.randint(1, 7),
+            }
+        )
+    return plays
+
+
+def leaderboard(n: int = 1000, seed: int = 0) -> List[Dict]:
+    """Return `n` players with trophies, wins, losses and league rank."""
+    rng = random.Random(seed)
+    return [
+        {
+            "tag": f"#L{i}",
+            "rank": i + 1,
+            "trophies": 9000 - i * 3000 // max(1, n),
+            "rank_points": 3000 - i * 3000 // max(1, n),
+            "wins": rng.randint(0, 2000),
+            "losses": rng.randint(0, 2000),
+            "leagueRank": rng.randint(1, 10),
+        }
+        for i in range(n)
+    ]
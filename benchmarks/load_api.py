@@ -0,0 +1,195 @@
+"""Load test for api_server.py against a local fake upstream.
+
+Starts a stand-in for the Clash Royale API and RoyaleAPI on localhost,
+points the API modules at it, runs the JSON API in a background thread and
+fires concurrent keep-alive requests at it. Prints throughput and latency
+percentiles; no tokens or network access needed.
+
+The request scheduler's per-token rate is lifted to `--upstream-rate`
+(default: effectively unlimited) so the numbers measure the server; pass the
+production rate (e.g. `--upstream-rate 10`) to see the cap one token puts
+on throughput. Time spent waiting for a token is reported separately.
+
+    python benchmarks/load_api.py --requests 2000 --concurrency 32 --latency-ms 50
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import unquote, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+CARDS = ["Knight", "Archers", "Fireball", "Hog Rider", "Musketeer", "Zap", "Cannon", "Ice Spirit", "Giant", "Log"]
+
+
+def fake_battlelog(tag: str, n: int = 25) -> List[Dict]:
+    rng = random.Random(tag)
+    battles = []
+    for i in range(n):
+        battles.append(
+            {
+                "type": "PvP",
+                "battleTime": f"20240716T{23 - i % 24:02d}0000.000Z",
+                "team": [{"crowns": rng.randint(0, 3), "cards": [{"name": c} for c in rng.sample(CARDS, 8)]}],
+                "opponent": [{"crowns": rng.randint(0, 3), "cards": [{"name": c} for c in rng.sample(CARDS, 8)]}],
+            }
+        )
+    return battles
+
+
+class FakeUpstream(BaseHTTPRequestHandler):
+    latency = 0.0
+    calls = 0
+
+    def do_GET(self):
+        FakeUpstream.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        path = unquote(urlsplit(self.path).path)
+        if path.startswith("/v1/players/#"):
+            tag = path[len("/v1/players/#"):].split("/")[0]
+            if path.endswith("/battlelog"):
+                body = fake_battlelog(tag)
+            else:
+                body = {"tag": f"#{tag}", "name": tag, "trophies": 6000, "leagueRank": 3}
+        elif path == "/v1/cards":
+            body = {"items": [{"name": c, "elixirCost": 3} for c in CARDS]}
+        elif path == "/player/top":
+            body = {"items": [{"trophies": 8000 - i, "wins": i % 50, "losses": 25, "leagueRank": i % 10} for i in range(1000)]}
+        else:
+            self.send_error(404)
+            return
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_upstream(latency: float = 0.0) -> ThreadingHTTPServer:
+    FakeUpstream.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeUpstream)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_api(port: int = 0) -> int:
+    """Run the API server in a background event loop and return its port."""
+    from api_server import ApiServer
+
+    ready = threading.Event()
+    holder = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(ApiServer().start("127.0.0.1", port))
+        holder["port"] = server.sockets[0].getsockname()[1]
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return holder["port"]
+
+
+def run_load(port: int, paths: List[str], concurrency: int) -> Dict:
+    local = threading.local()
+
+    def one(path: str) -> float:
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        start = time.perf_counter()
+        conn.request("GET", path, headers={"Accept-Encoding": "gzip"})
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status != 200:
+            raise RuntimeError(f"{path} -> {resp.status}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(one, paths))
+    elapsed = time.perf_counter() - start
+
+    def pct(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+    return {
+        "requests": len(paths),
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "rps": len(paths) / elapsed,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "upstream_calls": FakeUpstream.calls,
+        **scheduler_wait(),
+    }
+
+
+def scheduler_wait() -> Dict:
+    """Total and mean time requests waited for a scheduler token."""
+    from instrument import snapshot
+
+    waits = [h for h in snapshot()["histograms"] if h["name"] == "crtool_scheduler_wait_seconds"]
+    n = sum(h["count"] for h in waits)
+    total = sum(h["sum"] for h in waits)
+    return {"scheduler_waits": n, "scheduler_wait_total_s": total, "scheduler_wait_mean_ms": total / n * 1000 if n else 0.0}
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--players", type=int, default=50, help="distinct player tags requested")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="fake upstream latency")
+    parser.add_argument("--upstream-rate", type=float, default=100000.0, help="scheduler requests/s per token")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+    import instrument
+
+    instrument.enable()
+
+    upstream = start_fake_upstream(args.latency_ms / 1000)
+    base = f"http://127.0.0.1:{upstream.server_address[1]}"
+    os.environ["CLASH_API_BASE"] = f"{base}/v1"
+    os.environ["ROYALEAPI_BASE"] = base
+    os.environ.setdefault("CLASH_ROYALE_TOKEN", "fake")
+    os.environ.setdefault("ROYALEAPI_TOKEN", "fake")
+    os.environ.setdefault("NO_PROXY", "127.0.0.1,localhost")
+    os.environ["CRTOOL_CLASH_RATE"] = os.environ["CRTOOL_ROYALEAPI_RATE"] = str(args.upstream_rate)
+    port = start_api()
+
+    rng = random.Random(0)
+    routes = ["summary", "win_rate", "tilt"]
+    paths = [
+        f"/players/P{rng.randrange(args.players)}/{rng.choice(routes)}" if rng.random() < 0.9 else "/benchmarks?league_rank=3"
+        for _ in range(args.requests)
+    ]
+    result = run_load(port, paths, args.concurrency)
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(result, fh, indent=2)
+    return result
+
+
+if __name__ == "__main__":
+    main()
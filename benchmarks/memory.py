@@ -0,0 +1,97 @@
+"""Memory and traversal cost of battles as API dicts versus `records`.
+
+Builds N synthetic battles, measures the heap they occupy with tracemalloc
+(dicts as `json.loads` produces them, and the slotted records parsed from
+those dicts), then times a few typical traversals on both.
+
+    python benchmarks/memory.py --battles 100000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks import datagen  # noqa: E402
+
+
+def heap_bytes(build: Callable[[], object]):
+    """Return (object, bytes allocated by `build` and still alive)."""
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size
+
+
+def best_of(fn: Callable[[], object], repeat: int = 5) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def team_decks_dicts(battles):
+    return [[c.get("name") for c in b.get("team", [{}])[0].get("cards", [])] for b in battles]
+
+
+def team_decks_records(battles):
+    return [b.team.deck.cards for b in battles]
+
+
+def run(n: int) -> Dict:
+    from analysis import compute_win_rate, daily_event_wr
+    from records import parse_battlelog
+
+    raw = json.dumps(datagen.battlelog(n))
+    dicts, dict_bytes = heap_bytes(lambda: json.loads(raw))
+    records, record_bytes = heap_bytes(lambda: parse_battlelog(dicts))
+    result = {
+        "battles": n,
+        "dict_mb": dict_bytes / 2**20,
+        "records_mb": record_bytes / 2**20,
+        "memory_ratio": dict_bytes / record_bytes,
+        "parse_s": best_of(lambda: parse_battlelog(dicts), repeat=3),
+        "json_loads_s": best_of(lambda: json.loads(raw), repeat=3),
+        "traversal": {},
+    }
+    for name, on_dicts, on_records in (
+        ("compute_win_rate", lambda: compute_win_rate(dicts), lambda: compute_win_rate(records)),
+        ("daily_event_wr", lambda: daily_event_wr(dicts, days=10**5), lambda: daily_event_wr(records, days=10**5)),
+        ("team decks", lambda: team_decks_dicts(dicts), lambda: team_decks_records(records)),
+    ):
+        d, r = best_of(on_dicts), best_of(on_records)
+        result["traversal"][name] = {"dicts_s": d, "records_s": r, "speedup": d / r if r else float("inf")}
+    return result
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--battles", type=int, default=100_000)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    result = run(args.battles)
+    print(f"{result['battles']} battles: dicts {result['dict_mb']:.1f} MiB, records {result['records_mb']:.1f} MiB "
+          f"(x{result['memory_ratio']:.1f}); parse {result['parse_s'] * 1e3:.0f} ms vs json.loads {result['json_loads_s'] * 1e3:.0f} ms")
+    for name, t in result["traversal"].items():
+        print(f"{name:24s} dicts {t['dicts_s'] * 1e3:9.2f} ms  records {t['records_s'] * 1e3:9.2f} ms  x{t['speedup']:.1f}")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(result, fh, indent=2)
+    return result
+
+
+if __name__ == "__main__":
+    main()
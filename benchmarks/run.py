@@ -0,0 +1,397 @@
+"""Time the project's hot paths on synthetic data.
+
+Each case builds its input outside the timed region and returns a
+zero-argument callable. Results (best and median seconds per call) are
+written as JSON keyed by the current commit so runs on the same machine can
+be compared with benchmarks/compare.py.
+
+    python benchmarks/run.py                 # quick sizes
+    python benchmarks/run.py --full          # adds 100k battles / 1M players
+    python benchmarks/run.py -k win_rate     # only matching cases
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks import datagen  # noqa: E402
+
+CASES: Dict[str, Dict] = {}
+
+
+def case(name: str, quick: List[int], full: List[int]):
+    """Register a benchmark; the function maps a size to the callable to time."""
+
+    def register(fn: Callable[[int], Callable[[], object]]):
+        CASES[name] = {"setup": fn, "quick": quick, "full": full}
+        return fn
+
+    return register
+
+
+BATTLES_QUICK = [25, 1000, 10_000]
+BATTLES_FULL = [25, 1000, 10_000, 100_000]
+
+
+@case("compute_win_rate", BATTLES_QUICK, BATTLES_FULL)
+def _win_rate(n):
+    from analysis import compute_win_rate
+
+    log = datagen.battlelog(n)
+    return lambda: compute_win_rate(log)
+
+
+@case("compute_win_rate.records", BATTLES_QUICK, BATTLES_FULL)
+def _win_rate_records(n):
+    from analysis import compute_win_rate
+    from records import parse_battlelog
+
+    battles = parse_battlelog(datagen.battlelog(n))
+    return lambda: compute_win_rate(battles)
+
+
+@case("compute_win_rate.columnar", BATTLES_QUICK, BATTLES_FULL)
+def _win_rate_columnar(n):
+    from analysis import compute_win_rate
+    from columnar import Table, export_battles
+
+    path = os.path.join(tempfile.mkdtemp(), "battles")
+    export_battles(datagen.battlelog(n), path)
+    table = Table(path)
+    return lambda: compute_win_rate(table)
+
+
+@case("detect_tilt", BATTLES_QUICK, BATTLES_FULL)
+def _tilt(n):
+    from analysis import detect_tilt
+
+    log = datagen.battlelog(n)
+    return lambda: detect_tilt(log)
+
+
+@case("collect_event_stats", BATTLES_QUICK, BATTLES_FULL)
+def _event_stats(n):
+    from analysis import collect_event_stats
+
+    log = datagen.battlelog(n)
+    path = os.path.join(tempfile.mkdtemp(), "event_stats.json")
+    return lambda: collect_event_stats(log, path=path)
+
+
+@case("daily_event_wr", BATTLES_QUICK, BATTLES_FULL)
+def _daily_wr(n):
+    from analysis import daily_event_wr
+
+    log = datagen.battlelog(n)
+    return lambda: daily_event_wr(log, days=100_000)
+
+
+@case("analyze_cycle", [100, 10_000], [100, 10_000, 100_000])
+def _cycle(n):
+    from analysis import analyze_cycle
+
+    plays = datagen.events(n)
+    return lambda: analyze_cycle(plays)
+
+
+@case("elixir_diff_timeline", [100, 10_000], [100, 10_000, 100_000])
+def _timeline(n):
+    from analysis import elixir_diff_timeline
+
+    plays = datagen.events(n)
+    return lambda: elixir_diff_timeline(plays)
+
+
+@case("smart_swap", [100], [100, 1000])
+def _smart_swap(n):
+    from analysis import compute_deck_rating
+    from deck_optimizer import smart_swap
+
+    cards = datagen.card_pool(n)
+    pool = [c["name"] for c in cards]
+    fitness = lambda d: compute_deck_rating(d, cards)["score"]
+    start = pool[:8]
+
+    def run():
+        random.seed(0)
+        return smart_swap(start, pool, fitness, generations=3)
+
+    return run
+
+
+@case("matchups.expected_win_rate", [1000], [1000, 100_000])
+def _expected_win_rate(n):
+    from matchups import MatchupMatrix, meta_fitness
+
+    matrix = MatchupMatrix(os.path.join(tempfile.mkdtemp(), "matchups.db"))
+    matrix.add_battles(datagen.battlelog(n))
+    fitness = meta_fitness(matrix)
+    rng = random.Random(0)
+    decks = [datagen.deck(rng) for _ in range(1000)]
+    return lambda: [fitness(d) for d in decks]
+
+
+@case("synergy.top_partners", [1000], [1000, 100_000])
+def _top_partners(n):
+    from synergy import SynergyIndex
+
+    index = SynergyIndex()
+    index.add_battles(datagen.battlelog(n))
+    names = [name.title() for name in datagen.CARD_NAMES]
+    return lambda: [index.top_partners(name, k=5) for name in names]
+
+
+@case("projection.project_goals", [20_000], [20_000, 100_000])
+def _projection(n):
+    from projection import ladder_stats, project_goals
+
+    stats = ladder_stats(datagen.battlelog(500))
+    stats.update(wins=45, losses=55)
+    return lambda: project_goals({"Champion": 7500, "Ultimate": 9000}, 5000, stats, paths=n, seed=0)
+
+
+@case("deck_batch.rate_decks", [10_000], [10_000, 500_000])
+def _rate_decks(n):
+    from card_index import CardIndex
+    from deck_batch import encode_decks, rate_decks
+
+    cards = datagen.card_pool()
+    rng = random.Random(0)
+    index = CardIndex()
+    ids = encode_decks([datagen.deck(rng) for _ in range(n)], index)
+    return lambda: rate_decks(ids, cards, index)
+
+
+@case("upgrade_optimizer", [100, 10_000], [100, 10_000, 100_000])
+def _upgrades(n):
+    from deck_optimizer import upgrade_optimizer
+
+    rng = random.Random(0)
+    levels = {f"card {i}": rng.randint(1, 14) for i in range(n)}
+    costs = {f"card {i}": rng.choice([50, 150, 400, 1000, 2000, 4000]) for i in range(n)}
+    return lambda: upgrade_optimizer(levels, costs, gold=n * 500)
+
+
+@case("quartile_benchmarks", [1000, 100_000], [1000, 100_000, 1_000_000])
+def _quartiles(n):
+    from meta import quartile_benchmarks
+
+    players = datagen.leaderboard(n)
+    for p in players:
+        total = p["wins"] + p["losses"]
+        p["win_rate"] = p["wins"] / total if total else 0
+    return lambda: quartile_benchmarks(players, key="trophies")
+
+
+@case("battlelog.json_load", BATTLES_QUICK, BATTLES_FULL)
+def _json_load(n):
+    import json
+
+    raw = json.dumps(datagen.battlelog(n))
+    return lambda: json.loads(raw)
+
+
+@case("battle_archive.load", BATTLES_QUICK, BATTLES_FULL)
+def _archive_load(n):
+    from battle_archive import load, save
+
+    path = os.path.join(tempfile.mkdtemp(), "history.crba")
+    save(path, datagen.battlelog(n))
+    return lambda: load(path)
+
+
+@case("battle_archive.scan_day", BATTLES_QUICK, BATTLES_FULL)
+def _archive_scan(n):
+    from battle_archive import load, parse_time, save
+
+    log = datagen.battlelog(n)
+    path = os.path.join(tempfile.mkdtemp(), "history.crba")
+    save(path, log)
+    end = parse_time(log[0]["battleTime"])
+    return lambda: load(path, start=end - 86400, end=end)
+
+
+@case("crawler.save_page", [100], [100, 1000])
+def _crawler_save_page(n):
+    from crawler import _connect, _save_page, add_locations
+
+    path = os.path.join(tempfile.mkdtemp(), "crawler.db")
+    add_locations([{"id": "global"}], path)
+    conn = _connect(path)
+    page = [{"tag": f"#P{i}", "name": f"p{i}", "trophies": 9000 - i, "rank": i + 1} for i in range(n)]
+    return lambda: _save_page(conn, "global", page, "next")
+
+
+@case("scouting.faced_decks", [25], [25, 200])
+def _faced_decks(n):
+    from scouting import faced_decks
+
+    scouted = [{"battlelog": datagen.battlelog(25, seed=i)} for i in range(n)]
+    return lambda: faced_decks(scouted, trophies=0)
+
+
+@case("scheduler.acquire", [1, 8], [1, 8, 64])
+def _scheduler_acquire(n):
+    from scheduler import Scheduler
+
+    sched = Scheduler("bench", [f"token{i}" for i in range(n)], rate=1e9, burst=1e9)
+    return sched.acquire
+
+
+@case("jobqueue.claim_complete", [100], [100, 1000])
+def _jobqueue_claim_complete(n):
+    import jobqueue
+
+    path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+    for i in range(n):
+        jobqueue.enqueue("bench", {"i": i}, path=path)
+
+    def run():
+        job = jobqueue.claim("bench", path=path)
+        if job is None:
+            jobqueue.enqueue("bench", path=path)
+            job = jobqueue.claim("bench", path=path)
+        jobqueue.complete(job["id"], "bench", {}, path=path)
+
+    return run
+
+
+@case("digest.generate", [50], [50, 500])
+def _digest_generate(n):
+    from digest import generate_digests
+
+    root = tempfile.mkdtemp()
+    logs = {f"P{i}": datagen.battlelog(25, seed=i) for i in range(n)}
+    return lambda: generate_digests(
+        list(logs), lambda tag: {"trophies": 6000}, logs.__getitem__,
+        archive_root=os.path.join(root, "archive"), path=os.path.join(root, "digests.db"),
+    )
+
+
+@case("user_store.load_progress", [100], [100, 2000])
+def _user_store_load_progress(n):
+    import user_store
+
+    root = tempfile.mkdtemp()
+    for i in range(n):
+        for day in range(1, 31):
+            user_store.record_progress(f"P{i}", {"date": f"2024-06-{day:02d}", "trophies": day}, root)
+    return lambda: user_store.load_progress("P0", start="2024-06-15", root=root)
+
+
+def _auth_db(n: int) -> str:
+    import sqlite3
+    from auth import init_db
+
+    path = os.path.join(tempfile.mkdtemp(), "users.db")
+    init_db(path)
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO users (email, pw_hash, player_tag, playstyle, mute_toast) VALUES (?,?,?,?,0)",
+        ((f"user{i}@example.com", "x" * 60, f"TAG{i}", "Cycle") for i in range(n)),
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+@case("auth.get_user", [100, 10_000], [100, 10_000, 100_000])
+def _get_user(n):
+    from auth import get_user
+
+    path = _auth_db(n)
+    return lambda: get_user(f"user{n // 2}@example.com", path=path)
+
+
+@case("auth.load_credentials", [100, 10_000], [100, 10_000, 100_000])
+def _load_credentials(n):
+    from auth import load_credentials
+
+    path = _auth_db(n)
+    return lambda: load_credentials(path=path)
+
+
+@case("auth.update_playstyle", [100], [100, 10_000])
+def _update_playstyle(n):
+    from auth import update_playstyle
+
+    path = _auth_db(n)
+    return lambda: update_playstyle("user0@example.com", "Siege", path=path)
+
+
+def measure(fn: Callable[[], object], repeat: int = 5, min_time: float = 0.2) -> Dict:
+    """Return best and median seconds per call, auto-scaling the loop count."""
+    start = time.perf_counter()
+    fn()
+    once = time.perf_counter() - start
+    number = max(1, int(min_time / once)) if once > 0 else 1000
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return {"best_s": min(samples), "median_s": statistics.median(samples), "loops": number, "repeat": repeat}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def run(selected: List[str], full: bool, repeat: int) -> Dict:
+    results = []
+    for name in selected:
+        spec = CASES[name]
+        for size in spec["full" if full else "quick"]:
+            fn = spec["setup"](size)
+            res = measure(fn, repeat=repeat)
+            res.update({"name": name, "size": size})
+            results.append(res)
+            print(f"{name:28s} {size:>9d}  best {res['best_s'] * 1e6:12.1f} us  median {res['median_s'] * 1e6:12.1f} us")
+    return {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "node": platform.node(),
+        "full": full,
+        "results": results,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--full", action="store_true", help="include the large sizes")
+    parser.add_argument("-k", dest="pattern", default="", help="only run cases containing this text")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", help="result file (default benchmarks/results/<commit>.json)")
+    args = parser.parse_args(argv)
+
+    selected = [name for name in CASES if args.pattern in name]
+    report = run(selected, args.full, args.repeat)
+    out = args.out or os.path.join(ROOT, "benchmarks", "results", f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"wrote {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
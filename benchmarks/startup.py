@@ -0,0 +1,120 @@
+"""Measure the cold-start import cost of streamlit_app.py.
+
+Collects the modules streamlit_app imports at top level, imports them in a
+fresh interpreter and reports wall time plus per-module cumulative time from
+``python -X importtime``. Exits non-zero when the budget is exceeded or a
+module that should load lazily is pulled in at startup.
+
+    python benchmarks/startup.py --budget-ms 1500 --json startup.json
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "streamlit_app.py")
+
+# Modules that must only load when their tab is used.
+LAZY_MODULES = ["pandas", "ollama", "meta", "gc_coach", "merge_stats", "youtube_api", "video_index", "watchlist", "synergy", "projection", "deck_batch", "scouting", "worker"]
+
+
+def eager_imports(path: str = APP) -> List[str]:
+    """Return the modules imported at the top level of the app script."""
+    with open(path) as fh:
+        tree = ast.parse(fh.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return modules
+
+
+def _run(code: str, *flags: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def leaked_modules(modules: List[str]) -> List[str]:
+    """Return lazy modules that get imported as a side effect of `modules`."""
+    code = (
+        "import sys\n"
+        + "".join(f"import {m}\n" for m in modules)
+        + f"print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    )
+    return _run(code).stdout.split()
+
+
+def wall_time_ms(modules: List[str], repeat: int = 3) -> float:
+    """Return the best-of-`repeat` time to import `modules` in a fresh interpreter."""
+    code = (
+        "import time\n"
+        "start = time.perf_counter()\n"
+        + "".join(f"import {m}\n" for m in modules)
+        + "print((time.perf_counter() - start) * 1000)"
+    )
+    return min(float(_run(code).stdout.split()[-1]) for _ in range(repeat))
+
+
+def import_profile(modules: List[str]) -> Dict[str, float]:
+    """Return cumulative import time in ms for each top-level module."""
+    proc = _run("".join(f"import {m}\n" for m in modules), "-X", "importtime")
+    profile = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        try:
+            cumulative = int(parts[1])
+        except ValueError:
+            continue
+        name = parts[2]
+        if name in modules:
+            profile[name] = cumulative / 1000
+    return profile
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "3000")))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    modules = eager_imports()
+    result = {
+        "modules": modules,
+        "wall_ms": wall_time_ms(modules, repeat=args.repeat),
+        "profile_ms": import_profile(modules),
+        "leaked": leaked_modules(modules),
+        "budget_ms": args.budget_ms,
+    }
+    for name, ms in sorted(result["profile_ms"].items(), key=lambda kv: kv[1], reverse=True):
+        print(f"{name:32s} {ms:8.1f} ms")
+    print(f"{'total (wall)':32s} {result['wall_ms']:8.1f} ms  budget {args.budget_ms:.0f} ms")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(result, fh, indent=2)
+
+    ok = True
+    if result["leaked"]:
+        print("lazy modules imported at startup: " + ", ".join(result["leaked"]))
+        ok = False
+    if result["wall_ms"] > args.budget_ms:
+        print("startup import budget exceeded")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""Dense integer ids for card names.
+
+Battles repeat the same ~120 cards with their names, ids, icon URLs and
+max levels. `CardIndex` stores each card's static fields once and hands out
+small consecutive integers, so archives and analysis arrays can refer to a
+card by a 2-byte id instead of a nested dict.
+"""
+from typing import Dict, Iterable, List, Optional
+
+# Per-battle fields; everything else on a card dict is static per card.
+DYNAMIC_FIELDS = ("level", "starLevel", "evolutionLevel", "count")
+
+
+class CardIndex:
+    """Bidirectional map between card names and dense ids (0, 1, 2, ...)."""
+
+    def __init__(self, cards: Optional[Iterable] = None):
+        self.names: List[str] = []
+        self.static: List[Dict] = []
+        self.ids: Dict[str, int] = {}
+        for card in cards or ():
+            self.add(card)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self.ids
+
+    def add(self, card) -> int:
+        """Return the id of `card` (a name or an API card dict), adding it if new."""
+        if isinstance(card, str):
+            card = {"name": card}
+        key = card["name"].lower()
+        idx = self.ids.get(key)
+        if idx is None:
+            idx = self.ids[key] = len(self.names)
+            self.names.append(card["name"])
+            self.static.append({k: v for k, v in card.items() if k not in DYNAMIC_FIELDS})
+        elif len(self.static[idx]) < len(card) - sum(f in card for f in DYNAMIC_FIELDS):
+            # a richer dict (e.g. from /cards) fills in fields a bare name lacked
+            self.static[idx] = {k: v for k, v in card.items() if k not in DYNAMIC_FIELDS}
+        return idx
+
+    def id_of(self, name: str) -> int:
+        """Return the id of a known card; raises KeyError for unknown names."""
+        return self.ids[name.lower()]
+
+    def name_of(self, idx: int) -> str:
+        return self.names[idx]
+
+    def encode(self, names: Iterable[str]) -> List[int]:
+        return [self.add(n) for n in names]
+
+    def decode(self, ids: Iterable[int]) -> List[str]:
+        return [self.names[i] for i in ids]
+
+    def card(self, idx: int, **dynamic) -> Dict:
+        """Rebuild an API-shaped card dict for `idx` with per-battle fields."""
+        return {**self.static[idx], **dynamic}
+
+    def to_list(self) -> List[Dict]:
+        return [dict(s) for s in self.static]
+
+    @classmethod
+    def from_list(cls, cards: List[Dict]) -> "CardIndex":
+        return cls(cards)
@@ -1,33 +1,102 @@
 import os
-import requests
+from typing import Dict, Iterator, List, Optional, Tuple
 
-API_BASE = "https://api.clashroyale.com/v1"
+import scheduler
+from instrument import instrumented
+from scheduler import CLASH
 
-
-def get_auth_headers():
-    token = os.getenv("CLASH_ROYALE_TOKEN")
-    if not token:
-        raise RuntimeError("CLASH_ROYALE_TOKEN environment variable not set")
-    return {"Authorization": f"Bearer {token}"}
+API_BASE = os.getenv("CLASH_API_BASE", "https://api.clashroyale.com/v1")
+PAGE_SIZE = 100
 
 
+@instrumented("clash_api")
 def get_player(player_tag: str) -> dict:
     url = f"{API_BASE}/players/%23{player_tag.upper()}"
-    resp = requests.get(url, headers=get_auth_headers(), timeout=10)
+    resp = scheduler.get(CLASH, url)
     resp.raise_for_status()
     return resp.json()
 
 
+@instrumented("clash_api")
 def get_battlelog(player_tag: str) -> list:
     url = f"{API_BASE}/players/%23{player_tag.upper()}/battlelog"
-    resp = requests.get(url, headers=get_auth_headers(), timeout=10)
+    resp = scheduler.get(CLASH, url)
     resp.raise_for_status()
     return resp.json()
 
 
+@instrumented("clash_api")
 def get_cards() -> list:
     """Return all cards with their stats."""
     url = f"{API_BASE}/cards"
-    resp = requests.get(url, headers=get_auth_headers(), timeout=10)
+    resp = scheduler.get(CLASH, url)
     resp.raise_for_status()
     return resp.json().get("items", [])
+
+
+@instrumented("clash_api")
+def get_page(url: str, service: str, params: Dict) -> dict:
+    resp = scheduler.get(service, url, params=params)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def iter_pages(
+    url: str,
+    service: str = CLASH,
+    page_size: int = PAGE_SIZE,
+    after: Optional[str] = None,
+    params: Optional[Dict] = None,
+) -> Iterator[Tuple[List[Dict], Optional[str]]]:
+    """Yield `(items, next_cursor)` per page, following `paging.cursors.after`.
+
+    `service` names the scheduler (and token pool) the requests go through.
+    Start from a saved cursor with `after`; the last page yields a None cursor.
+    Endpoints without paging info come back as a single page.
+    """
+    while True:
+        query = dict(params or {}, limit=page_size)
+        if after:
+            query["after"] = after
+        body = get_page(url, service, query)
+        items = body.get("items", [])
+        after = ((body.get("paging") or {}).get("cursors") or {}).get("after")
+        if not items:
+            after = None
+        yield items, after
+        if not after:
+            return
+
+
+def iter_items(
+    url: str, service: str = CLASH, limit: Optional[int] = None, page_size: int = PAGE_SIZE, params: Optional[Dict] = None
+) -> Iterator[Dict]:
+    """Yield items one at a time across pages, stopping after `limit` items."""
+    if limit is not None:
+        if limit <= 0:
+            return
+        page_size = min(page_size, limit)
+    seen = 0
+    for items, _ in iter_pages(url, service, page_size, params=params):
+        for item in items:
+            yield item
+            seen += 1
+            if seen == limit:
+                return
+
+
+def iter_locations(page_size: int = PAGE_SIZE) -> Iterator[Dict]:
+    """Yield every location (regions and countries) known to the API."""
+    return iter_items(f"{API_BASE}/locations", page_size=page_size)
+
+
+def location_rankings_url(location_id, board: str = "rankings/players") -> str:
+    """URL of a location leaderboard; `board` is e.g. "rankings/players" or "pathoflegend/players"."""
+    return f"{API_BASE}/locations/{location_id}/{board}"
+
+
+def iter_location_rankings(
+    location_id, limit: Optional[int] = None, board: str = "rankings/players", page_size: int = PAGE_SIZE
+) -> Iterator[Dict]:
+    """Yield ranked players of one location's leaderboard, best first."""
+    return iter_items(location_rankings_url(location_id, board), CLASH, limit, page_size)
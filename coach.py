@@ -1,10 +1,27 @@
+import hashlib
+import json
 import os
-from typing import List, Dict
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Iterator, List, Optional
 
-try:
-    import ollama
-except Exception:  # pragma: no cover - optional dependency
-    ollama = None
+from coach_rules import engine as rule_engine
+from instrument import count, instrumented, observe
+
+# ollama is imported on first use; it is slow to import and optional.
+ollama = None
+
+
+def _load_ollama():
+    global ollama
+    if ollama is None:
+        try:
+            import ollama as module
+        except Exception:  # pragma: no cover - optional dependency
+            return None
+        ollama = module
+    return ollama
 
 
 def get_model() -> str:
@@ -12,16 +29,251 @@ def get_model() -> str:
     return os.getenv("OLLAMA_MODEL", "qwen:7b")
 
 
+def get_timeout() -> float:
+    return float(os.getenv("OLLAMA_TIMEOUT", "60"))
+
+
+@instrumented("coach")
 def request_coaching(messages: List[Dict[str, str]]) -> str:
     """Send a chat completion request to a local Ollama server."""
-    if ollama is None:
+    if _load_ollama() is None:
         raise RuntimeError("ollama package not installed")
     response = ollama.chat(model=get_model(), messages=messages)
     return response["message"]["content"]
 
 USE_QWEN = os.getenv("USE_QWEN_COACH", "0") == "1"
 
+SYSTEM_PROMPT = "Tu es coach Clash Royale."
+
+# Bucket widths used when normalizing a context for the response cache.
+BUCKETS = {"win_rate": 0.05, "aggro": 0.25}
+
+
+def normalize_context(ctx: Dict) -> Dict:
+    """Return a canonical form of `ctx` so near-identical contexts share answers."""
+    norm = {}
+    for key in sorted(ctx):
+        value = ctx[key]
+        if value is None:
+            continue
+        if isinstance(value, float):
+            if value == float("inf"):
+                value = "inf"
+            else:
+                step = BUCKETS.get(key, 0.01)
+                value = round(round(value / step) * step, 2)
+        norm[key] = value
+    return norm
+
+
+def build_messages(ctx: Dict) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": json.dumps(normalize_context(ctx), sort_keys=True)},
+    ]
+
+
+class OllamaModel:
+    """Streaming chat against a local Ollama server with a request timeout."""
+
+    def __init__(self, model: Optional[str] = None, timeout: Optional[float] = None):
+        if _load_ollama() is None:
+            raise RuntimeError("ollama package not installed")
+        self.model = model or get_model()
+        self.client = ollama.Client(timeout=timeout or get_timeout())
+
+    def stream(self, messages: List[Dict[str, str]]) -> Iterator[Dict]:
+        for chunk in self.client.chat(model=self.model, messages=messages, stream=True):
+            yield chunk
+
+
+class FakeModel:
+    """Deterministic stand-in for the LLM, shaped like Ollama stream chunks."""
+
+    def __init__(self, reply: str = "Keep practicing and review your replays.", delay: float = 0.0, load_time: float = 0.0):
+        self.model = "fake"
+        self.reply = reply
+        self.delay = delay
+        self.load_time = load_time
+        self.calls = 0
+
+    def stream(self, messages: List[Dict[str, str]]) -> Iterator[Dict]:
+        self.calls += 1
+        if self.load_time:
+            time.sleep(self.load_time)
+        words = self.reply.split(" ")
+        for i, word in enumerate(words):
+            if self.delay:
+                time.sleep(self.delay)
+            token = word if i == len(words) - 1 else word + " "
+            yield {"message": {"content": token}, "done": False}
+        yield {"message": {"content": ""}, "done": True, "load_duration": int(self.load_time * 1e9)}
+
+
+class FairLimiter:
+    """FIFO admission with a concurrency cap; waiters are served in arrival order."""
+
+    def __init__(self, max_concurrency: int = 1):
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self.waiting: deque = deque()
+        self.cond = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> None:
+        ticket = object()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            self.waiting.append(ticket)
+            while self.waiting[0] is not ticket or self.active >= self.max_concurrency:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self.waiting.remove(ticket)
+                    self.cond.notify_all()
+                    raise TimeoutError("coaching queue is full, try again shortly")
+                self.cond.wait(remaining)
+            self.waiting.popleft()
+            self.active += 1
+            self.cond.notify_all()
+
+    def release(self) -> None:
+        with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
 
+    @property
+    def queue_depth(self) -> int:
+        return len(self.waiting)
+
+
+class CoachService:
+    """Cached, queued and streaming access to the coaching model.
+
+    Identical normalized contexts are answered from an LRU cache, and a
+    request whose context is already being generated waits for that answer
+    instead of starting another model call.
+    """
+
+    def __init__(self, model=None, max_concurrency: int = 1, cache_size: int = 256, ttl: float = 3600, queue_timeout: float = 120):
+        self._model = model
+        self.limiter = FairLimiter(max_concurrency)
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.queue_timeout = queue_timeout
+        self.cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self.inflight: Dict[str, threading.Event] = {}
+        self.lock = threading.Lock()
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "requests": 0,
+            "ttft": deque(maxlen=1000),
+            "total": deque(maxlen=1000),
+            "load": deque(maxlen=1000),
+        }
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = OllamaModel()
+        return self._model
+
+    def cache_key(self, ctx: Dict) -> str:
+        raw = json.dumps([getattr(self._model, "model", get_model()), normalize_context(ctx)], sort_keys=True)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def _cached(self, key: str) -> Optional[str]:
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is None or time.time() - entry[1] > self.ttl:
+                return None
+            self.cache.move_to_end(key)
+            return entry[0]
+
+    def _store(self, key: str, text: str) -> None:
+        with self.lock:
+            self.cache[key] = (text, time.time())
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def stream(self, ctx: Dict) -> Iterator[str]:
+        """Yield the coaching answer token by token."""
+        key = self.cache_key(ctx)
+        self.metrics["requests"] += 1
+        while True:
+            text = self._cached(key)
+            if text is not None:
+                self.metrics["hits"] += 1
+                count("crtool_cache_requests_total", cache="coach", result="hit")
+                yield text
+                return
+            with self.lock:
+                pending = self.inflight.get(key)
+                if pending is None:
+                    self.inflight[key] = threading.Event()
+                    break
+            if not pending.wait(self.queue_timeout):
+                raise TimeoutError("coaching request timed out")
+            if self._cached(key) is None:
+                # the leading request failed; try generating ourselves
+                continue
+        self.metrics["misses"] += 1
+        count("crtool_cache_requests_total", cache="coach", result="miss")
+        try:
+            self.limiter.acquire(timeout=self.queue_timeout)
+            try:
+                start = time.perf_counter()
+                parts = []
+                for chunk in self.model.stream(build_messages(ctx)):
+                    token = chunk.get("message", {}).get("content", "")
+                    if token:
+                        if not parts:
+                            self.metrics["ttft"].append(time.perf_counter() - start)
+                            observe("crtool_coach_ttft_seconds", self.metrics["ttft"][-1])
+                        parts.append(token)
+                        yield token
+                    if chunk.get("done"):
+                        self.metrics["load"].append(chunk.get("load_duration", 0) / 1e9)
+                self.metrics["total"].append(time.perf_counter() - start)
+                observe("crtool_coach_generation_seconds", self.metrics["total"][-1])
+            finally:
+                self.limiter.release()
+            self._store(key, "".join(parts))
+        finally:
+            with self.lock:
+                self.inflight.pop(key).set()
+
+    def ask(self, ctx: Dict) -> str:
+        return "".join(self.stream(ctx))
+
+    def stats(self) -> Dict:
+        def avg(values):
+            return sum(values) / len(values) if values else 0.0
+
+        m = self.metrics
+        lookups = m["hits"] + m["misses"]
+        return {
+            "requests": m["requests"],
+            "cache_hit_rate": m["hits"] / lookups if lookups else 0.0,
+            "avg_ttft": avg(m["ttft"]),
+            "avg_total": avg(m["total"]),
+            "avg_load": avg(m["load"]),
+            "queue_depth": self.limiter.queue_depth,
+        }
+
+
+_service: Optional[CoachService] = None
+
+
+def get_service() -> CoachService:
+    """Return the process-wide coaching service shared by all sessions."""
+    global _service
+    if _service is None:
+        _service = CoachService(max_concurrency=int(os.getenv("COACH_CONCURRENCY", "1")))
+    return _service
+
+
+@instrumented("coach")
 def heuristic_tips(ctx: Dict) -> str:
     msgs = []
     wr = ctx.get("win_rate", 0)
@@ -36,13 +288,30 @@ def heuristic_tips(ctx: Dict) -> str:
     return " ".join(msgs)
 
 
-def get_tips(ctx: Dict) -> str:
-    if USE_QWEN:
-        if ollama is None:
+def stream_tips(ctx: Dict) -> Iterator[str]:
+    """Yield tips incrementally.
+
+    The compiled rule tier answers first; only contexts no rule covers
+    reach the LLM, which streams tokens as they arrive.
+    """
+    tips = rule_engine.evaluate(ctx)
+    count("crtool_coach_rule_requests_total", result="hit" if tips else "miss")
+    if tips:
+        yield " ".join(tips)
+    elif USE_QWEN:
+        if _load_ollama() is None:
             raise RuntimeError("USE_QWEN_COACH set but ollama not installed")
-        messages = [
-            {"role": "system", "content": "Tu es coach Clash Royale."},
-            {"role": "user", "content": str(ctx)},
-        ]
-        return request_coaching(messages)
-    return heuristic_tips(ctx)
\ No newline at end of file
+        yield from get_service().stream(ctx)
+    else:
+        yield heuristic_tips(ctx)
+
+
+@instrumented("coach")
+def get_tips(ctx: Dict) -> str:
+    return "".join(stream_tips(ctx))
+
+
+def rule_stats() -> Dict:
+    """Return the rule tier hit rate and the model time it saved."""
+    avg = _service.stats()["avg_total"] if _service is not None else 0.0
+    return rule_engine.stats(avg_model_seconds=avg)
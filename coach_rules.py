@@ -0,0 +1,80 @@
+"""Rule tier for coaching tips, evaluated before any LLM call.
+
+Rules are declared as data and compiled once into per-key predicate
+tables, so evaluating a context only touches the rules whose inputs are
+present in it.
+"""
+import operator
+from typing import Callable, Dict, List, Optional, Tuple
+
+# (name, context key(s), operator, threshold, tip)
+RULES = [
+    ("tilt", "tilt", "truthy", None, "Tilt detected. Take a short break."),
+    ("low_win_rate", "win_rate", "<", 0.4, "Low win rate; try a different deck."),
+    ("high_win_rate", "win_rate", ">", 0.6, "Great job! Keep pushing."),
+    ("no_anti_air", "anti_air", "is", False, "Your cycle leaves you without anti-air; keep an air defender in hand."),
+    ("no_spell", "spell", "is", False, "You cycle your spells out together; keep one spell in hand."),
+    ("no_wincon", "wincon", "is", False, "Your win condition sits out of hand too long; cycle back to it faster."),
+    ("passive_start", "aggro", "<", 0.5, "You spend far less elixir than your opponent early; apply pressure in the first minute."),
+    ("overcommit", "aggro", ">", 2.0, "You overspend in the first minute; defend first and counter-push."),
+    ("elixir_leak", "elixir_leak", ">", 5.0, "You leak elixir at 10; play a card before you max out."),
+    ("low_deck_score", "deck_score", "<", 60, "The deck's elixir curve is off; rebalance cheap and heavy cards."),
+    ("playstyle_mismatch", ("playstyle", "detected_playstyle"), "!=", None, "Your deck plays like {detected_playstyle}, not {playstyle}; adjust your game plan."),
+]
+
+_OPS = {
+    "<": operator.lt,
+    ">": operator.gt,
+    "is": operator.is_,
+    "!=": operator.ne,
+}
+
+
+def _compile(key, op: str, threshold) -> Callable[[Dict], bool]:
+    if op == "truthy":
+        return lambda ctx: bool(ctx[key])
+    fn = _OPS[op]
+    if isinstance(key, tuple):
+        a, b = key
+        return lambda ctx: ctx[a] is not None and ctx[b] is not None and fn(ctx[a], ctx[b])
+    return lambda ctx: ctx[key] is not None and fn(ctx[key], threshold)
+
+
+class RuleEngine:
+    """Compiled coaching rules with hit-rate accounting."""
+
+    def __init__(self, rules: Optional[List[Tuple]] = None):
+        self.rules = rules if rules is not None else RULES
+        # first input key -> [(rule order, required keys, predicate, tip)]
+        self.table: Dict[str, List[Tuple[int, Tuple[str, ...], Callable, str]]] = {}
+        for order, (name, key, op, threshold, tip) in enumerate(self.rules):
+            keys = key if isinstance(key, tuple) else (key,)
+            self.table.setdefault(keys[0], []).append((order, keys, _compile(key, op, threshold), tip))
+        self.hits = 0
+        self.misses = 0
+
+    def evaluate(self, ctx: Dict) -> List[str]:
+        """Return the tips of every rule that fires, in declaration order."""
+        fired = []
+        for key in ctx.keys() & self.table.keys():
+            for order, keys, pred, tip in self.table[key]:
+                if all(k in ctx for k in keys) and pred(ctx):
+                    fired.append((order, tip.format(**ctx) if "{" in tip else tip))
+        fired.sort()
+        if fired:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return [tip for _, tip in fired]
+
+    def stats(self, avg_model_seconds: float = 0.0) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "evaluated": total,
+            "hit_rate": self.hits / total if total else 0.0,
+            "llm_calls_saved": self.hits,
+            "model_seconds_saved": self.hits * avg_model_seconds,
+        }
+
+
+engine = RuleEngine()
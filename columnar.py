@@ -0,0 +1,254 @@
+"""Read-only, memory-mapped columnar views of stored datasets.
+
+A table is a directory of `.npy` files (one per column) plus `table.json`
+with row count and attributes. Columns open with `numpy.load(mmap_mode="r")`,
+so nothing is parsed or copied: pages are read on demand and shared through
+the OS page cache by every Streamlit worker that maps the same files.
+
+Each export is written to its own version directory inside the table path
+and published by atomically replacing the `CURRENT` pointer file, so
+concurrent exporters never touch each other's files and readers always see
+one complete version. A `Table` maps all its columns when it is opened.
+
+    export_archive("battle_archive/ABC.crba", "columns/ABC")
+    table = Table("columns/ABC")
+    compute_win_rate(table)                       # analysis works on the view
+    table.time_slice(start, end)["team_crowns"]   # zero-copy slice
+
+Battle tables are sorted by time (oldest first) and store cards as ids into
+the `cards` attribute (a `CardIndex` list); missing cards are NO_CARD.
+"""
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from card_index import CardIndex
+from records import norm_tag
+
+COLUMN_DIR = "columns"
+CURRENT = "CURRENT"
+NO_CARD = 0xFFFF
+DECK_SIZE = 8
+
+
+class _Columns:
+    """Mapping-like access shared by tables and slices of them."""
+
+    attrs: Dict
+
+    def column(self, name: str) -> np.ndarray:
+        raise NotImplementedError
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.column(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names
+
+    @property
+    def names(self) -> List[str]:
+        return self.attrs["columns"]
+
+    def time_slice(self, start: Optional[int] = None, end: Optional[int] = None) -> "TableSlice":
+        """Rows with start <= time <= end (epoch seconds) as a zero-copy view."""
+        times = self.column("time")
+        lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        hi = len(times) if end is None else int(np.searchsorted(times, end, side="right"))
+        return TableSlice(self, lo, hi)
+
+    def tail(self, n: int) -> "TableSlice":
+        return TableSlice(self, max(0, len(self) - n), len(self))
+
+
+def _current(path: str) -> Optional[str]:
+    """Name of the published version directory of the table at `path`."""
+    try:
+        with open(os.path.join(path, CURRENT)) as fh:
+            return fh.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class Table(_Columns):
+    """A directory of memory-mapped columns."""
+
+    def __init__(self, path: str):
+        self.path = path
+        while True:
+            version = _current(path)
+            # tables written before versioning keep their files in `path` itself
+            self.dir = os.path.join(path, version) if version else path
+            try:
+                self._open()
+                return
+            except FileNotFoundError:
+                # two newer exports were published and pruned this version meanwhile
+                if version is None or _current(path) == version:
+                    raise
+
+    def _open(self) -> None:
+        with open(os.path.join(self.dir, "table.json")) as fh:
+            self.attrs = json.load(fh)
+        # Map every column now so they all come from one version, even if a
+        # newer export is published while the table is in use.
+        self._columns: Dict[str, np.ndarray] = {
+            name: np.load(os.path.join(self.dir, f"{name}.npy"), mmap_mode="r") for name in self.attrs["columns"]
+        }
+
+    def __len__(self) -> int:
+        return self.attrs["rows"]
+
+    def column(self, name: str) -> np.ndarray:
+        return self._columns[name]
+
+    @property
+    def cards(self) -> CardIndex:
+        return CardIndex.from_list(self.attrs.get("cards", []))
+
+
+class TableSlice(_Columns):
+    """Rows [lo, hi) of a table; columns are views, not copies."""
+
+    def __init__(self, table: _Columns, lo: int, hi: int):
+        self.table = table
+        self.lo, self.hi = lo, hi
+        self.attrs = table.attrs
+
+    def __len__(self) -> int:
+        return self.hi - self.lo
+
+    def column(self, name: str) -> np.ndarray:
+        return self.table.column(name)[self.lo:self.hi]
+
+
+def write_table(path: str, columns: Dict[str, np.ndarray], attrs: Optional[Dict] = None) -> Table:
+    """Write columns of equal length to `path` as a new version and publish it."""
+    from battle_archive import locked
+
+    lengths = {len(c) for c in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"columns have different lengths: {sorted(lengths)}")
+    os.makedirs(path, exist_ok=True)
+    tmp = os.path.join(path, f".tmp-{os.getpid()}-{uuid.uuid4().hex}")
+    os.makedirs(tmp)
+    for name, values in columns.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(values))
+    meta = dict(attrs or {}, rows=lengths.pop() if lengths else 0, columns=list(columns))
+    with open(os.path.join(tmp, "table.json"), "w") as fh:
+        json.dump(meta, fh)
+    with locked(path):
+        previous = _current(path)
+        version = f"v{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        os.rename(tmp, os.path.join(path, version))
+        pointer = os.path.join(path, f"{CURRENT}.tmp")
+        with open(pointer, "w") as fh:
+            fh.write(version)
+        os.replace(pointer, os.path.join(path, CURRENT))
+        # Keep the previous version for readers that read the old pointer but
+        # have not mapped its columns yet; mapped files survive being unlinked.
+        for entry in os.listdir(path):
+            full = os.path.join(path, entry)
+            if entry == "table.json" or entry.endswith(".npy"):
+                os.remove(full)
+            elif entry.startswith("v") and entry not in (version, previous) and os.path.isdir(full):
+                shutil.rmtree(full, ignore_errors=True)
+    return Table(path)
+
+
+def _deck(player: Dict, cards: CardIndex, row: np.ndarray, levels: np.ndarray) -> None:
+    for j, card in enumerate(player.get("cards", [])[:DECK_SIZE]):
+        row[j] = cards.add(card)
+        levels[j] = card.get("level", 0)
+
+
+def battle_columns(battles: Iterable[Dict], cards: Optional[CardIndex] = None) -> Tuple[Dict, Dict]:
+    """Return (columns, attrs) for battles given oldest first."""
+    from battle_archive import parse_time
+
+    battles = list(battles)
+    cards = cards or CardIndex()
+    n = len(battles)
+    modes: Dict[str, int] = {}
+    cols = {
+        "time": np.zeros(n, dtype=np.int64),
+        "pvp": np.zeros(n, dtype=np.bool_),
+        "mode": np.zeros(n, dtype=np.uint16),
+        "team_crowns": np.zeros(n, dtype=np.uint8),
+        "opp_crowns": np.zeros(n, dtype=np.uint8),
+        "trophy_change": np.zeros(n, dtype=np.int16),
+        "team_cards": np.full((n, DECK_SIZE), NO_CARD, dtype=np.uint16),
+        "opp_cards": np.full((n, DECK_SIZE), NO_CARD, dtype=np.uint16),
+        "team_levels": np.zeros((n, DECK_SIZE), dtype=np.uint8),
+        "opp_levels": np.zeros((n, DECK_SIZE), dtype=np.uint8),
+    }
+    for i, battle in enumerate(battles):
+        team = (battle.get("team") or [{}])[0]
+        opp = (battle.get("opponent") or [{}])[0]
+        cols["time"][i] = parse_time(battle["battleTime"])
+        cols["pvp"][i] = battle.get("type") == "PvP"
+        mode = battle.get("gameMode", {}).get("name") or battle.get("type", "")
+        cols["mode"][i] = modes.setdefault(mode, len(modes))
+        cols["team_crowns"][i] = team.get("crowns", 0)
+        cols["opp_crowns"][i] = opp.get("crowns", 0)
+        cols["trophy_change"][i] = team.get("trophyChange", 0)
+        _deck(team, cards, cols["team_cards"][i], cols["team_levels"][i])
+        _deck(opp, cards, cols["opp_cards"][i], cols["opp_levels"][i])
+    return cols, {"kind": "battles", "modes": list(modes), "cards": cards.to_list()}
+
+
+def export_battles(battles: Iterable[Dict], path: str) -> Table:
+    """Write battles (any order) as a battle table sorted by time."""
+    ordered = sorted(battles, key=lambda b: b.get("battleTime", ""))
+    cols, attrs = battle_columns(ordered)
+    return write_table(path, cols, attrs)
+
+
+def export_archive(archive_path: str, path: str) -> Table:
+    """Write the battles of a `battle_archive` file as a battle table."""
+    from battle_archive import ArchiveReader
+
+    with ArchiveReader(archive_path) as reader:
+        cols, attrs = battle_columns(reader.scan(), reader.cards)
+    attrs["source_mtime"] = os.path.getmtime(archive_path)
+    return write_table(path, cols, attrs)
+
+
+def battles_view(player_tag: str, archive_root: Optional[str] = None, root: str = COLUMN_DIR) -> Optional[Table]:
+    """Return the player's battle table, re-exporting it when the archive changed."""
+    from battle_archive import ARCHIVE_DIR, archive_path
+
+    source = archive_path(player_tag, archive_root or ARCHIVE_DIR)
+    if not os.path.exists(source):
+        return None
+    path = os.path.join(root, "battles", norm_tag(player_tag))
+    try:
+        table = Table(path)
+    except FileNotFoundError:
+        table = None
+    if table is not None and table.attrs.get("source_mtime") == os.path.getmtime(source):
+        return table
+    return export_archive(source, path)
+
+
+def leaderboard_columns(players: Iterable[Dict]) -> Tuple[Dict, Dict]:
+    players = list(players)
+    cols = {
+        "rank": np.array([p.get("rank", i + 1) for i, p in enumerate(players)], dtype=np.int32),
+        "tag": np.array([p.get("tag", "") for p in players], dtype="S16"),
+        "trophies": np.array([p.get("trophies", 0) for p in players], dtype=np.int32),
+        "rank_points": np.array([p.get("rank_points", 0) for p in players], dtype=np.int32),
+        "wins": np.array([p.get("wins", 0) for p in players], dtype=np.int32),
+        "losses": np.array([p.get("losses", 0) for p in players], dtype=np.int32),
+        "leagueRank": np.array([p.get("leagueRank", 0) for p in players], dtype=np.int16),
+    }
+    return cols, {"kind": "leaderboard"}
+
+
+def export_leaderboard(players: Iterable[Dict], path: str) -> Table:
+    cols, attrs = leaderboard_columns(players)
+    return write_table(path, cols, attrs)
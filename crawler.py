@@ -0,0 +1,137 @@
+"""Resumable crawl of every location's player leaderboard into SQLite.
+
+Leaderboards are read page by page with the cursor clients in `clash_api`,
+so only one page is held in memory at a time. Each page's players and the
+location's next cursor are written in the same transaction; an interrupted
+crawl picks up from the last saved cursor. Players showing up on several
+pages or locations are stored once, keyed by tag, with their best rank.
+
+    python crawler.py            # walk all locations, resuming where it stopped
+"""
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, Iterable, List, Optional
+
+import sqlite_store
+from clash_api import PAGE_SIZE, iter_locations, iter_pages, location_rankings_url
+from profiler import new_job_id, profile_job
+from scheduler import CLASH, CRAWL, get_scheduler, lane
+
+CRAWL_DB = "crawler.db"
+GLOBAL = {"id": "global", "name": "Global"}
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS locations (id TEXT PRIMARY KEY, name TEXT, cursor TEXT, "
+    "pages INTEGER DEFAULT 0, done INTEGER DEFAULT 0, updated REAL)",
+    "CREATE TABLE IF NOT EXISTS players (tag TEXT PRIMARY KEY, name TEXT, trophies INTEGER, "
+    "rank INTEGER, location TEXT, seen REAL)",
+)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    return sqlite_store.connect(path, SCHEMA)
+
+
+def init_db(path: str = CRAWL_DB) -> None:
+    sqlite_store.init_db(path, SCHEMA)
+
+
+def add_locations(locations: Iterable[Dict], path: str = CRAWL_DB) -> int:
+    """Queue locations for crawling; already known ones keep their checkpoint.
+
+    All of them are added in one transaction: if `locations` raises midway
+    (e.g. a failing listing), none are.
+    """
+    with closing(_connect(path)) as conn, conn:
+        cur = conn.executemany(
+            "INSERT OR IGNORE INTO locations (id, name) VALUES (?,?)",
+            ((str(loc["id"]), loc.get("name", "")) for loc in locations),
+        )
+        return cur.rowcount
+
+
+def _save_page(conn: sqlite3.Connection, location: str, items: List[Dict], cursor: Optional[str]) -> None:
+    now = time.time()
+    rows = [
+        (p["tag"].lstrip("#").upper(), p.get("name", ""), p.get("trophies", p.get("eloRating")), p.get("rank"), location, now)
+        for p in items
+        if p.get("tag")
+    ]
+    with conn:  # one transaction, rolled back if anything fails
+        conn.executemany(
+            "INSERT INTO players (tag, name, trophies, rank, location, seen) VALUES (?,?,?,?,?,?) "
+            "ON CONFLICT(tag) DO UPDATE SET name=excluded.name, trophies=excluded.trophies, seen=excluded.seen, "
+            "location=CASE WHEN excluded.rank < rank THEN excluded.location ELSE location END, "
+            "rank=MIN(rank, excluded.rank)",
+            rows,
+        )
+        conn.execute(
+            "UPDATE locations SET cursor=?, pages=pages+1, done=?, updated=? WHERE id=?",
+            (cursor, int(cursor is None), now, location),
+        )
+
+
+def crawl(
+    path: str = CRAWL_DB,
+    locations: Optional[Iterable[Dict]] = None,
+    board: str = "rankings/players",
+    page_size: int = PAGE_SIZE,
+    max_pages: Optional[int] = None,
+) -> Dict:
+    """Crawl every unfinished location, checkpointing after each page.
+
+    `locations` defaults to the global board plus every location from the
+    API; they are stored together once the listing has completed, so a
+    failed listing is retried on the next run. Stops early after
+    `max_pages` pages. Requests go out in the scheduler's crawl lane, behind
+    interactive use.
+    """
+    get_scheduler(CLASH)  # fail before touching the store when no token is configured
+    with lane(CRAWL):
+        if locations is not None:
+            add_locations(locations, path)
+        elif not progress(path)["locations"]:
+            add_locations([GLOBAL, *iter_locations()], path)
+        pages = 0
+        with closing(_connect(path)) as conn:
+            pending = conn.execute("SELECT id, cursor FROM locations WHERE done=0 ORDER BY rowid").fetchall()
+            for location, cursor in pending:
+                url = location_rankings_url(location, board)
+                for items, cursor in iter_pages(url, CLASH, page_size, after=cursor):
+                    if max_pages is not None and pages >= max_pages:
+                        break
+                    _save_page(conn, location, items, cursor)
+                    pages += 1
+                if max_pages is not None and pages >= max_pages:
+                    break
+    return {"pages": pages, **progress(path)}
+
+
+def progress(path: str = CRAWL_DB) -> Dict:
+    """Locations known and finished, and distinct players stored."""
+    with closing(_connect(path)) as conn:
+        locations, done = conn.execute("SELECT COUNT(*), COALESCE(SUM(done), 0) FROM locations").fetchone()
+        players = conn.execute("SELECT COUNT(*) FROM players").fetchone()[0]
+    return {"locations": locations, "done": done, "players": players}
+
+
+def reset(path: str = CRAWL_DB) -> None:
+    """Clear every checkpoint so the next crawl starts again from the first page."""
+    with closing(_connect(path)) as conn, conn:
+        conn.execute("UPDATE locations SET cursor=NULL, pages=0, done=0")
+
+
+def top_players(limit: int = 100, path: str = CRAWL_DB) -> List[Dict]:
+    """Crawled players by trophies, read from the store without any network access."""
+    conn = _connect(path)
+    rows = conn.execute(
+        "SELECT tag, name, trophies, rank, location FROM players ORDER BY trophies DESC LIMIT ?", (limit,)
+    ).fetchall()
+    conn.close()
+    return [{"tag": r[0], "name": r[1], "trophies": r[2], "rank": r[3], "location": r[4]} for r in rows]
+
+
+if __name__ == "__main__":
+    with profile_job(new_job_id("crawl"), all_threads=True):
+        print(crawl())
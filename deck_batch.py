@@ -0,0 +1,131 @@
+"""Vectorized deck rating over whole deck corpora.
+
+`compute_deck_rating` and `classify_playstyle` take one deck of names at a
+time. Here a corpus is an (N, 8) array of `CardIndex` ids (the layout of the
+`team_cards`/`opp_cards` columns of a `columnar` battle table, NO_CARD for
+empty slots); per-card elixir and role flags are looked up once and every
+deck's score, average elixir, role counts and playstyle come out as arrays.
+
+    cards = CardIndex()
+    ids = encode_decks(decks, cards)
+    ratings = rate_decks(ids, get_cards(), cards)
+    for i in rank_decks(ratings, playstyle="Cycle", limit=20):
+        deck_rating(ratings, i)              # tips only for the shown rows
+
+Scores, averages and labels match the single-deck functions exactly.
+"""
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from analysis import ANTI_AIR, SPELLS, WIN_CONDITIONS, deck_tips
+from card_index import CardIndex
+from columnar import DECK_SIZE, NO_CARD
+
+PLAYSTYLES = ("Siege", "Cycle", "Control", "Beatdown", "Bait")
+ROLES = ("anti_air", "spell", "wincon", "building")
+
+
+def encode_decks(decks: Iterable[Iterable[str]], cards: CardIndex) -> np.ndarray:
+    """Encode decks of card names as an (N, 8) id array, adding unseen names to `cards`."""
+    decks = [list(deck)[:DECK_SIZE] for deck in decks]
+    known = {name: cards.add(name.strip()) for name in set(chain.from_iterable(decks))}
+    if all(len(deck) == DECK_SIZE for deck in decks):
+        flat = np.fromiter(map(known.__getitem__, chain.from_iterable(decks)), dtype=np.uint16)
+        return flat.reshape(-1, DECK_SIZE)
+    ids = np.full((len(decks), DECK_SIZE), NO_CARD, dtype=np.uint16)
+    for i, deck in enumerate(decks):
+        ids[i, :len(deck)] = [known[name] for name in deck]
+    return ids
+
+
+def card_features(cards: CardIndex, card_data: List[Dict]) -> Dict[str, np.ndarray]:
+    """Per-id elixir (NaN when unknown) and role flags; the last row stands for NO_CARD."""
+    costs = {c["name"].lower(): c.get("elixirCost", 0) for c in card_data}
+    names = [n.lower() for n in cards.names]
+    size = len(names) + 1
+    elixir = np.full(size, np.nan)
+    for i, name in enumerate(names):
+        cost = costs.get(name.strip())
+        if cost is not None:
+            elixir[i] = cost
+    features = {"elixir": elixir}
+    for role, member in (
+        ("anti_air", ANTI_AIR.__contains__),
+        ("spell", SPELLS.__contains__),
+        ("wincon", WIN_CONDITIONS.__contains__),
+        ("building", lambda n: "building" in n),
+    ):
+        features[role] = np.array([member(n) for n in names] + [False])
+    return features
+
+
+def rate_decks(ids: np.ndarray, card_data: List[Dict], cards: CardIndex) -> Dict[str, np.ndarray]:
+    """Rate every row of an (N, 8) id array; returns arrays of length N.
+
+    Keys: `score`, `average_elixir`, role counts (`anti_air`, `spell`,
+    `wincon`, `building`) and `playstyle` (an index into PLAYSTYLES).
+    """
+    features = card_features(cards, card_data)
+    sentinel = len(features["elixir"]) - 1
+    idx = np.where(ids == NO_CARD, sentinel, ids).astype(np.intp)
+
+    elixir = features["elixir"][idx]
+    known = ~np.isnan(elixir)
+    count = known.sum(axis=1)
+    total = np.where(known, elixir, 0.0).sum(axis=1)
+    average = np.divide(total, count, out=np.zeros(len(ids)), where=count > 0)
+    ratings = {
+        "average_elixir": average,
+        "score": np.clip(100 - np.abs(average - 3.5) * 20, 0.0, 100.0),
+    }
+    for role in ROLES:
+        ratings[role] = features[role][idx].sum(axis=1).astype(np.uint8)
+
+    # the same rules as classify_playstyle; decks without a known cost get no elixir-based style
+    priced = count > 0
+    ratings["playstyle"] = np.select(
+        [
+            (ratings["building"] > 0) & (ratings["wincon"] <= 1),
+            priced & (average <= 3.0),
+            ratings["spell"] >= 3,
+            priced & (average >= 4.0),
+        ],
+        [0, 1, 2, 3],
+        default=4,
+    ).astype(np.uint8)
+    return ratings
+
+
+def playstyle_labels(ratings: Dict[str, np.ndarray]) -> np.ndarray:
+    return np.array(PLAYSTYLES)[ratings["playstyle"]]
+
+
+def rank_decks(ratings: Dict[str, np.ndarray], playstyle: Optional[str] = None, limit: int = 20) -> np.ndarray:
+    """Row indices of the best-scoring decks, optionally of one playstyle."""
+    rows = np.arange(len(ratings["score"]))
+    if playstyle is not None:
+        rows = rows[ratings["playstyle"] == PLAYSTYLES.index(playstyle)]
+    scores = ratings["score"][rows]
+    if len(rows) > limit:
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        rows, scores = rows[top], scores[top]
+    return rows[np.argsort(-scores, kind="stable")]
+
+
+def deck_rating(ratings: Dict[str, np.ndarray], i: int) -> Dict:
+    """The `compute_deck_rating`-style dict for row `i`, with tips and playstyle."""
+    avg = float(ratings["average_elixir"][i])
+    return {
+        "average_elixir": avg,
+        "score": float(ratings["score"][i]),
+        "tips": deck_tips(avg),
+        "playstyle": PLAYSTYLES[ratings["playstyle"][i]],
+        "roles": {role: int(ratings[role][i]) for role in ROLES},
+    }
+
+
+def unique_decks(ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Distinct decks (card order ignored) and how often each occurs."""
+    return np.unique(np.sort(ids, axis=1), axis=0, return_counts=True)
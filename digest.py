@@ -1,28 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict
-import json
+from typing import Callable, Iterable, List, Dict, Optional
+import logging
+import os
+import sqlite3
+import time
 
+import sqlite_store
 from clash_api import get_player, get_battlelog
+from instrument import count
 from analysis import compute_win_rate, record_daily_progress, load_progress
+from auth import DB_PATH as USERS_DB
+from battle_archive import ARCHIVE_DIR, archive_path, load as load_archive, record_battles
+from records import is_records, mentions_lucky_drop, norm_tag, parse_player
+from scheduler import WATCHLIST, lane
+
+log = logging.getLogger(__name__)
+
+DIGEST_DB = "digests.db"
+WORKERS = 4
+# the scheduled batch skips tags whose digest for today is younger than this
+MAX_AGE = float(os.getenv("CRTOOL_DIGEST_MAX_AGE", 86400))
 
 
 def has_lucky_drop(battlelog: List[Dict]) -> bool:
-    """Return True if a Lucky Drop chest appears in the log."""
-    for b in battlelog:
-        data = json.dumps(b).lower()
-        if "lucky drop" in data:
-            return True
-    return False
-
-
-def daily_digest_info(player_tag: str, progress_path: str = "progress.json") -> Dict:
-    """Return today's trophy delta, league step delta and win rate."""
-    player = get_player(player_tag)
-    battles = get_battlelog(player_tag)
+    """Return True if a Lucky Drop chest appears in the log (API dicts or `Battle` records alike)."""
+    if is_records(battlelog):
+        return any(b.lucky_drop for b in battlelog)
+    return any(mentions_lucky_drop(b) for b in battlelog)
+
+
+def daily_digest_info(
+    player_tag: str,
+    progress_path: str = "progress.json",
+    player: Optional[Dict] = None,
+    battles: Optional[List[Dict]] = None,
+) -> Dict:
+    """Return today's trophy delta, league step delta and win rate.
+
+    Pass already fetched `player` and `battles` to skip the API calls; they
+    may be API dicts or a `PlayerSnapshot` and `Battle` records.
+    """
+    if player is None:
+        player = get_player(player_tag)
+    if isinstance(player, dict):
+        player = parse_player(player)
+    if battles is None:
+        battles = get_battlelog(player_tag)
     record_daily_progress(
         battles,
-        player.get("trophies", 0),
-        player.get("leagueRank", 0),
+        player.trophies,
+        player.league_rank,
         path=progress_path,
     )
     progress = load_progress(path=progress_path)
@@ -36,21 +64,187 @@ def daily_digest_info(player_tag: str, progress_path: str = "progress.json") ->
         delta_trophies = today["trophies"] - prev.get("trophies", 0)
         delta_step = today.get("league_rank", 0) - prev.get("league_rank", 0)
 
-    cutoff = datetime.now(timezone.utc) - timedelta(days=1)
-    recent = [
-        b
-        for b in battles
-        if datetime.strptime(b.get("battleTime"), "%Y%m%dT%H%M%S.000Z").replace(tzinfo=timezone.utc)
-        > cutoff
-    ]
-    wr = compute_win_rate(recent)
-
     return {
         "date": today["date"],
         "trophies": today["trophies"],
         "delta_trophies": delta_trophies,
         "league_rank": today.get("league_rank", 0),
         "delta_step": delta_step,
-        "win_rate": wr,
+        "win_rate": compute_win_rate(_last_day(battles)),
         "lucky_drop": has_lucky_drop(battles),
     }
+
+
+def _last_day(battles) -> list:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=1)
+    if is_records(battles):
+        return [b for b in battles if b.time > cutoff.timestamp()]
+    return [
+        b
+        for b in battles
+        if datetime.strptime(b.get("battleTime"), "%Y%m%dT%H%M%S.000Z").replace(tzinfo=timezone.utc)
+        > cutoff
+    ]
+
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS digests (tag TEXT, date TEXT, trophies INTEGER, league_rank INTEGER, "
+    "delta_trophies INTEGER, delta_step INTEGER, win_rate REAL, lucky_drop INTEGER, created REAL, "
+    "PRIMARY KEY (tag, date))",
+)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    return sqlite_store.connect(path, SCHEMA)
+
+
+def init_db(path: str = DIGEST_DB) -> None:
+    sqlite_store.init_db(path, SCHEMA)
+
+
+def digest_tags(users_path: str = USERS_DB) -> List[str]:
+    """Distinct player tags of the registered users who have not muted the toast."""
+    conn = sqlite3.connect(users_path)
+    rows = conn.execute(
+        "SELECT DISTINCT player_tag FROM users WHERE COALESCE(mute_toast, 0)=0 AND player_tag != ''"
+    ).fetchall()
+    conn.close()
+    return sorted({norm_tag(r[0]) for r in rows if r[0] and r[0].strip()})
+
+
+def _fresh(conn: sqlite3.Connection, tags: List[str], date: str, since: float) -> set:
+    """Tags with a digest for `date` stored at or after `since`."""
+    fresh = set()
+    for i in range(0, len(tags), 500):
+        chunk = tags[i:i + 500]
+        rows = conn.execute(
+            f"SELECT tag FROM digests WHERE date = ? AND created >= ? AND tag IN ({','.join('?' * len(chunk))})",
+            [date, since] + chunk,
+        ).fetchall()
+        fresh.update(r[0] for r in rows)
+    return fresh
+
+
+def _previous(conn: sqlite3.Connection, tags: List[str], date: str) -> Dict[str, tuple]:
+    """Latest (trophies, league_rank) stored before `date` for each tag."""
+    prev = {}
+    for i in range(0, len(tags), 500):
+        chunk = tags[i:i + 500]
+        rows = conn.execute(
+            f"SELECT tag, trophies, league_rank, MAX(date) FROM digests WHERE date < ? "
+            f"AND tag IN ({','.join('?' * len(chunk))}) GROUP BY tag",
+            [date] + chunk,
+        ).fetchall()
+        prev.update({r[0]: (r[1], r[2]) for r in rows})
+    return prev
+
+
+def generate_digests(
+    tags: Optional[Iterable[str]] = None,
+    fetch_player: Callable[[str], Dict] = get_player,
+    fetch_battlelog: Callable[[str], list] = get_battlelog,
+    workers: int = WORKERS,
+    users_path: str = USERS_DB,
+    archive_root: str = ARCHIVE_DIR,
+    path: str = DIGEST_DB,
+    max_age: Optional[float] = None,
+) -> Dict[str, Dict]:
+    """Compute today's digest for every tag (default: all registered users) and store them.
+
+    With `max_age`, tags whose digest for today was stored less than
+    `max_age` seconds ago are skipped, so a frequent schedule costs one fetch
+    per user per day and retries only the tags that failed.
+
+    Profiles and battlelogs are fetched at most `workers` at a time in the
+    request scheduler's watchlist lane, so the batch is paced by the token
+    pool rather than by page views. Each battlelog is appended to the
+    player's battle archive (appends are locked and atomic, so this is safe
+    next to the app's own appends) and the 24h win rate is read back from
+    it; the deltas come from the tag's previous stored digest. All rows are
+    written in one transaction. Returns `{tag: digest}`; tags whose fetch
+    fails are logged and left out.
+    """
+    tags = list(dict.fromkeys(norm_tag(t) for t in (digest_tags(users_path) if tags is None else tags) if t))
+    if not tags:
+        return {}
+    date = datetime.now(timezone.utc).date().isoformat()
+    conn = _connect(path)
+    if max_age is not None:
+        fresh = _fresh(conn, tags, date, time.time() - max_age)
+        tags = [t for t in tags if t not in fresh]
+    prev = _previous(conn, tags, date)
+    conn.close()
+    if not tags:
+        return {}
+
+    def one(tag: str) -> Optional[Dict]:
+        try:
+            with lane(WATCHLIST):
+                player = fetch_player(tag)
+                battles = fetch_battlelog(tag)
+        except Exception:
+            log.warning("digest: fetching %s failed", tag, exc_info=True)
+            count("crtool_digest_failures_total", stage="fetch")
+            return None
+        if isinstance(player, dict):
+            player = parse_player(player)
+        recent = battles
+        try:
+            record_battles(tag, battles, archive_root)
+            recent = load_archive(archive_path(tag, archive_root), start=time.time() - 86400)
+        except Exception:
+            # the win rate falls back to the fetched battlelog
+            log.warning("digest: battle archive of %s not updated", tag, exc_info=True)
+            count("crtool_digest_failures_total", stage="archive")
+        trophies, league_rank = prev.get(tag, (player.trophies, player.league_rank))
+        return {
+            "date": date,
+            "trophies": player.trophies,
+            "delta_trophies": player.trophies - trophies,
+            "league_rank": player.league_rank,
+            "delta_step": player.league_rank - league_rank,
+            "win_rate": compute_win_rate(_last_day(recent)),
+            "lucky_drop": has_lucky_drop(battles),
+        }
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tags)))) as pool:
+        results = list(pool.map(one, tags))
+    digests = {tag: d for tag, d in zip(tags, results) if d is not None}
+    now = time.time()
+    conn = _connect(path)
+    conn.executemany(
+        "INSERT OR REPLACE INTO digests VALUES (?,?,?,?,?,?,?,?,?)",
+        [
+            (tag, d["date"], d["trophies"], d["league_rank"], d["delta_trophies"], d["delta_step"],
+             d["win_rate"], int(d["lucky_drop"]), now)
+            for tag, d in digests.items()
+        ],
+    )
+    conn.commit()
+    conn.close()
+    return digests
+
+
+def get_digest(player_tag: str, date: Optional[str] = None, path: str = DIGEST_DB) -> Optional[Dict]:
+    """Stored digest of `player_tag` for `date` (default today, UTC), or None."""
+    date = date or datetime.now(timezone.utc).date().isoformat()
+    conn = _connect(path)
+    r = conn.execute(
+        "SELECT date, trophies, delta_trophies, league_rank, delta_step, win_rate, lucky_drop "
+        "FROM digests WHERE tag=? AND date=?",
+        (norm_tag(player_tag), date),
+    ).fetchone()
+    conn.close()
+    if r is None:
+        return None
+    keys = ("date", "trophies", "delta_trophies", "league_rank", "delta_step", "win_rate", "lucky_drop")
+    return dict(zip(keys, r[:6] + (bool(r[6]),)))
+
+
+def user_digest(player_tag: str, player: Dict, battles: List[Dict], path: str = DIGEST_DB, **kwargs) -> Optional[Dict]:
+    """Today's stored digest for the tag, computed from the already fetched data when the batch has not run yet."""
+    stored = get_digest(player_tag, path=path)
+    if stored is not None:
+        return stored
+    digests = generate_digests([player_tag], lambda _: player, lambda _: battles, path=path, **kwargs)
+    return digests.get(norm_tag(player_tag))
@@ -1,9 +1,15 @@
 import json
 import os
 import time
-from typing import List, Dict
+import uuid
+from typing import List, Dict, Optional
 from analysis import classify_playstyle
-import requests
+from records import Battle
+import scheduler
+import user_store
+from scheduler import ROYALEAPI
+
+ROYALE_API_BASE = os.getenv("ROYALEAPI_BASE", "https://api.royaleapi.com")
 
 
 def _path(run_id: str) -> str:
@@ -11,33 +17,50 @@ def _path(run_id: str) -> str:
     return os.path.join("gc_runs", f"{run_id}.json")
 
 
-def start_run(deck: List[str]) -> str:
-    """Create a new Grand Challenge run and return its id."""
-    run_id = str(int(time.time()))
-    data = {"run_id": run_id, "deck": deck, "matches": []}
+def start_run(deck: List[str], user: Optional[str] = None) -> str:
+    """Create a new Grand Challenge run and return its id.
+
+    `deck` is a list of card names or a `DeckRef`. With `user` the run is
+    kept in that user's `user_store` rows instead of `gc_runs/`.
+    """
+    run_id = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    if user is not None:
+        user_store.create_run(user, run_id, list(deck))
+        return run_id
+    data = {"run_id": run_id, "deck": list(deck), "matches": []}
     with open(_path(run_id), "w") as fh:
         json.dump(data, fh)
     return run_id
 
 
-def record_match(run_id: str, win: bool, opponent_elo: int) -> None:
-    """Append a match result to the run."""
+def record_match(run_id: str, win: bool, opponent_elo: int, user: Optional[str] = None) -> bool:
+    """Append a match result to the run; False when there is no such run."""
+    if user is not None:
+        return user_store.add_match(user, run_id, win, opponent_elo)
     path = _path(run_id)
     try:
         with open(path) as fh:
             data = json.load(fh)
     except Exception:
-        return
+        return False
     data.setdefault("matches", []).append({"win": win, "elo": opponent_elo})
     with open(path, "w") as fh:
         json.dump(data, fh)
+    return True
+
 
+def record_battle(run_id: str, battle: Battle, user: Optional[str] = None) -> bool:
+    """Append a match from a `Battle` record, using the opponent's starting trophies as elo."""
+    return record_match(run_id, battle.won, battle.opponent.trophies, user=user)
 
-def summarize_run(run_id: str) -> Dict:
+
+def summarize_run(run_id: str, user: Optional[str] = None) -> Dict:
     """Return win rate and opponent average elo for the run."""
-    path = _path(run_id)
-    with open(path) as fh:
-        data = json.load(fh)
+    if user is not None:
+        data = user_store.get_run(user, run_id) or {}
+    else:
+        with open(_path(run_id)) as fh:
+            data = json.load(fh)
     matches = data.get("matches", [])
     wins = sum(1 for m in matches if m.get("win"))
     total = len(matches)
@@ -45,19 +68,20 @@ def summarize_run(run_id: str) -> Dict:
     return {"wins": wins, "total": total, "avg_elo": avg_elo}
 
 
-def get_gc_decks(limit: int = 20, playstyle: str | None = None, min_wr: float = 0.45) -> List[Dict]:
+def get_gc_decks(
+    limit: int = 20,
+    playstyle: str | None = None,
+    min_wr: float = 0.45,
+    card_data: Optional[List[Dict]] = None,
+) -> List[Dict]:
     """Fetch recent GC decks filtered by win rate and optional playstyle.
 
     The threshold is the greater of ``min_wr`` and the 75th percentile of
-    win rates among all decks returned by RoyaleAPI.
+    win rates among all decks returned by RoyaleAPI. Pass ``card_data`` so
+    the elixir-based playstyles (Cycle, Beatdown) can be told apart.
     """
-    token = os.getenv("ROYALEAPI_TOKEN")
-    if not token:
-        raise RuntimeError("ROYALEAPI_TOKEN not set")
-    url = "https://api.royaleapi.com/decks/popular?type=GC&time=7d&limit=100"
-    headers = {"Authorization": f"Bearer {token}"}
-
-    resp = requests.get(url, headers=headers, timeout=10)
+    url = f"{ROYALE_API_BASE}/decks/popular?type=GC&time=7d&limit=100"
+    resp = scheduler.get(ROYALEAPI, url)
     resp.raise_for_status()
     items = resp.json().get("items", [])
 
@@ -81,7 +105,7 @@ def get_gc_decks(limit: int = 20, playstyle: str | None = None, min_wr: float =
         if wr < threshold:
             continue
         deck_cards = it.get("cards", [])
-        if playstyle and classify_playstyle(deck_cards) != playstyle:
+        if playstyle and classify_playstyle(deck_cards, card_data) != playstyle:
             continue
         filtered.append(it)
         if len(filtered) >= limit:
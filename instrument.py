@@ -0,0 +1,229 @@
+"""Lightweight timing, counters and histograms for the hot paths.
+
+Disabled unless CRTOOL_METRICS=1 (or `enable()` is called); while disabled
+a decorated function costs one extra call and a flag check.
+
+    @instrumented("clash_api")
+    def get_player(tag): ...
+
+    with timed("coach", "model"):
+        ...
+
+    count("crtool_cache_requests_total", cache="video", result="hit")
+    gauge("crtool_scheduler_queue_depth", 3, service="clash", lane="crawl")
+
+Timings recorded inside `request_scope()` are also collected per request so
+the UI can show where one page load spent its time.
+"""
+import bisect
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = os.getenv("CRTOOL_METRICS", "0") == "1"
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple], float] = {}
+_histograms: Dict[Tuple[str, Tuple], List] = {}
+_gauges: Dict[Tuple[str, Tuple], float] = {}
+_scope: contextvars.ContextVar = contextvars.ContextVar("crtool_request_scope", default=None)
+
+
+def enable(flag: bool = True) -> None:
+    global _enabled
+    _enabled = flag
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _gauges.clear()
+
+
+def _labels(labels: Dict[str, str]) -> Tuple:
+    return tuple(sorted(labels.items()))
+
+
+def count(name: str, value: float = 1, **labels) -> None:
+    """Increment a counter."""
+    if not _enabled:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def gauge(name: str, value: float, **labels) -> None:
+    """Set a gauge to its current value."""
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[(name, _labels(labels))] = value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record a value in a histogram with the default second buckets."""
+    if not _enabled:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        hist[0][bisect.bisect_left(BUCKETS, value)] += 1
+        hist[1] += value
+        hist[2] += 1
+
+
+def _record(component: str, name: str, seconds: float, error: bool) -> None:
+    observe("crtool_call_seconds", seconds, component=component, fn=name)
+    count("crtool_calls_total", component=component, fn=name)
+    if error:
+        count("crtool_call_errors_total", component=component, fn=name)
+    scope = _scope.get()
+    if scope is not None:
+        scope.append((f"{component}.{name}", seconds))
+
+
+@contextmanager
+def timed(component: str, name: str) -> Iterator[None]:
+    """Time a block as `component.name`."""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        _record(component, name, time.perf_counter() - start, error)
+
+
+def instrumented(component: str, name: Optional[str] = None):
+    """Decorator timing every call of a function under `component`."""
+
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            error = False
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                error = True
+                raise
+            finally:
+                _record(component, label, time.perf_counter() - start, error)
+
+        return wrapper
+
+    return decorate
+
+
+@contextmanager
+def request_scope() -> Iterator[List[Tuple[str, float]]]:
+    """Collect the (name, seconds) timings recorded while the block runs."""
+    timings: List[Tuple[str, float]] = []
+    token = _scope.set(timings)
+    try:
+        yield timings
+    finally:
+        _scope.reset(token)
+
+
+def start_scope() -> List[Tuple[str, float]]:
+    """Start collecting timings for the rest of the current context.
+
+    For Streamlit, where a rerun is the whole script rather than a block.
+    """
+    timings: List[Tuple[str, float]] = []
+    _scope.set(timings)
+    return timings
+
+
+def summarize(timings: List[Tuple[str, float]]) -> List[Dict]:
+    """Aggregate scope timings by name, slowest first."""
+    totals: Dict[str, List[float]] = {}
+    for name, seconds in timings:
+        entry = totals.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+    rows = [{"name": n, "calls": c, "seconds": s} for n, (c, s) in totals.items()]
+    rows.sort(key=lambda r: r["seconds"], reverse=True)
+    return rows
+
+
+def snapshot() -> Dict:
+    """Return counters and histogram summaries as plain data."""
+    with _lock:
+        counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in _counters.items()]
+        hists = [
+            {"name": n, "labels": dict(l), "count": h[2], "sum": h[1], "mean": h[1] / h[2] if h[2] else 0.0}
+            for (n, l), h in _histograms.items()
+        ]
+    return {"counters": counters, "histograms": hists}
+
+
+def _fmt_labels(labels: Tuple, extra: Tuple = ()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def render_prometheus() -> str:
+    """Return all metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        hists = sorted((k, (list(h[0]), h[1], h[2])) for k, h in _histograms.items())
+        gauges = sorted(_gauges.items())
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f"{name}{_fmt_labels(labels)} {value}")
+    for (name, labels), value in gauges:
+        if name not in seen:
+            lines.append(f"# TYPE {name} gauge")
+            seen.add(name)
+        lines.append(f"{name}{_fmt_labels(labels)} {value}")
+    for (name, labels), (buckets, total, n) in hists:
+        if name not in seen:
+            lines.append(f"# TYPE {name} histogram")
+            seen.add(name)
+        cumulative = 0
+        for bound, c in zip(BUCKETS + (float("inf"),), buckets):
+            cumulative += c
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{name}_bucket{_fmt_labels(labels, (('le', le),))} {cumulative}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {total}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {n}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: Optional[str] = None) -> None:
+    """Write the exposition text atomically, e.g. for node_exporter's textfile collector."""
+    path = path or os.getenv("CRTOOL_METRICS_FILE", "metrics.prom")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as fh:
+        fh.write(render_prometheus())
+    os.replace(tmp, path)
@@ -0,0 +1,279 @@
+"""Durable job queue in SQLite for background work.
+
+The UI and API only enqueue jobs and read their results; `worker.py`
+processes pull them. Any number of workers, on this host or on others
+sharing the database file, can run against one queue:
+
+    job_id = enqueue("optimize", {"cards": deck, ...}, key=f"optimize:{deck_hash}")
+    ...
+    job = get_job(job_id)      # status queued/running/done/failed, result
+
+Claiming a job leases it to one worker for `lease` seconds (the visibility
+timeout); a worker that dies without finishing simply lets the lease run
+out and the job is handed to the next worker. Long jobs extend their lease
+with `heartbeat`. Failed attempts are retried with exponential backoff up to
+`max_attempts`. An idempotency `key` makes enqueueing the same work twice
+return the existing job.
+"""
+import json
+import os
+import socket
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional
+
+import sqlite_store
+
+JOB_DB = os.getenv("CRTOOL_JOB_DB", "jobs.db")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+LEASE = 300.0
+MAX_ATTEMPTS = 3
+BACKOFF = 30.0
+WORKER_TTL = 60.0
+
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, payload TEXT, "
+    "key TEXT UNIQUE, status TEXT, priority INTEGER, attempts INTEGER DEFAULT 0, max_attempts INTEGER, "
+    "run_at REAL, lease_owner TEXT, lease_until REAL, result TEXT, error TEXT, created REAL, updated REAL)",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status, run_at)",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs(status, lease_until)",
+    "CREATE TABLE IF NOT EXISTS workers (id TEXT PRIMARY KEY, kinds TEXT, last_seen REAL)",
+)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    return sqlite_store.connect(path, SCHEMA, isolation_level=None)
+
+
+def init_db(path: str = JOB_DB) -> None:
+    sqlite_store.init_db(path, SCHEMA)
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _row(r) -> Dict:
+    return {
+        "id": r[0],
+        "kind": r[1],
+        "payload": json.loads(r[2]),
+        "key": r[3],
+        "status": r[4],
+        "priority": r[5],
+        "attempts": r[6],
+        "max_attempts": r[7],
+        "run_at": r[8],
+        "lease_owner": r[9],
+        "lease_until": r[10],
+        "result": json.loads(r[11]) if r[11] is not None else None,
+        "error": r[12],
+        "created": r[13],
+        "updated": r[14],
+    }
+
+
+COLUMNS = (
+    "id, kind, payload, key, status, priority, attempts, max_attempts, run_at, lease_owner, lease_until, "
+    "result, error, created, updated"
+)
+
+
+def enqueue(
+    kind: str,
+    payload: Optional[Dict] = None,
+    key: Optional[str] = None,
+    priority: int = 0,
+    max_attempts: int = MAX_ATTEMPTS,
+    delay: float = 0.0,
+    path: str = JOB_DB,
+) -> int:
+    """Add a job and return its id.
+
+    With `key`, an existing job of that key is returned instead; one that
+    failed for good is queued again with the new payload.
+    """
+    now = time.time()
+    conn = _connect(path)
+    cur = conn.execute(
+        "INSERT OR IGNORE INTO jobs (kind, payload, key, status, priority, max_attempts, run_at, created, updated) "
+        "VALUES (?,?,?,?,?,?,?,?,?)",
+        (kind, json.dumps(payload or {}), key, QUEUED, priority, max_attempts, now + delay, now, now),
+    )
+    if cur.rowcount:
+        job_id = cur.lastrowid
+    else:
+        job_id = conn.execute("SELECT id FROM jobs WHERE key=?", (key,)).fetchone()[0]
+        conn.execute(
+            "UPDATE jobs SET payload=?, status=?, attempts=0, max_attempts=?, run_at=?, error=NULL, updated=? "
+            "WHERE id=? AND status=?",
+            (json.dumps(payload or {}), QUEUED, max_attempts, now + delay, now, job_id, FAILED),
+        )
+    conn.close()
+    return job_id
+
+
+def claim(
+    worker_id: str,
+    kinds: Optional[Iterable[str]] = None,
+    lease: float = LEASE,
+    job_id: Optional[int] = None,
+    now: Optional[float] = None,
+    path: str = JOB_DB,
+) -> Optional[Dict]:
+    """Lease the next ready job (or job `job_id`) to `worker_id`, or return None.
+
+    Ready means queued and due, or running with an expired lease. A job
+    whose lease expired on its last attempt is marked failed instead.
+    """
+    now = time.time() if now is None else now
+    where = "((status=? AND run_at<=?) OR (status=? AND lease_until<?))"
+    args: List = [QUEUED, now, RUNNING, now]
+    kinds = list(kinds) if kinds is not None else None
+    if kinds is not None:
+        where += f" AND kind IN ({','.join('?' * len(kinds))})"
+        args += kinds
+    if job_id is not None:
+        where += " AND id=?"
+        args.append(job_id)
+    conn = _connect(path)
+    try:
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            r = conn.execute(
+                f"SELECT {COLUMNS} FROM jobs WHERE {where} ORDER BY priority DESC, id LIMIT 1", args
+            ).fetchone()
+            if r is None:
+                conn.execute("COMMIT")
+                return None
+            job = _row(r)
+            if job["status"] == RUNNING and job["attempts"] >= job["max_attempts"]:
+                conn.execute(
+                    "UPDATE jobs SET status=?, error=?, lease_owner=NULL, updated=? WHERE id=?",
+                    (FAILED, job["error"] or "lease expired", now, job["id"]),
+                )
+                conn.execute("COMMIT")
+                continue
+            conn.execute(
+                "UPDATE jobs SET status=?, attempts=attempts+1, lease_owner=?, lease_until=?, updated=? WHERE id=?",
+                (RUNNING, worker_id, now + lease, now, job["id"]),
+            )
+            conn.execute("COMMIT")
+            job.update(status=RUNNING, attempts=job["attempts"] + 1, lease_owner=worker_id, lease_until=now + lease)
+            return job
+    finally:
+        conn.close()
+
+
+def _update_leased(sql: str, args: tuple, job_id: int, worker_id: str, path: str) -> bool:
+    conn = _connect(path)
+    cur = conn.execute(f"{sql} WHERE id=? AND status=? AND lease_owner=?", args + (job_id, RUNNING, worker_id))
+    conn.close()
+    return cur.rowcount == 1
+
+
+def heartbeat(job_id: int, worker_id: str, lease: float = LEASE, path: str = JOB_DB) -> bool:
+    """Extend the lease; False when the job is no longer leased to `worker_id`."""
+    now = time.time()
+    return _update_leased("UPDATE jobs SET lease_until=?, updated=?", (now + lease, now), job_id, worker_id, path)
+
+
+def complete(job_id: int, worker_id: str, result=None, path: str = JOB_DB) -> bool:
+    """Store the result; False when the lease was lost (another worker now owns the job)."""
+    return _update_leased(
+        "UPDATE jobs SET status=?, result=?, error=NULL, lease_owner=NULL, updated=?",
+        (DONE, json.dumps(result), time.time()),
+        job_id,
+        worker_id,
+        path,
+    )
+
+
+def fail(job_id: int, worker_id: str, error: str, backoff: float = BACKOFF, path: str = JOB_DB) -> bool:
+    """Record a failed attempt: requeue with exponential backoff, or fail for good after the last attempt."""
+    conn = _connect(path)
+    r = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id=?", (job_id,)).fetchone()
+    conn.close()
+    if r is None:
+        return False
+    attempts, max_attempts = r
+    now = time.time()
+    if attempts >= max_attempts:
+        sql, args = "UPDATE jobs SET status=?, error=?, lease_owner=NULL, updated=?", (FAILED, error, now)
+    else:
+        retry_at = now + backoff * 2 ** (attempts - 1)
+        sql = "UPDATE jobs SET status=?, error=?, run_at=?, lease_owner=NULL, lease_until=NULL, updated=?"
+        args = (QUEUED, error, retry_at, now)
+    return _update_leased(sql, args, job_id, worker_id, path)
+
+
+def get_job(job_id: int, path: str = JOB_DB) -> Optional[Dict]:
+    conn = _connect(path)
+    r = conn.execute(f"SELECT {COLUMNS} FROM jobs WHERE id=?", (job_id,)).fetchone()
+    conn.close()
+    return _row(r) if r else None
+
+
+def list_jobs(
+    kind: Optional[str] = None, status: Optional[str] = None, limit: int = 50, path: str = JOB_DB
+) -> List[Dict]:
+    """Newest jobs first, optionally of one kind and status."""
+    where, args = [], []
+    if kind is not None:
+        where.append("kind=?")
+        args.append(kind)
+    if status is not None:
+        where.append("status=?")
+        args.append(status)
+    sql = f"SELECT {COLUMNS} FROM jobs" + (f" WHERE {' AND '.join(where)}" if where else "")
+    conn = _connect(path)
+    rows = conn.execute(sql + " ORDER BY id DESC LIMIT ?", args + [limit]).fetchall()
+    conn.close()
+    return [_row(r) for r in rows]
+
+
+def counts(path: str = JOB_DB) -> Dict[str, int]:
+    """Number of jobs per status."""
+    conn = _connect(path)
+    rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+    conn.close()
+    return {status: n for status, n in rows}
+
+
+def purge(older_than: float = 7 * 86400, path: str = JOB_DB) -> int:
+    """Delete finished jobs last updated more than `older_than` seconds ago."""
+    conn = _connect(path)
+    cur = conn.execute(
+        "DELETE FROM jobs WHERE status IN (?,?) AND updated < ?", (DONE, FAILED, time.time() - older_than)
+    )
+    conn.close()
+    return cur.rowcount
+
+
+def register_worker(worker_id: str, kinds: Optional[Iterable[str]] = None, path: str = JOB_DB) -> None:
+    """Record that `worker_id` is alive (call periodically)."""
+    conn = _connect(path)
+    conn.execute(
+        "INSERT OR REPLACE INTO workers (id, kinds, last_seen) VALUES (?,?,?)",
+        (worker_id, json.dumps(sorted(kinds) if kinds is not None else None), time.time()),
+    )
+    conn.close()
+
+
+def active_workers(kind: Optional[str] = None, within: float = WORKER_TTL, path: str = JOB_DB) -> List[str]:
+    """Workers seen in the last `within` seconds, optionally only those taking `kind`."""
+    conn = _connect(path)
+    rows = conn.execute("SELECT id, kinds FROM workers WHERE last_seen >= ?", (time.time() - within,)).fetchall()
+    conn.close()
+    active = []
+    for worker_id, raw in rows:
+        kinds = json.loads(raw)
+        if kind is None or kinds is None or kind in kinds:
+            active.append(worker_id)
+    return active
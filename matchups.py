@@ -0,0 +1,259 @@
+"""Archetype-vs-archetype and card-vs-card win rates from stored battles.
+
+Every battle we see (our own log, watched players, archived history) adds
+one win/loss to each (team card, opponent card) pair and to the pair of
+deck archetypes, from both sides' perspective. Counts live in SQLite so
+they accumulate across processes and restarts; the matrix itself is kept in
+memory as nested dicts, so a lookup is a couple of dict hits.
+
+    matrix = get_matrix()
+    matrix.add_battles(get_battlelog(tag))
+    matrix.archetype_matchup("hog rider", "golem")    # (win rate, games)
+    smart_swap(deck, pool, meta_fitness(matrix))
+
+`expected_win_rate` weights each matchup by how often the opponent card or
+archetype shows up in the stored battles, and memoizes per-card and
+per-archetype scores until the next update, so the optimizer can call it
+millions of times.
+"""
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from analysis import WIN_CONDITIONS, classify_playstyle
+from records import Battle, parse_battle
+
+MATCHUP_DB = "matchups.db"
+
+CARD = "card"
+ARCHETYPE = "archetype"
+
+# Pseudo-games at 50% added to every matchup, so one lucky game is not 100%.
+PRIOR = 2.0
+# Archetype games at which the archetype matchup and the card matchups weigh the same.
+ARCHETYPE_PRIOR = 50.0
+
+
+def archetype(deck: Iterable[str]) -> str:
+    """Name a deck by its win conditions (at most two), else by its playstyle."""
+    cards = [c.lower() for c in deck]
+    wincons = sorted({c for c in cards if c in WIN_CONDITIONS})[:2]
+    if wincons:
+        return "+".join(wincons)
+    return classify_playstyle(cards).lower()
+
+
+def _smoothed(cell: Optional[List[float]]) -> float:
+    if not cell:
+        return 0.5
+    return (cell[0] + PRIOR / 2) / (cell[1] + PRIOR)
+
+
+class MatchupMatrix:
+    """Sparse win/game counts per (kind, a, b), persisted to SQLite."""
+
+    def __init__(self, path: str = MATCHUP_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self._init_db()
+        self.refresh()
+
+    def _init_db(self) -> None:
+        conn = sqlite3.connect(self.path, timeout=30)
+        cur = conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute(
+            "CREATE TABLE IF NOT EXISTS pairs (kind TEXT, a TEXT, b TEXT, wins REAL, games INTEGER, "
+            "PRIMARY KEY (kind, a, b))"
+        )
+        cur.execute("CREATE TABLE IF NOT EXISTS appearances (kind TEXT, key TEXT, count INTEGER, PRIMARY KEY (kind, key))")
+        cur.execute("CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY)")
+        conn.commit()
+        conn.close()
+
+    def refresh(self) -> None:
+        """Reload all counts from the database."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        cur = conn.cursor()
+        pairs: Dict[str, Dict[str, Dict[str, List[float]]]] = {CARD: {}, ARCHETYPE: {}}
+        for kind, a, b, wins, games in cur.execute("SELECT kind, a, b, wins, games FROM pairs"):
+            pairs[kind].setdefault(a, {})[b] = [wins, games]
+        counts: Dict[str, Dict[str, int]] = {CARD: {}, ARCHETYPE: {}}
+        for kind, key, count in cur.execute("SELECT kind, key, count FROM appearances"):
+            counts[kind][key] = count
+        last_row = cur.execute("SELECT max(rowid) FROM seen").fetchone()[0] or 0
+        conn.close()
+        with self.lock:
+            self.pairs, self.counts, self.last_row = pairs, counts, last_row
+            self._invalidate()
+
+    def sync(self) -> bool:
+        """Reload if another process added battles since the last load."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        last_row = conn.execute("SELECT max(rowid) FROM seen").fetchone()[0] or 0
+        conn.close()
+        if last_row == self.last_row:
+            return False
+        self.refresh()
+        return True
+
+    def _invalidate(self) -> None:
+        self._scores: Dict[str, Dict[str, float]] = {CARD: {}, ARCHETYPE: {}}
+        self._totals = {kind: sum(c.values()) for kind, c in self.counts.items()}
+
+    def __len__(self) -> int:
+        """Number of distinct battles counted."""
+        return self._totals.get(ARCHETYPE, 0) // 2
+
+    def add_battles(self, battles: Iterable) -> int:
+        """Count battles (API dicts or `Battle` records) not seen before; return how many."""
+        cache: Dict = {}
+        parsed = [b if isinstance(b, Battle) else parse_battle(b, cache) for b in battles]
+        parsed = [b for b in parsed if b.team.deck and b.opponent.deck]
+        if not parsed:
+            return 0
+        conn = sqlite3.connect(self.path, timeout=30)
+        cur = conn.cursor()
+        pair_delta: Dict[Tuple[str, str, str], List[float]] = {}
+        count_delta: Dict[Tuple[str, str], int] = {}
+        added = 0
+        for battle in parsed:
+            cur.execute("INSERT OR IGNORE INTO seen (key) VALUES (?)", (battle.key,))
+            if not cur.rowcount:
+                continue
+            added += 1
+            team_crowns, opp_crowns = battle.team.crowns, battle.opponent.crowns
+            score = 1.0 if team_crowns > opp_crowns else 0.0 if team_crowns < opp_crowns else 0.5
+            sides = (
+                ([c.lower() for c in battle.team.deck], score),
+                ([c.lower() for c in battle.opponent.deck], 1.0 - score),
+            )
+            for (mine, result), (theirs, _) in (sides, sides[::-1]):
+                for kind, a_keys, b_keys in (
+                    (CARD, set(mine), set(theirs)),
+                    (ARCHETYPE, (archetype(mine),), (archetype(theirs),)),
+                ):
+                    for a in a_keys:
+                        count_delta[(kind, a)] = count_delta.get((kind, a), 0) + 1
+                        for b in b_keys:
+                            cell = pair_delta.setdefault((kind, a, b), [0.0, 0])
+                            cell[0] += result
+                            cell[1] += 1
+        cur.executemany(
+            "INSERT INTO pairs (kind, a, b, wins, games) VALUES (?,?,?,?,?) "
+            "ON CONFLICT(kind, a, b) DO UPDATE SET wins=wins+excluded.wins, games=games+excluded.games",
+            [(*k, w, g) for k, (w, g) in pair_delta.items()],
+        )
+        cur.executemany(
+            "INSERT INTO appearances (kind, key, count) VALUES (?,?,?) "
+            "ON CONFLICT(kind, key) DO UPDATE SET count=count+excluded.count",
+            [(*k, n) for k, n in count_delta.items()],
+        )
+        last_row = cur.execute("SELECT max(rowid) FROM seen").fetchone()[0] or 0
+        conn.commit()
+        conn.close()
+        with self.lock:
+            for (kind, a, b), (w, g) in pair_delta.items():
+                cell = self.pairs[kind].setdefault(a, {}).setdefault(b, [0.0, 0])
+                cell[0] += w
+                cell[1] += g
+            for (kind, key), n in count_delta.items():
+                self.counts[kind][key] = self.counts[kind].get(key, 0) + n
+            # a concurrent writer's rows are picked up by the next sync()
+            if self.last_row == last_row - added:
+                self.last_row = last_row
+            self._invalidate()
+        return added
+
+    def _matchup(self, kind: str, a: str, b: str) -> Tuple[float, int]:
+        cell = self.pairs[kind].get(a.lower(), {}).get(b.lower())
+        return _smoothed(cell), int(cell[1]) if cell else 0
+
+    def card_matchup(self, card: str, opponent: str) -> Tuple[float, int]:
+        """Return (smoothed win rate, games) of decks with `card` against decks with `opponent`."""
+        return self._matchup(CARD, card, opponent)
+
+    def archetype_matchup(self, mine: str, theirs: str) -> Tuple[float, int]:
+        return self._matchup(ARCHETYPE, mine, theirs)
+
+    def meta_share(self, kind: str = ARCHETYPE) -> Dict[str, float]:
+        """How often each archetype (or card) appears among all counted decks."""
+        total = self._totals.get(kind) or 1
+        return {k: n / total for k, n in self.counts[kind].items()}
+
+    def _score(self, kind: str, key: str) -> float:
+        score = self._scores[kind].get(key)
+        if score is None:
+            with self.lock:
+                counts, total = self.counts[kind], self._totals[kind] or 1
+                # unseen matchups count as even, so only observed rows move the score
+                score = 0.5 + sum(
+                    counts.get(b, 0) / total * (_smoothed(cell) - 0.5)
+                    for b, cell in self.pairs[kind].get(key, {}).items()
+                )
+                self._scores[kind][key] = score
+        return score
+
+    def card_score(self, card: str) -> float:
+        """Expected win rate of a deck with `card` against the stored meta's cards."""
+        return self._score(CARD, card.lower())
+
+    def archetype_score(self, name: str) -> float:
+        return self._score(ARCHETYPE, name.lower())
+
+    def expected_win_rate(self, deck: Iterable[str]) -> float:
+        """Meta-weighted expected win rate of `deck`.
+
+        Blends the deck archetype's matchups against the meta with the mean of
+        its cards' matchups, trusting the archetype more as it gains games.
+        """
+        cards = [c.lower() for c in deck]
+        if not cards:
+            return 0.5
+        card_term = sum(self._score(CARD, c) for c in cards) / len(cards)
+        arch = archetype(cards)
+        games = self.counts[ARCHETYPE].get(arch, 0)
+        if not games:
+            return card_term
+        weight = games / (games + ARCHETYPE_PRIOR)
+        return weight * self._score(ARCHETYPE, arch) + (1 - weight) * card_term
+
+
+def meta_fitness(matrix: Optional[MatchupMatrix] = None) -> Callable[[List[str]], float]:
+    """Return a `smart_swap` fitness: expected win rate against the meta, in percent."""
+    matrix = get_matrix() if matrix is None else matrix
+    return lambda deck: 100.0 * matrix.expected_win_rate(deck)
+
+
+def ingest_archives(matrix: Optional[MatchupMatrix] = None, root: Optional[str] = None) -> int:
+    """Count every battle stored in the `battle_archive` directory."""
+    from battle_archive import ARCHIVE_DIR, load
+
+    matrix = get_matrix() if matrix is None else matrix
+    root = root or ARCHIVE_DIR
+    if not os.path.isdir(root):
+        return 0
+    added = 0
+    for name in sorted(os.listdir(root)):
+        if name.endswith(".crba"):
+            added += matrix.add_battles(load(os.path.join(root, name)))
+    return added
+
+
+_matrices: Dict[str, MatchupMatrix] = {}
+_lock = threading.Lock()
+
+
+def get_matrix(path: Optional[str] = None) -> MatchupMatrix:
+    """Return the process-wide matrix for `path` (CRTOOL_MATCHUP_DB or matchups.db)."""
+    path = path or os.getenv("CRTOOL_MATCHUP_DB", MATCHUP_DB)
+    with _lock:
+        matrix = _matrices.get(path)
+        if matrix is None:
+            matrix = _matrices[path] = MatchupMatrix(path)
+        return matrix
+
+
+if __name__ == "__main__":
+    print(f"counted {ingest_archives()} new battles from archives")
@@ -1,20 +1,26 @@
 """Helpers for the Merge Tactics mode (2025)."""
 import os
-import requests
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional
 
-ROYALE_API_BASE = "https://api.royaleapi.com"
+from clash_api import PAGE_SIZE, iter_items
+from scheduler import ROYALEAPI, configured_tokens
 
+ROYALE_API_BASE = os.getenv("ROYALEAPI_BASE", "https://api.royaleapi.com")
 
-def get_merge_leaderboard(limit: int = 100) -> List[Dict]:
-    token = os.getenv("ROYALEAPI_TOKEN")
-    if not token:
+
+def iter_merge_leaderboard(limit: Optional[int] = None, page_size: Optional[int] = None) -> Iterator[Dict]:
+    """Yield Merge Tactics leaderboard entries.
+
+    Cursors are followed when the endpoint sends them; without them the
+    single request asks for all `limit` items.
+    """
+    if not configured_tokens(ROYALEAPI):
         raise RuntimeError("ROYALEAPI_TOKEN not set")
-    url = f"{ROYALE_API_BASE}/leaderboards/merge?limit={limit}"
-    headers = {"Authorization": f"Bearer {token}"}
-    resp = requests.get(url, headers=headers, timeout=10)
-    resp.raise_for_status()
-    return resp.json().get("items", [])
+    return iter_items(f"{ROYALE_API_BASE}/leaderboards/merge", ROYALEAPI, limit, page_size or limit or PAGE_SIZE)
+
+
+def get_merge_leaderboard(limit: int = 100) -> List[Dict]:
+    return list(iter_merge_leaderboard(limit))
 
 
 def card_tier_list(stats: List[Dict]) -> List[Dict]:
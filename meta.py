@@ -1,42 +1,55 @@
-import requests
 import os
-from typing import List, Dict, Iterable
+from typing import List, Dict, Iterable, Iterator, Optional
+from clash_api import PAGE_SIZE, iter_items
+from scheduler import ROYALEAPI, configured_tokens
 from youtube_api import search_videos
+from video_index import get_index
+from instrument import instrumented
 
-ROYALE_API_BASE = "https://api.royaleapi.com"
+ROYALE_API_BASE = os.getenv("ROYALEAPI_BASE", "https://api.royaleapi.com")
 
 
-def get_api_key() -> str:
-    return os.getenv("ROYALEAPI_TOKEN", "")
+def _require_token() -> None:
+    if not configured_tokens(ROYALEAPI):
+        raise RuntimeError("ROYALEAPI_TOKEN not set")
+
+
+def iter_top_decks(limit: Optional[int] = None, page_size: Optional[int] = None) -> Iterator[Dict]:
+    """Yield top decks from the RoyaleAPI leaderboard.
+
+    `/player/top` returns no paging cursors, so by default the one request
+    asks for all `limit` items.
+    """
+    _require_token()
+    return iter_items(f"{ROYALE_API_BASE}/player/top", ROYALEAPI, limit, page_size or limit or PAGE_SIZE)
+
 
+def iter_top_players(limit: Optional[int] = None, page_size: Optional[int] = None) -> Iterator[Dict]:
+    """Yield top players from RoyaleAPI (one request for `limit` items, see `iter_top_decks`)."""
+    _require_token()
+    return iter_items(f"{ROYALE_API_BASE}/player/top", ROYALEAPI, limit, page_size or limit or PAGE_SIZE)
 
+
+@instrumented("meta")
 def get_top_decks(limit: int = 1000) -> List[Dict]:
     """Return top decks from RoyaleAPI leaderboard."""
-    token = get_api_key()
-    if not token:
-        raise RuntimeError("ROYALEAPI_TOKEN not set")
-    url = f"{ROYALE_API_BASE}/player/top?limit={limit}"
-    headers = {"Authorization": f"Bearer {token}"}
-    resp = requests.get(url, headers=headers, timeout=10)
-    resp.raise_for_status()
-    return resp.json().get("items", [])
+    return list(iter_top_decks(limit))
 
 
+@instrumented("meta")
 def get_top_players(limit: int = 1000) -> List[Dict]:
     """Return top players from RoyaleAPI."""
-    token = get_api_key()
-    if not token:
-        raise RuntimeError("ROYALEAPI_TOKEN not set")
-    url = f"{ROYALE_API_BASE}/player/top?limit={limit}"
-    headers = {"Authorization": f"Bearer {token}"}
-    resp = requests.get(url, headers=headers, timeout=10)
-    resp.raise_for_status()
-    return resp.json().get("items", [])
+    return list(iter_top_players(limit))
 
 
-def league_benchmarks(league_rank: int, limit: int = 1000) -> Dict:
-    """Return average win rate and popular decks for a league rank."""
-    players = get_top_players(limit=limit)
+@instrumented("meta")
+def league_benchmarks(league_rank: int, limit: int = 1000, players: Optional[List[Dict]] = None) -> Dict:
+    """Return average win rate and popular decks for a league rank.
+
+    Pass an already downloaded leaderboard as `players` to avoid a second request.
+    """
+    if players is None:
+        players = get_top_players(limit=limit)
     same = [p for p in players if p.get("leagueRank") == league_rank]
     if not same:
         return {}
@@ -50,6 +63,29 @@ def league_benchmarks(league_rank: int, limit: int = 1000) -> Dict:
     return {"avg_win_rate": avg, "decks": decks}
 
 
+def _quartiles_columnar(table, key: str) -> List[Dict]:
+    import numpy as np
+
+    n = len(table)
+    if n == 0:
+        return []
+    order = np.argsort(-table[key].astype(np.int64), kind="stable")
+    if "win_rate" in table:
+        rates = table["win_rate"]
+    else:
+        wins, losses = table["wins"], table["losses"]
+        total = wins.astype(np.int64) + losses
+        rates = np.divide(wins, total, out=np.zeros(n), where=total > 0)
+    rates = rates[order]
+    quartiles = []
+    for i in range(4):
+        start = int(i * n / 4)
+        end = int((i + 1) * n / 4) if i < 3 else n
+        if end > start:
+            quartiles.append({"quartile": i + 1, "avg_win_rate": float(rates[start:end].mean())})
+    return quartiles
+
+
 def meta_pulse(decks: Iterable[Dict], threshold: float = 0.05) -> List[Dict]:
     """Return decks with usage over a threshold."""
     trending = []
@@ -65,23 +101,30 @@ PRO_CHANNELS = {
 }
 
 
+@instrumented("meta")
 def find_matchup_videos(deck_a: str, deck_b: str, max_results: int = 5) -> List[Dict]:
-    """Search YouTube for pro matchup videos."""
+    """Return pro matchup videos from the local index, searching YouTube on a miss."""
+    indexed = get_index().lookup(deck_a, deck_b, channels=PRO_CHANNELS, max_results=max_results)
+    if indexed:
+        return indexed
     query = f"{deck_a} vs {deck_b} Clash Royale"
     videos = search_videos(query, max_results=max_results)
     if not videos:
         return []
-    filtered = []
-    for v in videos:
-        if not PRO_CHANNELS:
-            filtered.append(v)
-        elif any(cid in v.get("channelId", "") for cid in PRO_CHANNELS):
-            filtered.append(v)
-    return filtered
+    if not PRO_CHANNELS:
+        return videos
+    return [v for v in videos if v.get("channelId") in PRO_CHANNELS]
 
 
+@instrumented("meta")
 def quartile_benchmarks(players: Iterable[Dict], key: str = "rank_points") -> List[Dict]:
-    """Return average win rate per quartile using the specified key."""
+    """Return average win rate per quartile using the specified key.
+
+    `players` may also be a `columnar` leaderboard table; win rates then come
+    from its wins/losses columns without building per-player dicts.
+    """
+    if hasattr(players, "column"):
+        return _quartiles_columnar(players, key)
     items = sorted(players, key=lambda p: p.get(key, 0), reverse=True)
     n = len(items)
     if n == 0:
@@ -3,6 +3,8 @@ import json
 import requests
 from typing import Optional, Dict, List
 from clash_api import get_battlelog
+from records import Battle
+import user_store
 
 WATCH_FILE = "watch.json"
 
@@ -23,44 +25,75 @@ def _save(data: Dict) -> None:
         pass
 
 
-def check_new_video(channel_id: str, base_url: str | None = None) -> Optional[Dict]:
-    """Return latest video info if it differs from stored state."""
+def _get_last(kind: str, key: str, user: Optional[str]):
+    if user is not None:
+        return user_store.get_state(user, kind, key)
+    return _load().get(kind, {}).get(key)
+
+
+def _set_last(kind: str, key: str, value, user: Optional[str]) -> None:
+    if user is not None:
+        user_store.set_state(user, kind, key, value)
+        return
+    data = _load()
+    data.setdefault(kind, {})[key] = value
+    _save(data)
+
+
+def fetch_latest_video(channel_id: str, base_url: str | None = None) -> Optional[Dict]:
+    """Return the newest upload of a channel or None."""
     base = base_url or os.getenv("INVIDIOUS_BASE", "https://yewtu.be")
     url = f"{base}/api/v1/channels/{channel_id}/latest"
     resp = requests.get(url, timeout=10)
     resp.raise_for_status()
     items = resp.json()
-    if not items:
+    if isinstance(items, dict):
+        items = items.get("videos", [])
+    return items[0] if items else None
+
+
+def video_info(video: Dict) -> Dict:
+    return {
+        "title": video.get("title"),
+        "url": f"https://www.youtube.com/watch?v={video.get('videoId')}"
+    }
+
+
+def check_new_video(channel_id: str, base_url: str | None = None, user: Optional[str] = None) -> Optional[Dict]:
+    """Return latest video info if it differs from stored state (`user`'s own state when given)."""
+    latest = fetch_latest_video(channel_id, base_url=base_url)
+    if not latest:
         return None
-    latest = items[0]
-    data = _load()
-    last = data.get("video_last", {}).get(channel_id)
-    if latest.get("videoId") != last:
-        data.setdefault("video_last", {})[channel_id] = latest.get("videoId")
-        _save(data)
-        return {
-            "title": latest.get("title"),
-            "url": f"https://www.youtube.com/watch?v={latest.get('videoId')}"
-        }
+    if latest.get("videoId") != _get_last("video_last", channel_id, user):
+        _set_last("video_last", channel_id, latest.get("videoId"), user)
+        return video_info(latest)
     return None
 
 
-def _deck_from_battle(battle: Dict) -> List[str]:
+def _deck_from_battle(battle) -> List[str]:
+    """Team deck of a battle given as an API dict or a `Battle` record."""
+    if isinstance(battle, Battle):
+        return list(battle.team.deck.cards)
     team = battle.get("team", [{}])[0]
     return [c.get("name") for c in team.get("cards", [])]
 
 
-def check_deck_change(player_tag: str, similarity: float = 0.75) -> Optional[List[str]]:
-    """Return latest deck if changed significantly since last check."""
+def deck_similarity(deck: List[str], prev: List[str]) -> float:
+    """Return the share of the 8 card slots kept between two decks."""
+    return len(set(deck).intersection(prev)) / 8 if prev else 0.0
+
+
+def check_deck_change(
+    player_tag: str, similarity: float = 0.75, user: Optional[str] = None
+) -> Optional[List[str]]:
+    """Return latest deck if changed significantly since last check (by `user`, when given)."""
     battles = get_battlelog(player_tag)
     if not battles:
         return None
     latest = tuple(sorted(_deck_from_battle(battles[0])))
-    data = _load()
-    prev = tuple(data.get("deck_last", {}).get(player_tag, ()))
-    same = len(set(latest).intersection(prev)) / 8 if prev else 0.0
+    prev = tuple(_get_last("deck_last", player_tag, user) or ())
+    same = deck_similarity(latest, prev)
     if same < similarity:
-        data.setdefault("deck_last", {})[player_tag] = list(latest)
-        _save(data)
+        _set_last("deck_last", player_tag, list(latest), user)
         return list(latest)
     return None
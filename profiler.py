@@ -0,0 +1,148 @@
+"""Opt-in sampling profiler for long optimizer and batch jobs.
+
+A background thread samples the job's stack every few milliseconds and
+counts identical stacks, so overhead stays low and independent of how many
+Python calls the job makes. Each job writes collapsed stacks
+(`frame;frame;frame count` per line) to `<CRTOOL_PROFILE_DIR>/<job id>.folded`,
+ready for flamegraph.pl, speedscope or inferno:
+
+    CRTOOL_PROFILE=1 python api_server.py
+    flamegraph.pl profiles/optimize-1721131200-4242.folded > optimize.svg
+
+    with profile_job(new_job_id("smart_swap")) as prof:
+        smart_swap(...)
+"""
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+PROFILE_DIR = "profiles"
+DEFAULT_INTERVAL = 0.005
+
+_sequence = itertools.count(1)
+
+
+def is_enabled() -> bool:
+    return os.getenv("CRTOOL_PROFILE", "0") == "1"
+
+
+def new_job_id(name: str) -> str:
+    """Return a unique, filesystem-safe id for one run of job `name`."""
+    return f"{name}-{int(time.time())}-{os.getpid()}-{next(_sequence)}"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame) -> str:
+    """Return the stack ending at `frame` as root-first `a;b;c`."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class SamplingProfiler:
+    """Periodically sample the stacks of one thread (or all threads)."""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, thread_id: Optional[int] = None, all_threads: bool = False):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.all_threads = all_threads
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self.path: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    def _targets(self) -> List[int]:
+        if self.all_threads:
+            me = threading.get_ident()
+            return [t for t in sys._current_frames() if t != me]
+        return [self.thread_id]
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for tid in self._targets():
+                frame = frames.get(tid)
+                if frame is not None:
+                    self.stacks[collapse(frame)] += 1
+            self.samples += 1
+
+    def start(self) -> "SamplingProfiler":
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="crtool-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self._started
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in sorted(self.stacks.items()))
+
+    def top_frames(self, n: int = 10) -> List[Tuple[str, int]]:
+        """Return the `n` frames with the most self samples (leaf of a stack)."""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(n)
+
+    def write(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as fh:
+            fh.write(self.collapsed())
+        os.replace(tmp, path)
+
+
+def profile_path(job_id: str, out_dir: Optional[str] = None) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", job_id)
+    return os.path.join(out_dir or os.getenv("CRTOOL_PROFILE_DIR", PROFILE_DIR), f"{safe}.folded")
+
+
+@contextmanager
+def profile_job(
+    job_id: str,
+    enabled: Optional[bool] = None,
+    interval: Optional[float] = None,
+    out_dir: Optional[str] = None,
+    all_threads: bool = False,
+) -> Iterator[Optional[SamplingProfiler]]:
+    """Profile the enclosed block and write `<job id>.folded`.
+
+    Yields None (and costs nothing) unless `enabled` is true or, when it is
+    None, CRTOOL_PROFILE=1. Use `all_threads` for jobs that fan out to a
+    thread pool. The profile is written even if the job raises.
+    """
+    if enabled is None:
+        enabled = is_enabled()
+    if not enabled:
+        yield None
+        return
+    if interval is None:
+        interval = float(os.getenv("CRTOOL_PROFILE_INTERVAL", str(DEFAULT_INTERVAL)))
+    prof = SamplingProfiler(interval=interval, all_threads=all_threads).start()
+    prof.path = profile_path(job_id, out_dir)
+    try:
+        yield prof
+    finally:
+        prof.stop()
+        prof.write(prof.path)
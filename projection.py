@@ -0,0 +1,169 @@
+"""Monte Carlo projection of future ladder trophies and time to each goal.
+
+Each simulated path draws its own win rate from the Beta posterior of the
+player's measured wins and losses, then plays battles whose trophy gains and
+drops are resampled from the player's own `trophyChange` values. Trophies
+never fall below the highest trophy floor (arena gate) a path has reached,
+which is what keeps low win rates from sliding back indefinitely.
+
+    stats = ladder_stats(battles)
+    for goal in project_goals({"Champion": 7500}, trophies, stats):
+        goal["probability"], goal["days"]["p50"]
+
+All paths advance together as NumPy arrays, one battle at a time, with the
+random draws and trophy changes for a chunk of battles generated up front;
+paths that reached every goal drop out. League steps work the same way with
+gain and drop 1 and the league starts as floors.
+"""
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from records import EMPTY_PLAYER, is_records, parse_battlelog
+
+# Trophy road gates (approximate); a path never drops below the last one it reached.
+TROPHY_FLOORS = (
+    0, 300, 600, 1000, 1300, 1600, 2000, 2300, 2600, 3000, 3400, 3800, 4200, 4600,
+    5000, 5500, 6000, 6500, 7000, 7500, 8000, 8500, 9000,
+)
+DEFAULT_GAIN = 30
+DEFAULT_DROP = 30
+PATHS = 20_000
+HORIZON = 2_000
+CHUNK = 64
+DAY = 86400
+
+
+def ladder_stats(battles) -> Dict:
+    """Wins, losses, trophy gains/drops and battles per day from ladder battles.
+
+    Takes API dicts, `Battle` records or a `columnar` battle table; draws and
+    battles without a trophy change are left out of the gain/drop samples.
+    """
+    if hasattr(battles, "column"):
+        pvp = battles["pvp"]
+        won = (battles["team_crowns"] > battles["opp_crowns"])[pvp]
+        lost = (battles["team_crowns"] < battles["opp_crowns"])[pvp]
+        change = battles["trophy_change"][pvp].astype(np.int64)
+        times = battles["time"][pvp].astype(np.int64)
+    else:
+        if not is_records(battles):
+            battles = parse_battlelog(battles or [])
+        ladder = [
+            b for b in battles if b.is_pvp and b.team is not EMPTY_PLAYER and b.opponent is not EMPTY_PLAYER
+        ]
+        won = np.array([b.team.crowns > b.opponent.crowns for b in ladder], dtype=bool)
+        lost = np.array([b.team.crowns < b.opponent.crowns for b in ladder], dtype=bool)
+        change = np.array([b.team.trophy_change for b in ladder], dtype=np.int64)
+        times = np.array([b.time for b in ladder if b.time], dtype=np.int64)
+    span_days = float(times.max() - times.min()) / DAY if len(times) > 1 else 0.0
+    return {
+        "wins": int(won.sum()),
+        "losses": int(lost.sum()),
+        "gains": change[won & (change > 0)].tolist(),
+        "drops": (-change[lost & (change < 0)]).tolist(),
+        "battles_per_day": len(times) / max(span_days, 1.0),
+    }
+
+
+def _percentiles(values: np.ndarray) -> Optional[Dict[str, float]]:
+    if not len(values):
+        return None
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return {"p10": float(p10), "p50": float(p50), "p90": float(p90)}
+
+
+def _step_table(gains: np.ndarray, drops: np.ndarray) -> np.ndarray:
+    """512 trophy changes: 256 resampled gains then 256 negated drops."""
+    quantiles = (np.arange(256) + 0.5) / 256
+    return np.concatenate(
+        [np.quantile(gains, quantiles, method="inverted_cdf"), -np.quantile(drops, quantiles, method="inverted_cdf")]
+    ).astype(np.int32)
+
+
+def simulate(
+    trophies: int,
+    stats: Dict,
+    targets: Iterable[int],
+    paths: int = PATHS,
+    horizon: int = HORIZON,
+    floors: Iterable[int] = TROPHY_FLOORS,
+    chunk: int = CHUNK,
+    seed: Optional[int] = None,
+) -> np.ndarray:
+    """Return a (len(targets), paths) array of battles until each target is reached (-1: not within `horizon`)."""
+    rng = np.random.default_rng(seed)
+    targets = np.asarray(list(targets), dtype=np.int32)
+    floors = np.asarray(sorted(floors), dtype=np.int32)
+    gates = np.append(floors, np.iinfo(np.int32).max)
+    table = _step_table(
+        np.asarray(stats.get("gains") or [DEFAULT_GAIN]), np.asarray(stats.get("drops") or [DEFAULT_DROP])
+    )
+    # win probabilities as 24-bit thresholds, compared against the top bits of each random word
+    p = (rng.beta(stats.get("wins", 0) + 1, stats.get("losses", 0) + 1, size=paths) * (1 << 24)).astype(np.uint32)
+
+    x = np.full(paths, trophies, dtype=np.int32)
+    level = np.searchsorted(floors, x, side="right")
+    floor = np.where(level > 0, floors[np.maximum(level - 1, 0)], 0).astype(np.int32)
+    next_gate = gates[level]
+    hit = np.where(x[None, :] >= targets[:, None], 0, -1)
+    active = np.flatnonzero(hit.min(axis=0) < 0)
+    for start in range(0, horizon, chunk):
+        if not len(active):
+            break
+        k = min(chunk, horizon - start)
+        # one random word per battle: top 24 bits decide the result, low 8 bits pick the gain or drop
+        r = rng.integers(0, 1 << 32, size=(k, len(active)), dtype=np.uint32)
+        idx = r & np.uint32(0xFF)
+        idx |= ((r >> np.uint32(8)) >= p[active]).astype(np.uint32) << np.uint32(8)
+        walk = np.take(table, idx)
+        prev, fa, ga = x[active], floor[active], next_gate[active]
+        # battles are sequential, paths are not: loop over the k battles, vectorized over paths
+        for row in walk:
+            row += prev
+            np.maximum(row, fa, out=row)
+            if (row >= ga).any():
+                risen = np.flatnonzero(row >= ga)
+                level = np.searchsorted(floors, row[risen], side="right")
+                fa[risen] = floors[level - 1]
+                ga[risen] = gates[level]
+            prev = row
+        x[active], floor[active], next_gate[active] = prev, fa, ga
+        peak = walk.max(axis=0)
+        for g, target in enumerate(targets):
+            rows = np.flatnonzero((hit[g, active] < 0) & (peak >= target))
+            if len(rows):
+                hit[g, active[rows]] = start + (walk[:, rows] >= target).argmax(axis=0) + 1
+        active = active[hit[:, active].min(axis=0) < 0]
+    return hit
+
+
+def project_goals(
+    goals: Dict[str, int],
+    trophies: int,
+    stats: Dict,
+    paths: int = PATHS,
+    horizon: int = HORIZON,
+    floors: Iterable[int] = TROPHY_FLOORS,
+    seed: Optional[int] = None,
+) -> List[Dict]:
+    """Probability and battles/days-to-goal percentiles for each goal."""
+    if not goals:
+        return []
+    names = list(goals)
+    hit = simulate(trophies, stats, [goals[n] for n in names], paths, horizon, floors, seed=seed)
+    per_day = stats.get("battles_per_day") or 1.0
+    result = []
+    for name, row in zip(names, hit):
+        reached = row[row >= 0]
+        battles = _percentiles(reached)
+        result.append(
+            {
+                "goal": name,
+                "target": goals[name],
+                "probability": len(reached) / len(row),
+                "battles": battles,
+                "days": {k: v / per_day for k, v in battles.items()} if battles else None,
+            }
+        )
+    return result
@@ -0,0 +1,223 @@
+"""Typed, slotted records for battles, decks, players and match events.
+
+Raw API dicts cost a dict per nesting level and a fresh `{}`/`[{}]` default
+on every `.get("team", [{}])[0]` lookup. These records hold only the fields
+the analysis uses, in `__slots__` instances, and identical decks within one
+parsed battlelog share a single `DeckRef`.
+
+    battles = parse_battlelog(get_battlelog(tag))
+    compute_win_rate(battles)         # analysis accepts records or dicts
+    battles[0].team.deck.cards
+
+`analysis`, `digest`, `gc_coach` and `player_watch` accept these records
+wherever they take battles, decks or events.
+"""
+import calendar
+import re
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+TIME_FORMAT = "%Y%m%dT%H%M%S.000Z"
+
+
+def norm_tag(tag: str) -> str:
+    """Canonical player tag ("#2pp " -> "2PP"), used as the key wherever tags are stored."""
+    return tag.strip().lstrip("#").upper()
+
+
+def parse_battle_time(value: Optional[str]) -> int:
+    """Epoch seconds for an API `battleTime` (0 if missing or malformed)."""
+    try:
+        return calendar.timegm(
+            (int(value[0:4]), int(value[4:6]), int(value[6:8]), int(value[9:11]), int(value[11:13]), int(value[13:15]))
+        )
+    except (TypeError, ValueError):
+        return 0
+
+
+@dataclass(frozen=True, slots=True)
+class DeckRef:
+    """Card names (and levels when known) of one deck, in API order."""
+
+    cards: Tuple[str, ...]
+    levels: Tuple[int, ...] = ()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.cards)
+
+    def __len__(self) -> int:
+        return len(self.cards)
+
+    @property
+    def key(self) -> Tuple[str, ...]:
+        """Order-independent identity of the deck."""
+        return tuple(sorted(c.lower() for c in self.cards))
+
+
+EMPTY_DECK = DeckRef(())
+
+
+@dataclass(slots=True)
+class PlayerSnapshot:
+    """A player at one point in time: a battle side or a profile fetch."""
+
+    tag: str = ""
+    name: str = ""
+    trophies: int = 0
+    crowns: int = 0
+    trophy_change: int = 0
+    deck: DeckRef = EMPTY_DECK
+    league_rank: int = 0
+
+
+EMPTY_PLAYER = PlayerSnapshot()
+
+
+@dataclass(slots=True)
+class Battle:
+    time: int
+    type: str
+    mode: str
+    event_id: Optional[int]
+    event_name: str
+    team: PlayerSnapshot
+    opponent: PlayerSnapshot
+    lucky_drop: bool = False
+
+    @property
+    def is_pvp(self) -> bool:
+        return self.type == "PvP"
+
+    @property
+    def won(self) -> bool:
+        return self.team.crowns > self.opponent.crowns
+
+    @property
+    def battle_time(self) -> str:
+        return time.strftime(TIME_FORMAT, time.gmtime(self.time))
+
+    @property
+    def key(self) -> str:
+        """Identity of the battle, the same in both players' battlelogs."""
+        return f"{self.time}:" + ",".join(sorted((self.team.tag, self.opponent.tag)))
+
+    @property
+    def event_key(self) -> str:
+        """Event identifier as used by the event tracker (id, else name)."""
+        if self.event_id is not None:
+            return str(self.event_id)
+        return self.event_name or "unknown"
+
+
+@dataclass(slots=True)
+class MatchEvent:
+    """One card play in a match timeline."""
+
+    time: float
+    side: str
+    card: str
+    elixir: float = 0.0
+
+    def get(self, key: str, default=None):
+        """Mapping-style access so event functions take records or dicts."""
+        return getattr(self, key, default)
+
+
+def _deck(cards: List[Dict], cache: Dict) -> DeckRef:
+    if not cards:
+        return EMPTY_DECK
+    names = tuple(sys.intern(c.get("name", "")) for c in cards)
+    levels = tuple(c.get("level", 0) for c in cards)
+    key = (names, levels)
+    deck = cache.get(key)
+    if deck is None:
+        deck = cache[key] = DeckRef(names, levels)
+    return deck
+
+
+def _side(players: Optional[List[Dict]], cache: Dict) -> PlayerSnapshot:
+    if not players:
+        return EMPTY_PLAYER
+    p = players[0]
+    if not p:
+        return EMPTY_PLAYER
+    return PlayerSnapshot(
+        p.get("tag", ""),
+        p.get("name", ""),
+        p.get("startingTrophies", 0),
+        p.get("crowns", 0),
+        p.get("trophyChange", 0),
+        _deck(p.get("cards"), cache),
+    )
+
+
+_LUCKY_DROP = re.compile("lucky drop", re.IGNORECASE)
+
+
+def mentions_lucky_drop(value) -> bool:
+    """True if any string (key or value) in an API payload mentions a Lucky Drop.
+
+    Card lists are skipped: they are most of a battle and hold only card data.
+    """
+    stack = [value]
+    while stack:
+        v = stack.pop()
+        if isinstance(v, str):
+            if _LUCKY_DROP.search(v):
+                return True
+        elif isinstance(v, dict):
+            for k, item in v.items():
+                if _LUCKY_DROP.search(k):
+                    return True
+                if k != "cards" and k != "supportCards" and not isinstance(item, (int, float)):
+                    stack.append(item)
+        elif isinstance(v, (list, tuple)):
+            stack.extend(v)
+    return False
+
+
+def parse_battle(battle: Dict, cache: Optional[Dict] = None) -> Battle:
+    """Build a `Battle` from one API battle dict."""
+    cache = {} if cache is None else cache
+    mode = battle.get("gameMode")
+    event = battle.get("eventMode")
+    return Battle(
+        parse_battle_time(battle.get("battleTime")),
+        battle.get("type", ""),
+        mode.get("name", "") if mode else "",
+        event.get("id") if event else None,
+        event.get("name", "") if event else "",
+        _side(battle.get("team"), cache),
+        _side(battle.get("opponent"), cache),
+        mentions_lucky_drop(battle),
+    )
+
+
+def parse_battlelog(battles: Iterable[Dict]) -> List[Battle]:
+    """Parse a battlelog (order kept); repeated decks share one `DeckRef`."""
+    cache: Dict = {}
+    return [parse_battle(b, cache) for b in battles]
+
+
+def parse_player(player: Dict) -> PlayerSnapshot:
+    """Build a `PlayerSnapshot` from a `/players/{tag}` profile."""
+    return PlayerSnapshot(
+        player.get("tag", ""),
+        player.get("name", ""),
+        player.get("trophies", 0),
+        0,
+        0,
+        _deck(player.get("currentDeck"), {}),
+        player.get("leagueRank", 0),
+    )
+
+
+def parse_events(events: Iterable[Dict]) -> List[MatchEvent]:
+    return [MatchEvent(float(e.get("time", 0)), e.get("side", ""), e.get("card", ""), float(e.get("elixir", 0))) for e in events]
+
+
+def is_records(items) -> bool:
+    """True when `items` is a non-empty sequence of `Battle` records."""
+    return isinstance(items, (list, tuple)) and bool(items) and isinstance(items[0], Battle)
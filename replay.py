@@ -0,0 +1,338 @@
+"""Record/replay fixtures for the upstream APIs and a local stand-in server.
+
+Every upstream (Clash Royale API, RoyaleAPI, Invidious, Ollama) is mounted
+under its own prefix on one local HTTP server, and the modules are pointed
+at it through their usual base-URL variables. In record mode the server
+proxies to the real services and stores each response as a gzipped JSON
+fixture; in serve mode it replays fixtures with configurable latency, error
+rate and rate limit, so caching, retry and concurrency work can be tested
+offline and deterministically.
+
+    CLASH_ROYALE_TOKEN=... ROYALEAPI_TOKEN=... python replay.py record --port 9000
+    python replay.py synth                       # or generate fixtures without tokens
+    python replay.py serve --port 9000 --latency-ms 80 --error-rate 0.02 --rate-limit 20
+    eval "$(python replay.py env --port 9000)"   # then run the app, API server or benchmarks
+
+The base URLs are read when the modules are imported, so set the
+environment before starting the app.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import requests
+
+from scheduler import TokenBucket
+
+FIXTURE_DIR = "fixtures"
+
+# Service prefix -> real upstream used when recording.
+UPSTREAMS = {
+    "clash": "https://api.clashroyale.com/v1",
+    "royaleapi": "https://api.royaleapi.com",
+    "invidious": "https://yewtu.be",
+    "ollama": "http://127.0.0.1:11434",
+}
+
+# Service prefix -> environment variable holding that service's base URL.
+ENV_VARS = {
+    "clash": "CLASH_API_BASE",
+    "royaleapi": "ROYALEAPI_BASE",
+    "invidious": "INVIDIOUS_INSTANCES",
+    "ollama": "OLLAMA_HOST",
+}
+
+FORWARD_HEADERS = ("authorization", "accept", "content-type")
+
+
+def request_key(method: str, service: str, path: str, query: str = "", body: bytes = b"") -> Dict:
+    """Normalize a request so `#TAG` and `%23TAG` or reordered params match."""
+    return {
+        "method": method.upper(),
+        "service": service,
+        "path": unquote(path),
+        "query": sorted(parse_qsl(query, keep_blank_values=True)),
+        "body_sha1": hashlib.sha1(body).hexdigest() if body else "",
+    }
+
+
+def _digest(key: Dict) -> str:
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+class FixtureStore:
+    """Gzipped JSON fixtures under `<path>/<service>/<sha1>.json.gz`."""
+
+    def __init__(self, path: str = FIXTURE_DIR):
+        self.path = path
+        self.exact: Dict[str, Dict] = {}
+        self.by_path: Dict[Tuple[str, str, str], Dict] = {}
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.isdir(self.path):
+            return
+        for service in sorted(os.listdir(self.path)):
+            folder = os.path.join(self.path, service)
+            if not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                if name.endswith(".json.gz"):
+                    with gzip.open(os.path.join(folder, name), "rt") as fh:
+                        self._index(json.load(fh))
+
+    def _index(self, fixture: Dict) -> None:
+        key = fixture["request"]
+        self.exact[_digest(key)] = fixture
+        self.by_path.setdefault((key["method"], key["service"], key["path"]), fixture)
+
+    def add(self, key: Dict, status: int, body: bytes, content_type: str = "application/json") -> str:
+        """Store one response and return the fixture file path."""
+        fixture = {
+            "request": key,
+            "status": status,
+            "content_type": content_type,
+            "body": body.decode("utf-8", errors="replace"),
+            "recorded": time.time(),
+        }
+        folder = os.path.join(self.path, key["service"])
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{_digest(key)}.json.gz")
+        with gzip.open(path, "wt") as fh:
+            json.dump(fixture, fh)
+        self._index(fixture)
+        return path
+
+    def add_json(self, service: str, path: str, payload, method: str = "GET", query: str = "") -> str:
+        return self.add(request_key(method, service, path, query), 200, json.dumps(payload).encode())
+
+    def find(self, key: Dict) -> Optional[Dict]:
+        """Exact match first, else any recording of the same method and path."""
+        hit = self.exact.get(_digest(key))
+        if hit is None:
+            hit = self.by_path.get((key["method"], key["service"], key["path"]))
+        return hit
+
+    def __len__(self) -> int:
+        return len(self.exact)
+
+
+class StandIn(ThreadingHTTPServer):
+    """Replays (or records) upstream responses with injected faults."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        store: FixtureStore,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit: float = 0.0,
+        burst: Optional[float] = None,
+        seed: int = 0,
+        record: bool = False,
+        upstreams: Optional[Dict[str, str]] = None,
+    ):
+        super().__init__(address, _Handler)
+        self.store = store
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rate_limit, burst) if rate_limit else None
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.record = record
+        self.upstreams = upstreams or UPSTREAMS
+        self.stats = {"served": 0, "missing": 0, "throttled": 0, "errors": 0, "recorded": 0}
+        self.stats_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def bump(self, name: str) -> None:
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def delay(self) -> float:
+        with self.rng_lock:
+            return self.latency + self.rng.uniform(0, self.jitter)
+
+    def fail(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self.rng_lock:
+            return self.rng.random() < self.error_rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StandIn
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json", headers: Optional[Dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, reason: str, headers: Optional[Dict] = None):
+        self._send(status, json.dumps({"reason": reason}).encode(), headers=headers)
+
+    def _handle(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        url = urlsplit(self.path)
+        service, _, rest = url.path.lstrip("/").partition("/")
+        if service not in server.upstreams:
+            self._error(404, f"unknown service {service!r}")
+            return
+        path = "/" + rest
+        key = request_key(self.command, service, path, url.query, body)
+
+        if server.record:
+            self._record(key, service, path, url.query, body)
+            return
+        if server.bucket is not None:
+            wait = server.bucket.take()
+            if wait:
+                server.bump("throttled")
+                self._error(429, "requestThrottled", {"Retry-After": str(max(1, round(wait)))})
+                return
+        delay = server.delay()
+        if delay:
+            time.sleep(delay)
+        if server.fail():
+            server.bump("errors")
+            self._error(503, "injectedError")
+            return
+        fixture = server.store.find(key)
+        if fixture is None:
+            server.bump("missing")
+            self._error(404, "noFixture")
+            return
+        server.bump("served")
+        self._send(fixture["status"], fixture["body"].encode(), fixture.get("content_type", "application/json"))
+
+    def _record(self, key: Dict, service: str, path: str, query: str, body: bytes):
+        server = self.server
+        url = server.upstreams[service].rstrip("/") + path + (f"?{query}" if query else "")
+        headers = {k: v for k, v in self.headers.items() if k.lower() in FORWARD_HEADERS}
+        try:
+            resp = requests.request(self.command, url, headers=headers, data=body or None, timeout=120)
+        except requests.RequestException as e:
+            self._error(502, f"upstream failed: {e}")
+            return
+        content_type = resp.headers.get("Content-Type", "application/json")
+        if resp.status_code < 500:
+            server.store.add(key, resp.status_code, resp.content, content_type)
+            server.bump("recorded")
+        self._send(resp.status_code, resp.content, content_type)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stand_in(store: FixtureStore, host: str = "127.0.0.1", port: int = 0, **options) -> StandIn:
+    """Start a stand-in server on a background thread."""
+    server = StandIn((host, port), store, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def offline_env(base_url: str) -> Dict[str, str]:
+    """Environment pointing every module at the stand-in server."""
+    env = {var: f"{base_url}/{service}" for service, var in ENV_VARS.items()}
+    env["CLASH_ROYALE_TOKEN"] = os.getenv("CLASH_ROYALE_TOKEN") or "offline"
+    env["ROYALEAPI_TOKEN"] = os.getenv("ROYALEAPI_TOKEN") or "offline"
+    env["NO_PROXY"] = "127.0.0.1,localhost"
+    return env
+
+
+def synthesize(store: FixtureStore, players: int = 50, seed: int = 0) -> List[str]:
+    """Fill `store` with synthetic Clash API and RoyaleAPI fixtures; return the player tags."""
+    from benchmarks import datagen
+
+    tags = [f"OFF{i}" for i in range(players)]
+    for i, tag in enumerate(tags):
+        log = datagen.battlelog(25, seed=seed + i)
+        store.add_json("clash", f"/players/#{tag}", {"tag": f"#{tag}", "name": tag, "trophies": 6000 + i, "leagueRank": i % 10 + 1})
+        store.add_json("clash", f"/players/#{tag}/battlelog", log)
+    store.add_json("clash", "/cards", {"items": datagen.card_pool()})
+    top = datagen.leaderboard(1000, seed=seed)
+    store.add_json("royaleapi", "/player/top", {"items": top}, query="limit=1000")
+    return tags
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="replay fixtures with injected latency, errors and throttling")
+    record = sub.add_parser("record", help="proxy to the real services and store fixtures")
+    env = sub.add_parser("env", help="print exports pointing the modules at the stand-in")
+    synth = sub.add_parser("synth", help="write synthetic fixtures (no tokens needed)")
+    for p in (serve, record, env):
+        p.add_argument("--host", default="127.0.0.1")
+        p.add_argument("--port", type=int, default=9000)
+    for p in (serve, record, synth):
+        p.add_argument("--fixtures", default=os.getenv("CRTOOL_FIXTURES", FIXTURE_DIR))
+    serve.add_argument("--latency-ms", type=float, default=0.0)
+    serve.add_argument("--jitter-ms", type=float, default=0.0)
+    serve.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    serve.add_argument("--rate-limit", type=float, default=0.0, help="requests per second before 429 (0 = off)")
+    serve.add_argument("--burst", type=float, default=None)
+    serve.add_argument("--seed", type=int, default=0)
+    synth.add_argument("--players", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    if args.command == "env":
+        for name, value in offline_env(f"http://{args.host}:{args.port}").items():
+            print(f"export {name}={value}")
+        return 0
+    store = FixtureStore(args.fixtures)
+    if args.command == "synth":
+        tags = synthesize(store, players=args.players)
+        print(f"wrote {len(store)} fixtures to {args.fixtures} (players {tags[0]}..{tags[-1]})")
+        return 0
+    options = {"record": True}
+    if args.command == "serve":
+        options = {
+            "latency": args.latency_ms / 1000,
+            "jitter": args.jitter_ms / 1000,
+            "error_rate": args.error_rate,
+            "rate_limit": args.rate_limit,
+            "burst": args.burst,
+            "seed": args.seed,
+        }
+    server = StandIn((args.host, args.port), store, **options)
+    print(f"{args.command} on {server.base_url} with {len(store)} fixtures from {args.fixtures}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""Process-wide scheduler for the token-authenticated upstream APIs.
+
+Every Clash Royale API and RoyaleAPI request is admitted through `get()`.
+Each configured API token has its own token bucket, and a request goes out
+on whichever token has the most headroom, so a pool of tokens multiplies
+throughput and spreads the load evenly. Waiting requests are served
+strictly by lane, then in arrival order:
+
+    INTERACTIVE  page loads and API server requests (the default)
+    WATCHLIST    watchlist polls, opponent scouting, digest batches
+    CRAWL        leaderboard crawls and other bulk jobs
+
+Background lanes also leave `RESERVE` of every bucket's burst untouched,
+so an interactive request finds a free slot at once even while a crawl
+keeps the pool saturated. Background work runs under a lane:
+
+    with lane(CRAWL):
+        crawl()
+
+Tokens come from CLASH_ROYALE_TOKENS / ROYALEAPI_TOKENS (comma separated)
+or the single-token variables, per-token rates from CRTOOL_CLASH_RATE /
+CRTOOL_ROYALEAPI_RATE (requests per second). A 429 pauses the token for its
+Retry-After and the request is retried on the next free token.
+
+The default rates (10/s per Clash Royale token, 5/s per RoyaleAPI token)
+are deliberately conservative: they keep one developer key clear of the
+upstream throttling instead of running into 429s, and that matters more
+than latency once crawls and watchlist polls share the key. They also cap
+what the API server can fetch: with one token it makes at most 10 upstream
+requests per second, and requests beyond that queue here (cached and
+coalesced responses do not count). Deployments with higher quotas raise
+the rate variables or add tokens to the pool; `benchmarks/load_api.py`
+lifts the rate so it measures the server itself.
+"""
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import requests
+
+from instrument import count, gauge, observe
+
+INTERACTIVE = 0
+WATCHLIST = 1
+CRAWL = 2
+LANES = ("interactive", "watchlist", "crawl")
+
+CLASH = "clash"
+ROYALEAPI = "royaleapi"
+
+# service -> (pool variable, single-token variable, rate variable, default rate, missing-token message)
+SERVICES = {
+    CLASH: ("CLASH_ROYALE_TOKENS", "CLASH_ROYALE_TOKEN", "CRTOOL_CLASH_RATE", 10.0,
+            "CLASH_ROYALE_TOKEN environment variable not set"),
+    ROYALEAPI: ("ROYALEAPI_TOKENS", "ROYALEAPI_TOKEN", "CRTOOL_ROYALEAPI_RATE", 5.0, "ROYALEAPI_TOKEN not set"),
+}
+
+RESERVE = 0.25
+RETRIES = 3
+
+_lane: contextvars.ContextVar = contextvars.ContextVar("crtool_lane", default=INTERACTIVE)
+
+
+class TokenBucket:
+    """Allow `rate` requests per second with bursts of `burst`."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def level(self) -> float:
+        with self.lock:
+            self._refill()
+            return self.tokens
+
+    def take(self, need: float = 1.0) -> float:
+        """Consume a token if at least `need` are left; return 0 if allowed, else seconds until then."""
+        with self.lock:
+            self._refill()
+            if self.tokens >= need:
+                self.tokens -= 1
+                return 0.0
+            return (need - self.tokens) / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for about `seconds` (e.g. an upstream Retry-After)."""
+        with self.lock:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class Scheduler:
+    """Admits requests for one service across its pool of tokens, highest-priority lane first."""
+
+    def __init__(self, service: str, tokens: List[str], rate: float, burst: Optional[float] = None,
+                 reserve: float = RESERVE):
+        self.service = service
+        self.rate = rate
+        self.burst = burst
+        self.reserve = reserve
+        self.cond = threading.Condition()
+        self.waiting: List[tuple] = []
+        self.seq = itertools.count()
+        self.next = 0
+        self.depth = [0] * len(LANES)
+        self.served = [0] * len(LANES)
+        self.wait_seconds = [0.0] * len(LANES)
+        self.tokens: List[str] = []
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.per_token: Dict[str, int] = {}
+        self.set_tokens(tokens)
+
+    def set_tokens(self, tokens: List[str]) -> None:
+        """Replace the token pool; tokens already in use keep their bucket."""
+        with self.cond:
+            self.tokens = list(tokens)
+            self.buckets = {t: self.buckets.get(t) or TokenBucket(self.rate, self.burst) for t in self.tokens}
+            self.per_token = {t: self.per_token.get(t, 0) for t in self.tokens}
+            self.next = 0
+            self.cond.notify_all()
+
+    def _set_depth(self, lane: int, delta: int) -> None:
+        self.depth[lane] += delta
+        gauge("crtool_scheduler_queue_depth", self.depth[lane], service=self.service, lane=LANES[lane])
+
+    def _take(self, lane: int) -> tuple:
+        """(token, 0) when a slot was taken, else (None, seconds to wait)."""
+        if not self.tokens:
+            return None, 1.0
+        n = len(self.tokens)
+        # most headroom first; ties go round-robin from `next`
+        order = [self.tokens[(self.next + i) % n] for i in range(n)]
+        best = max(order, key=lambda t: self.buckets[t].level())
+        bucket = self.buckets[best]
+        need = 1.0 if lane == INTERACTIVE else max(1.0, min(bucket.capacity, 1.0 + self.reserve * bucket.capacity))
+        wait = bucket.take(need)
+        if wait:
+            return None, wait
+        self.next = (self.tokens.index(best) + 1) % n
+        return best, 0.0
+
+    def acquire(self, lane: int = INTERACTIVE) -> str:
+        """Block until a request in `lane` may go out; return the token to send it with."""
+        entry = (lane, next(self.seq))
+        start = time.monotonic()
+        with self.cond:
+            heapq.heappush(self.waiting, entry)
+            self._set_depth(lane, 1)
+            try:
+                while True:
+                    wait = None
+                    if self.waiting[0] == entry:
+                        token, wait = self._take(lane)
+                        if token is not None:
+                            break
+                    self.cond.wait(wait)
+            finally:
+                self.waiting.remove(entry)
+                heapq.heapify(self.waiting)
+                self._set_depth(lane, -1)
+                self.cond.notify_all()
+            waited = time.monotonic() - start
+            self.served[lane] += 1
+            self.wait_seconds[lane] += waited
+            self.per_token[token] += 1
+        count("crtool_scheduler_requests_total", service=self.service, lane=LANES[lane])
+        observe("crtool_scheduler_wait_seconds", waited, service=self.service, lane=LANES[lane])
+        return token
+
+    def throttle(self, token: str, seconds: float) -> None:
+        """Pause one token after the upstream said 429."""
+        bucket = self.buckets.get(token)
+        if bucket is not None:
+            bucket.pause(seconds)
+        count("crtool_scheduler_throttled_total", service=self.service)
+
+    def stats(self) -> Dict:
+        """Queue depth, requests served and mean wait per lane, and requests per token."""
+        with self.cond:
+            return {
+                "tokens": len(self.tokens),
+                "lanes": {
+                    name: {
+                        "depth": self.depth[i],
+                        "served": self.served[i],
+                        "avg_wait": self.wait_seconds[i] / self.served[i] if self.served[i] else 0.0,
+                    }
+                    for i, name in enumerate(LANES)
+                },
+                "per_token": list(self.per_token.values()),
+            }
+
+
+def configured_tokens(service: str) -> List[str]:
+    pool_var, single_var = SERVICES[service][:2]
+    raw = os.getenv(pool_var) or os.getenv(single_var) or ""
+    return [t.strip() for t in raw.split(",") if t.strip()]
+
+
+_schedulers: Dict[str, Scheduler] = {}
+_lock = threading.Lock()
+
+
+def get_scheduler(service: str) -> Scheduler:
+    """Return the process-wide scheduler of `service`, following changes to its configured tokens."""
+    tokens = configured_tokens(service)
+    if not tokens:
+        raise RuntimeError(SERVICES[service][4])
+    with _lock:
+        scheduler = _schedulers.get(service)
+        if scheduler is None:
+            rate = float(os.getenv(SERVICES[service][2], SERVICES[service][3]))
+            scheduler = _schedulers[service] = Scheduler(service, tokens, rate)
+        elif scheduler.tokens != tokens:
+            scheduler.set_tokens(tokens)
+        return scheduler
+
+
+def stats() -> Dict[str, Dict]:
+    """`Scheduler.stats()` of every service used so far in this process."""
+    with _lock:
+        schedulers = dict(_schedulers)
+    return {service: s.stats() for service, s in schedulers.items()}
+
+
+@contextmanager
+def lane(value: int) -> Iterator[None]:
+    """Send the upstream requests made in this block (and this context) in `value`'s lane."""
+    token = _lane.set(value)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane() -> int:
+    return _lane.get()
+
+
+def _retry_after(resp) -> float:
+    try:
+        return float(resp.headers.get("Retry-After") or 1)
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def get(service: str, url: str, params: Optional[Dict] = None, timeout: float = 10,
+        priority: Optional[int] = None) -> requests.Response:
+    """GET `url` once the scheduler admits it, authenticated with the chosen pool token.
+
+    `priority` overrides the lane of the current context.
+    """
+    scheduler = get_scheduler(service)
+    priority = current_lane() if priority is None else priority
+    for attempt in range(RETRIES + 1):
+        token = scheduler.acquire(priority)
+        resp = requests.get(url, headers={"Authorization": f"Bearer {token}"}, params=params, timeout=timeout)
+        if resp.status_code != 429 or attempt == RETRIES:
+            return resp
+        scheduler.throttle(token, _retry_after(resp))
+    return resp
@@ -0,0 +1,175 @@
+"""Opponent scouting: fetch the players a user faced and what they play.
+
+Opponent tags come from recent battlelogs. Each distinct tag is fetched once
+(profile and battlelog) through a process-wide cache, so one fetch serves
+every user who faced that opponent, including concurrent requests for the
+same tag. Fetches fan out over a bounded thread pool and go out in the
+request scheduler's watchlist lane, so scouting never holds up interactive
+page loads and shares the token pool's rate limits and 429 backoff.
+
+    scouted = scout(opponent_tags(get_battlelog(tag)))
+    faced_decks(scouted.values(), trophies=6200)
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from clash_api import get_battlelog, get_player
+from instrument import count
+from records import is_records, norm_tag, parse_battlelog
+from scheduler import WATCHLIST, lane
+
+SCOUT_TTL = 1800.0
+WORKERS = 4
+TROPHY_WINDOW = 300
+
+
+class ScoutCache:
+    """Thread-safe TTL cache of scouted players; concurrent misses on one tag share a single fetch."""
+
+    def __init__(self, ttl: float = SCOUT_TTL, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.data: "OrderedDict[str, tuple]" = OrderedDict()
+        self.inflight: Dict[str, Future] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_fetch(self, tag: str, fetch: Callable[[str], Dict]) -> Dict:
+        with self.lock:
+            entry = self.data.get(tag)
+            if entry is not None and entry[1] >= time.monotonic():
+                self.data.move_to_end(tag)
+                self.hits += 1
+                count("crtool_cache_requests_total", cache="scout", result="hit")
+                return entry[0]
+            pending = self.inflight.get(tag)
+            owner = pending is None
+            if owner:
+                pending = self.inflight[tag] = Future()
+                self.misses += 1
+        if not owner:
+            count("crtool_cache_requests_total", cache="scout", result="coalesced")
+            return pending.result()
+        count("crtool_cache_requests_total", cache="scout", result="miss")
+        try:
+            value = fetch(tag)
+        except BaseException as e:
+            with self.lock:
+                self.inflight.pop(tag, None)
+            pending.set_exception(e)
+            raise
+        with self.lock:
+            self.inflight.pop(tag, None)
+            self.data[tag] = (value, time.monotonic() + self.ttl)
+            self.data.move_to_end(tag)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+        pending.set_result(value)
+        return value
+
+
+_cache: Optional[ScoutCache] = None
+_lock = threading.Lock()
+
+
+def get_cache() -> ScoutCache:
+    """Return the process-wide scouting cache shared by every user."""
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = ScoutCache()
+        return _cache
+
+
+def opponent_tags(battles, limit: Optional[int] = None) -> List[str]:
+    """Distinct opponent tags in a battlelog (dicts or records), most recent first."""
+    if not is_records(battles):
+        battles = parse_battlelog(battles or [])
+    tags = []
+    seen = set()
+    for battle in battles:
+        tag = norm_tag(battle.opponent.tag)
+        if tag and tag not in seen:
+            seen.add(tag)
+            tags.append(tag)
+            if len(tags) == limit:
+                break
+    return tags
+
+
+def scout(
+    tags: Iterable[str],
+    fetch_player: Callable[[str], Dict] = get_player,
+    fetch_battlelog: Callable[[str], list] = get_battlelog,
+    workers: int = WORKERS,
+    cache: Optional[ScoutCache] = None,
+) -> Dict[str, Dict]:
+    """Fetch the profile and battlelog of each distinct tag, at most `workers` at a time.
+
+    Returns `{tag: {"player": ..., "battlelog": ...}}`; tags whose fetch fails are left out.
+    """
+    cache = get_cache() if cache is None else cache
+    tags = list(dict.fromkeys(norm_tag(t) for t in tags if t))
+
+    def fetch(tag: str) -> Dict:
+        return {"player": fetch_player(tag), "battlelog": fetch_battlelog(tag)}
+
+    def one(tag: str) -> Optional[Dict]:
+        try:
+            with lane(WATCHLIST):
+                return cache.get_or_fetch(tag, fetch)
+        except Exception:
+            return None
+
+    if not tags:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tags)))) as pool:
+        results = list(pool.map(one, tags))
+    return {tag: result for tag, result in zip(tags, results) if result is not None}
+
+
+def scout_battlelogs(logs: Iterable, per_log: int = 25, **kwargs) -> List[Dict[str, Dict]]:
+    """Scout the recent opponents of several users' battlelogs in one fan-out.
+
+    A tag faced by several users is fetched once; each user gets their own
+    `{tag: scouted}` mapping back, in the order of `logs`.
+    """
+    per_user = [opponent_tags(log, limit=per_log) for log in logs]
+    scouted = scout([tag for tags in per_user for tag in tags], **kwargs)
+    return [{tag: scouted[tag] for tag in tags if tag in scouted} for tags in per_user]
+
+
+def faced_decks(scouted: Iterable[Dict], trophies: int, window: int = TROPHY_WINDOW, limit: int = 20) -> List[Dict]:
+    """Decks played within `window` trophies of `trophies` in the scouted battlelogs.
+
+    Each ladder battle is counted once even when both of its players were
+    scouted; both sides are counted when in range. Returns the most played
+    decks with their count, share of all decks and win rate.
+    """
+    decks: Dict[tuple, List[int]] = {}
+    seen = set()
+    total = 0
+    for entry in scouted:
+        battles = entry.get("battlelog") or []
+        if not is_records(battles):
+            battles = parse_battlelog(battles)
+        for battle in battles:
+            if not battle.is_pvp or battle.key in seen:
+                continue
+            seen.add(battle.key)
+            for side, won in ((battle.team, battle.won), (battle.opponent, battle.opponent.crowns > battle.team.crowns)):
+                if not side.deck or abs(side.trophies - trophies) > window:
+                    continue
+                stats = decks.setdefault(tuple(sorted(side.deck.cards)), [0, 0])
+                stats[0] += 1
+                stats[1] += won
+                total += 1
+    ranked = sorted(decks.items(), key=lambda kv: -kv[1][0])[:limit]
+    return [
+        {"deck": list(deck), "count": n, "share": n / total, "win_rate": wins / n}
+        for deck, (n, wins) in ranked
+    ]
@@ -0,0 +1,51 @@
+"""Shared SQLite setup for the job queue, crawler, digests, watchlist and user store.
+
+Each store declares its schema as a tuple of `CREATE ... IF NOT EXISTS`
+statements. `connect` creates it, with WAL journaling so readers don't block
+the writer, the first time a process opens that database file, and skips the
+work on every later connection.
+
+    SCHEMA = ("CREATE TABLE IF NOT EXISTS jobs (...)",)
+    conn = connect("jobs.db", SCHEMA)
+"""
+import os
+import sqlite3
+import threading
+from typing import Tuple
+
+TIMEOUT = 30
+
+_initialized = set()
+_lock = threading.Lock()
+
+
+def _key(path: str, schema: Tuple[str, ...]) -> tuple:
+    return os.path.abspath(path), schema
+
+
+def init_db(path: str, schema: Tuple[str, ...]) -> None:
+    """Create the directory, the tables and indexes of `schema`, and turn on WAL."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=TIMEOUT)
+    cur = conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    for statement in schema:
+        cur.execute(statement)
+    conn.commit()
+    conn.close()
+    with _lock:
+        _initialized.add(_key(path, schema))
+
+
+def connect(path: str, schema: Tuple[str, ...], **kwargs) -> sqlite3.Connection:
+    """A connection to `path`, creating `schema` first if this process has not yet."""
+    if _key(path, schema) not in _initialized:
+        init_db(path, schema)
+    return sqlite3.connect(path, timeout=TIMEOUT, **kwargs)
+
+
+def forget(path: str) -> None:
+    """Drop `path` from the initialized set, e.g. after a test deletes the file."""
+    path = os.path.abspath(path)
+    with _lock:
+        _initialized.difference_update({k for k in _initialized if k[0] == path})
@@ -1,10 +1,12 @@
 import streamlit as st
-from clash_api import get_player, get_battlelog, get_cards
-import pandas as pd
 import json
 
 st.set_page_config(page_title="CR Analyzer", layout="centered")
 
+# Feature modules (pandas, coach/ollama, meta, gc_coach, merge_stats, watch)
+# are imported where they are used; benchmarks/startup.py checks this set.
+import streamlit_authenticator as stauth
+from clash_api import get_player, get_battlelog, get_cards
 from analysis import (
     compute_win_rate,
     compute_deck_rating,
@@ -14,24 +16,14 @@ from analysis import (
     collect_event_stats,
     daily_event_wr,
     load_progress,
-    record_daily_progress,
     card_cycle_trainer,
     elixir_diff_timeline,
+    elixir_leak,
     classify_playstyle,
     progress_to_csv,
+    record_daily_progress,
     reset_progress,
 )
-from youtube_api import search_videos
-from coach import get_tips
-from meta import (
-    find_matchup_videos,
-    meta_pulse,
-    get_top_decks,
-    get_top_players,
-    quartile_benchmarks,
-    league_benchmarks,
-)
-import streamlit_authenticator as stauth
 from auth import (
     init_db,
     register_user,
@@ -40,14 +32,49 @@ from auth import (
     update_mute_toast,
     load_credentials,
 )
-from deck_optimizer import smart_swap
-from digest import daily_digest_info
+import jobqueue
+from digest import user_digest
+from battle_archive import record_battles
+from matchups import get_matrix
+from records import parse_player
 from goals import check_badges, update_goal_tracker
-from gc_coach import start_run, record_match, summarize_run, get_gc_decks
-from player_watch import check_new_video, check_deck_change
-from merge_tactics import get_merge_leaderboard, card_tier_list
+from view_models import ViewModels, battle_version, time_version
+from instrument import is_enabled, snapshot, start_scope, summarize, write_prometheus
+from profiler import is_enabled as profiling_default
 
 init_db()
+
+
+@st.cache_resource(max_entries=64)
+def history_table(tag, version):
+    """Memory-mapped battle history, shared by every session viewing `tag`."""
+    from columnar import battles_view
+
+    return battles_view(tag)
+
+
+def synergy_index():
+    """Process-wide card synergy index (numpy loads on first use)."""
+    from synergy import get_index
+
+    return get_index()
+
+
+def load_benchmarks(league_rank):
+    """Download the leaderboard once and derive quartile and league benchmarks."""
+    from meta import get_top_players, league_benchmarks, quartile_benchmarks
+
+    players = get_top_players(limit=1000)
+    for p in players:
+        w = p.get('wins', 0)
+        l = p.get('losses', 0)
+        total = w + l
+        p['win_rate'] = w / total if total else 0
+    qs = quartile_benchmarks(players, key='trophies')
+    lb = league_benchmarks(league_rank, players=players) if league_rank else {}
+    return qs, lb
+
+
 # This function should exist in your auth.py to load credentials
 # Example: creds = {'usernames': {'johndoe': {'email': 'johndoe@gmail.com', 'name': 'John Doe', 'password': 'hashed_password'}}}
 creds = load_credentials() 
@@ -80,19 +107,43 @@ if playstyle != user.get("playstyle"):
     update_playstyle(user["email"], playstyle)
 
 mute_toast = st.checkbox("Mute daily toast", value=bool(user.get("mute_toast")))
+profile_jobs = st.sidebar.checkbox("Profile long jobs", value=profiling_default(), key="profile_jobs")
 if mute_toast != bool(user.get("mute_toast")):
     update_mute_toast(user["email"], mute_toast)
 
+VIEWS = ["Overview", "Events", "Progress", "Benchmarks", "GC Coach", "Merge Tactics", "Watch"]
+# Seconds before the player profile, battlelog and leaderboards are refetched.
+FETCH_TTL = 60
+LEADERBOARD_TTL = 600
+GOALS = {"Champion": 7500}
+
+vm = ViewModels(st.session_state)
+rerun_timings = start_scope() if is_enabled() else None
+
 if tag:
     try:
-        player = get_player(tag)
-        battles = get_battlelog(tag)
+        player, battles = vm.get(
+            "fetch", (tag, time_version(FETCH_TTL)), lambda: (get_player(tag), get_battlelog(tag))
+        )
     except Exception as e:
         st.error(f"Error fetching data: {e}")
     else:
-        record_daily_progress(battles, player.get("trophies", 0), player.get("leagueRank", 0))
-        digest = daily_digest_info(tag)
-        if digest and not mute_toast:
+        version = (tag, battle_version(battles))
+        # the scheduled digest job precomputes today's row; the fetched data fills it in otherwise
+        digest = vm.get("digest", version, lambda: user_digest(tag, player, battles))
+        profile = parse_player(player)
+        vm.get(
+            "progress_log",
+            version,
+            lambda: record_daily_progress(battles, profile.trophies, profile.league_rank, user=tag),
+        )
+        try:
+            vm.get("archive", version, lambda: record_battles(tag, battles))
+        except Exception as e:
+            st.warning(f"Battle history not saved: {e}")
+        vm.get("matchups", version, lambda: get_matrix().add_battles(battles))
+        vm.get("synergy", version, lambda: synergy_index().add_battles(battles))
+        if digest and not mute_toast and "digest" in vm.computed:
             msg = (
                 f"Δ {digest['delta_trophies']} trophies, step {digest['delta_step']} "
                 f"WR 24h {digest['win_rate']:.0%}"
@@ -100,19 +151,30 @@ if tag:
             if digest["lucky_drop"]:
                 msg += " Lucky Drop!"
             st.toast(msg)
-        tabs = st.tabs(["Overview", "Events", "Progress", "Benchmarks", "GC Coach", "Merge Tactics", "Watch"])
-        with tabs[0]:
+        # st.tabs runs every tab body on each rerun; a selector renders only the active view.
+        view = st.radio("View", VIEWS, horizontal=True, label_visibility="collapsed", key="view")
+        if view == "Overview":
             st.subheader(player.get("name", "Unknown"))
             st.write(f"Trophies: {player.get('trophies', 'N/A')}")
-            win_rate = compute_win_rate(battles)
+            overview = vm.get(
+                "overview",
+                version,
+                lambda: {"win_rate": compute_win_rate(battles), "tilt": detect_tilt(battles)},
+            )
+            win_rate = overview["win_rate"]
             st.write(f"Recent Win Rate: {win_rate:.0%}")
-            if detect_tilt(battles):
+            if overview["tilt"]:
                 st.warning("Tilt detected: multiple losses in a short time. Consider a break.")
+            history = history_table(tag, version)
+            if history is not None and len(history) > len(battles):
+                st.write(f"All-time Win Rate: {compute_win_rate(history):.0%} over {len(history)} archived battles")
             if st.checkbox("Show raw battle log"):
                 st.json(battles)
 
             query = st.text_input("Video search (optional)")
             if query:
+                from youtube_api import search_videos
+
                 try:
                     videos = search_videos(query, max_results=5)
                 except Exception as e:
@@ -126,6 +188,8 @@ if tag:
             st.write("### Match-up Finder")
             opponent_deck = st.text_input("Opponent deck (comma separated)")
             if deck_input and opponent_deck:
+                from meta import find_matchup_videos
+
                 try:
                     first = deck_input.split(',')[0].strip()
                     second = opponent_deck.split(',')[0].strip()
@@ -135,27 +199,58 @@ if tag:
                 except Exception as e:
                     st.error(f"Match-up search failed: {e}")
 
+            coach_ctx = {}
             if deck_input:
                 cards = [c.strip() for c in deck_input.split(',') if c.strip()]
                 try:
-                    card_data = get_cards()
+                    card_data = vm.get("cards", time_version(LEADERBOARD_TTL), get_cards)
                     rating = compute_deck_rating(cards, card_data)
                     st.write(f"Average Elixir: {rating['average_elixir']:.2f}")
                     st.write(f"Deck Score: {rating['score']:.0f}/100")
-                    detected = classify_playstyle(cards)
+                    detected = classify_playstyle(cards, card_data)
                     st.write(f"Detected playstyle: {detected}")
+                    coach_ctx.update(
+                        {"deck_score": rating["score"], "playstyle": playstyle, "detected_playstyle": detected}
+                    )
                     if detected != playstyle:
                         st.info(f"Consider switching playstyle to {detected}")
                     if rating['tips']:
                         st.write("Tips:")
                         for tip in rating['tips']:
                             st.write(f"- {tip}")
+                    swaps = synergy_index().suggest_swaps(cards, pool=[c['name'] for c in card_data])
+                    if swaps:
+                        st.write("Synergy swaps:")
+                        for sw in swaps:
+                            st.write(f"- {sw['out']} → {sw['in']} (PMI +{sw['gain']:.2f})")
+                    objective = st.radio("Optimize for", ["Deck score", "Meta win rate"], horizontal=True)
                     if st.button("Smart Swap Suggestions"):
-                        pool = [c['name'] for c in card_data]
-                        fitness = lambda d: compute_deck_rating(d, card_data)["score"]
-                        suggestions = smart_swap(cards, pool, fitness, generations=3)
-                        for s in suggestions:
-                            st.write(f"{s['deck']} → score {s['score']:.1f}")
+                        payload = {
+                            "cards": cards,
+                            "card_data": card_data,
+                            "objective": "meta" if objective == "Meta win rate" else "score",
+                            "generations": 3,
+                            "profile": profile_jobs,
+                        }
+                        # the same deck and objective within the hour reuses one job
+                        key = f"optimize:{payload['objective']}:{','.join(sorted(cards))}:{time_version(3600)}"
+                        st.session_state["optimize_job"] = jobqueue.enqueue("optimize", payload, key=key)
+                    job_id = st.session_state.get("optimize_job")
+                    if job_id:
+                        job = jobqueue.get_job(job_id)
+                        if job["status"] == jobqueue.DONE:
+                            prof = job["result"].get("profile")
+                            if prof:
+                                st.caption(f"Profile: {prof['path']} ({prof['samples']} samples)")
+                            for s in job["result"]["suggestions"]:
+                                st.write(f"{s['deck']} → score {s['score']:.1f}")
+                        elif job["status"] == jobqueue.FAILED:
+                            st.error(f"Smart Swap failed: {job['error'].strip().splitlines()[-1]}")
+                        else:
+                            st.info(f"Smart Swap is {job['status']} on a background worker.")
+                            if not jobqueue.active_workers("optimize"):
+                                st.caption("No worker is running Smart Swap jobs: start one with `python worker.py`.")
+                            st.button("Refresh")
                 except Exception as e:
                     st.error(f"Deck rating failed: {e}")
 
@@ -168,6 +263,7 @@ if tag:
                     st.write("Cycle Coverage:")
                     st.json(cycle)
                     st.write(f"Aggro Ratio (first 60s): {ratio:.2f}")
+                    coach_ctx.update({"aggro": ratio, "elixir_leak": elixir_leak(events), **cycle})
 
                     opp_full = st.text_input("Opponent full deck for trainer")
                     if opp_full:
@@ -179,6 +275,8 @@ if tag:
 
                     timeline = elixir_diff_timeline(events)
                     if timeline:
+                        import pandas as pd
+
                         df = pd.DataFrame(timeline)
                         max_t = int(df['time'].max())
                         rng = st.slider("Time range", 0, max_t, (0, max_t))
@@ -188,45 +286,75 @@ if tag:
                     st.error(f"Event analysis failed: {e}")
 
             if st.button("Get Coaching Tips"):
+                from coach import USE_QWEN, get_service, rule_stats, stream_tips
+
                 insights = {
                     "win_rate": win_rate,
-                    "tilt": detect_tilt(battles),
+                    "tilt": overview["tilt"],
                 }
-                if event_json:
-                    insights.update({"aggro": ratio, **cycle})
+                insights.update(coach_ctx)
                 try:
-                    tips = get_tips(insights)
-                    st.write(tips)
+                    st.write_stream(stream_tips(insights))
+                    rs = rule_stats()
+                    st.caption(
+                        f"Rule tier hit rate {rs['hit_rate']:.0%}, "
+                        f"~{rs['model_seconds_saved']:.0f}s of model time saved"
+                    )
+                    if USE_QWEN:
+                        cs = get_service().stats()
+                        st.caption(
+                            f"First token {cs['avg_ttft']:.2f}s, model load {cs['avg_load']:.2f}s, "
+                            f"cache hit rate {cs['cache_hit_rate']:.0%}"
+                        )
                 except Exception as e:
                     st.error(f"Coaching failed: {e}")
 
             if st.button("Show Trending Decks"):
+                from meta import get_top_decks, meta_pulse
+
                 try:
                     data = meta_pulse(get_top_decks(limit=1000))
+                    synergy_index().add_corpus(data)
                     for d in data:
                         st.write(d.get("name", "unknown"))
                 except Exception as e:
                     st.error(f"Meta Pulse failed: {e}")
 
+            if st.button("Scout Recent Opponents"):
+                from scouting import faced_decks, opponent_tags, scout
+
+                try:
+                    scouted = vm.get("scouting", version, lambda: scout(opponent_tags(battles, limit=25)))
+                    st.write(f"Decks faced around {player.get('trophies', 0)} trophies ({len(scouted)} opponents scouted):")
+                    for d in faced_decks(scouted.values(), player.get("trophies", 0), limit=10):
+                        st.write(f"- {', '.join(d['deck'])}: {d['share']:.0%} of decks, WR {d['win_rate']:.0%}")
+                except Exception as e:
+                    st.error(f"Scouting failed: {e}")
+
             trophies = player.get("trophies", 0)
-            goals = {"Champion": 7500}
+            goals = dict(GOALS)
             update_goal_tracker(goals, trophies)
             st.write("Badges:", check_badges([trophies], goals))
 
-        with tabs[1]:
+        elif view == "Events":
             st.write("### Event Performance")
-            stats = collect_event_stats(battles)
+            stats, chart = vm.get(
+                "events", version, lambda: (collect_event_stats(battles, user=tag), daily_event_wr(battles))
+            )
             for s in stats:
                 st.write(f"{s['event_id']}: {s['WR']:.0%} ({s['wins']}W/{s['losses']}L)")
-            chart = daily_event_wr(battles)
             if chart:
+                import pandas as pd
+
                 df = pd.DataFrame(chart)
                 st.line_chart(df.set_index('date'))
 
-        with tabs[2]:
+        elif view == "Progress":
             st.write("### Daily Progress")
-            progress = load_progress()
+            progress = vm.get("progress", version, lambda: load_progress(user=tag))
             if progress:
+                import pandas as pd
+
                 df = pd.DataFrame(progress)
                 st.line_chart(df.set_index('date')[['trophies', 'win_rate']])
                 csv_data = progress_to_csv(progress)
@@ -239,32 +367,54 @@ if tag:
             else:
                 st.info("No progress recorded yet.")
             if st.button("Reset History"):
-                reset_progress()
+                reset_progress(user=tag)
+                vm.invalidate("progress")
                 st.success("History cleared")
 
-        with tabs[3]:
+            st.write("### Goal Projection")
+            trophies = player.get("trophies", 0)
+
+            def project():
+                from projection import ladder_stats, project_goals
+
+                history = history_table(tag, version)
+                stats = ladder_stats(history if history is not None and len(history) > len(battles) else battles)
+                return project_goals(GOALS, trophies, stats)
+
+            for goal in vm.get("projection", (version, trophies), project):
+                if goal["battles"] is None:
+                    st.write(f"{goal['goal']} ({goal['target']}): out of reach at the current win rate")
+                elif goal["battles"]["p50"] == 0:
+                    st.write(f"{goal['goal']} ({goal['target']}): reached")
+                else:
+                    days = goal["days"]
+                    st.write(
+                        f"{goal['goal']} ({goal['target']}): {goal['probability']:.0%} chance, "
+                        f"median {days['p50']:.0f} days (80% within {days['p10']:.0f}–{days['p90']:.0f} days)"
+                    )
+
+        elif view == "Benchmarks":
             st.write("### Quartile Benchmarks")
             try:
-                players = get_top_players(limit=1000)
-                for p in players:
-                    w = p.get('wins', 0)
-                    l = p.get('losses', 0)
-                    total = w + l
-                    p['win_rate'] = w / total if total else 0
-                qs = quartile_benchmarks(players, key='trophies')
+                qs, lb = vm.get(
+                    "benchmarks",
+                    (time_version(LEADERBOARD_TTL), player.get('leagueRank')),
+                    lambda: load_benchmarks(player.get('leagueRank')),
+                )
                 for q in qs:
                     st.write(f"Q{q['quartile']}: {q['avg_win_rate']:.0%} win rate")
-                if player.get('leagueRank'):
-                    lb = league_benchmarks(player.get('leagueRank'))
+                if lb:
                     st.write(f"Your league avg WR: {lb.get('avg_win_rate',0):.0%}")
             except Exception as e:
                 st.error(f"Benchmarks failed: {e}")
 
-        with tabs[4]:
+        elif view == "GC Coach":
             st.write("### Grand Challenge Coach")
+            from gc_coach import start_run, record_match, summarize_run, get_gc_decks
+
             deck_gc = st.text_input("GC Deck (comma separated)", key="gc_deck")
             if st.button("Start GC Run") and deck_gc:
-                run_id = start_run([c.strip() for c in deck_gc.split(',') if c.strip()])
+                run_id = start_run([c.strip() for c in deck_gc.split(',') if c.strip()], user=user["email"])
                 st.session_state["gc_run_id"] = run_id
                 st.success(f"Started run {run_id}")
             run_id = st.session_state.get("gc_run_id")
@@ -273,23 +423,42 @@ if tag:
                 col1, col2 = st.columns(2)
                 with col1:
                     if st.button("Record Win"):
-                        record_match(run_id, True, player.get("trophies", 0))
+                        if not record_match(run_id, True, player.get("trophies", 0), user=user["email"]):
+                            st.error(f"Run {run_id} not found; start a new run")
+                        vm.invalidate("gc_summary")
                 with col2:
                     if st.button("Record Loss"):
-                        record_match(run_id, False, player.get("trophies", 0))
-                summary = summarize_run(run_id)
+                        if not record_match(run_id, False, player.get("trophies", 0), user=user["email"]):
+                            st.error(f"Run {run_id} not found; start a new run")
+                        vm.invalidate("gc_summary")
+                summary = vm.get("gc_summary", run_id, lambda: summarize_run(run_id, user=user["email"]))
                 st.write(f"{summary['wins']}/{summary['total']} wins", )
                 st.write(f"Avg Opponent Trophies: {summary['avg_elo']:.0f}")
+            gc_style = st.selectbox("Playstyle filter", ["Any", "Cycle", "Control", "Beatdown", "Siege", "Bait"], key="gc_style")
             if st.button("Show Top GC Decks"):
                 try:
-                    decks = get_gc_decks(limit=10)
-                    for d in decks:
-                        st.write(d.get("name", "unknown"))
+                    from card_index import CardIndex
+                    from deck_batch import deck_rating, encode_decks, rank_decks, rate_decks
+
+                    decks = get_gc_decks(limit=100)
+                    synergy_index().add_corpus(decks)
+                    names = [[c if isinstance(c, str) else c.get("name", "") for c in d.get("cards", [])] for d in decks]
+                    cards = CardIndex()
+                    card_data = vm.get("cards", time_version(LEADERBOARD_TTL), get_cards)
+                    ratings = rate_decks(encode_decks(names, cards), card_data, cards)
+                    style = None if gc_style == "Any" else gc_style
+                    for i in rank_decks(ratings, playstyle=style, limit=10):
+                        r = deck_rating(ratings, i)
+                        st.write(f"{decks[i].get('name', 'unknown')}: score {r['score']:.0f}, {r['playstyle']}")
+                        for tip in r["tips"]:
+                            st.caption(tip)
                 except Exception as e:
                     st.error(f"Failed to fetch GC decks: {e}")
-        with tabs[5]:
+        elif view == "Merge Tactics":
             st.write("### Merge Tactics")
             if st.button("Show Tier List"):
+                from merge_stats import get_merge_leaderboard, card_tier_list
+
                 try:
                     stats = get_merge_leaderboard(limit=100)
                     tier = card_tier_list(stats)
@@ -297,12 +466,15 @@ if tag:
                         st.write(f"{entry['card']}: {entry['eff']:.2f}")
                 except Exception as e:
                     st.error(f"Merge data failed: {e}")
-        with tabs[6]:
+        elif view == "Watch":
             st.write("### Watch")
+            from player_watch import check_new_video, check_deck_change
+            import watchlist
+
             ch_id = st.text_input("YouTube channel ID")
             if st.button("Check Videos") and ch_id:
                 try:
-                    vid = check_new_video(ch_id)
+                    vid = check_new_video(ch_id, user=user["email"])
                     if vid:
                         st.success(f"New video: [{vid['title']}]({vid['url']})")
                     else:
@@ -312,10 +484,48 @@ if tag:
             watch_tag = st.text_input("Player tag to watch")
             if st.button("Check Deck") and watch_tag:
                 try:
-                    deck = check_deck_change(watch_tag)
+                    deck = check_deck_change(watch_tag, user=user["email"])
                     if deck:
                         st.success("New deck: " + ', '.join(deck))
                     else:
                         st.info("No change")
                 except Exception as e:
-                    st.error(f"Deck check failed: {e}")
\ No newline at end of file
+                    st.error(f"Deck check failed: {e}")
+
+            st.write("### Watchlist")
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("Add player to watchlist") and watch_tag:
+                    watchlist.watch(watchlist.PLAYER, watch_tag, user=user["email"])
+            with col2:
+                if st.button("Add channel to watchlist") and ch_id:
+                    watchlist.watch(watchlist.CHANNEL, ch_id, user=user["email"])
+            if not jobqueue.active_workers("watchlist_poll"):
+                st.caption("No worker is polling the watchlist: run `python worker.py --schedule`.")
+            for w in watchlist.list_watched(user=user["email"]):
+                st.write(f"{w['kind']}: {w['key']} (every {w['interval'] / 60:.0f} min)")
+            for change in watchlist.recent_changes(limit=20, user=user["email"]):
+                if change["kind"] == watchlist.PLAYER:
+                    st.write(f"{change['key']} switched deck: " + ', '.join(change["deck"]))
+                else:
+                    st.markdown(f"{change['key']} uploaded [{change['title']}]({change['url']})")
+
+if rerun_timings is not None:
+    with st.sidebar.expander("Debug: timings"):
+        st.write("This rerun")
+        st.table(summarize(rerun_timings))
+        stats = snapshot()
+        st.write("Since start")
+        st.table(
+            [
+                {"name": h["name"], **h["labels"], "count": h["count"], "mean_ms": h["mean"] * 1000}
+                for h in stats["histograms"]
+            ]
+        )
+        st.table([{"name": c["name"], **c["labels"], "value": c["value"]} for c in stats["counters"]])
+        from scheduler import stats as scheduler_stats
+
+        for service, queue in scheduler_stats().items():
+            st.write(f"Request queue: {service} ({queue['tokens']} tokens)")
+            st.table([{"lane": name, **lane} for name, lane in queue["lanes"].items()])
+    write_prometheus()
@@ -0,0 +1,301 @@
+"""Data-driven card synergy: co-occurrence, lift/PMI and win-rate synergy.
+
+Decks from any corpus (RoyaleAPI top and GC decks, stored battles) are
+encoded as `CardIndex` ids. Pair counts are kept as a sorted array of packed
+`(a << 16) | b` keys with parallel count/win/game arrays, i.e. a compact
+sparse matrix whose row `a` is one contiguous slice, so "best partners of
+card X" is a binary search plus a vectorized score over that slice.
+
+    index = get_index()
+    index.add_battles(battles)              # each battle counted once
+    index.add_corpus(get_gc_decks())        # each deck counted once
+    index.top_partners("Hog Rider", k=5)    # by PMI, lift or win synergy
+    index.suggest_swaps(deck)               # card out, card in, PMI gain
+
+Battles carry a result, so pairs also get a win rate; `synergy` is how much
+better decks with both cards do than the two cards do on average.
+"""
+import json
+import math
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from card_index import CardIndex
+from records import Battle, parse_battle
+
+SYNERGY_PATH = "synergy.npz"
+
+# Pairs seen in fewer decks are too noisy to rank.
+MIN_COUNT = 3
+# Pseudo-games at 50% for pair and card win rates.
+PRIOR = 2.0
+SCORES = ("pmi", "lift", "synergy", "count")
+
+
+def _cards(deck: Iterable) -> List[str]:
+    return [c if isinstance(c, str) else c.get("name", "") for c in deck]
+
+
+def _win_rate(item: Dict) -> Optional[float]:
+    wr = item.get("winPercent") or item.get("win_pct") or item.get("wr")
+    if wr is None:
+        return None
+    return wr / 100 if wr > 1 else wr
+
+
+class SynergyIndex:
+    """Sparse card pair statistics over a deck corpus."""
+
+    def __init__(self, cards: Optional[CardIndex] = None):
+        self.cards = CardIndex() if cards is None else cards
+        # re-entrant: add_battles/add_corpus hold it across their add_decks call
+        self.lock = threading.RLock()
+        self.decks = 0.0
+        self.seen: set = set()
+        self.card_count = np.zeros(0)
+        self.card_wins = np.zeros(0)
+        self.card_games = np.zeros(0)
+        self.keys = np.zeros(0, dtype=np.uint32)
+        self.count = np.zeros(0)
+        self.wins = np.zeros(0)
+        self.games = np.zeros(0)
+
+    def __len__(self) -> int:
+        """Number of distinct card pairs."""
+        return len(self.keys) // 2
+
+    def add_decks(self, decks: Iterable[Iterable], results: Optional[Sequence[Optional[float]]] = None) -> int:
+        """Count decks (card names or API card dicts).
+
+        `results` gives each deck's win fraction (1/0 for a battle, a win rate
+        for corpus decks) or None when unknown; unknown results only feed
+        co-occurrence.
+        """
+        with self.lock:
+            rows = []
+            for deck in decks:
+                ids = list(dict.fromkeys(self.cards.add(c) for c in _cards(deck) if c))
+                rows.append(ids[:8] + [-1] * (8 - len(ids[:8])))
+            if not rows:
+                return 0
+            ids = np.array(rows, dtype=np.int64)
+            n = len(ids)
+            if results is None:
+                results = [None] * n
+            games = np.array([0.0 if r is None else 1.0 for r in results])
+            wins = np.array([0.0 if r is None else float(r) for r in results])
+
+            a, b = ids[:, :, None], ids[:, None, :]
+            mask = (a != b) & (a >= 0) & (b >= 0)
+            pair_keys = ((a << 16) | b)[mask].astype(np.uint32)
+            shape = ids.shape + (ids.shape[1],)
+            pair_wins = np.broadcast_to(wins[:, None, None], shape)[mask]
+            pair_games = np.broadcast_to(games[:, None, None], shape)[mask]
+
+            valid = ids >= 0
+            card_ids = ids[valid]
+            size = len(self.cards)
+            card_delta = np.bincount(card_ids, minlength=size).astype(float)
+            card_wins = np.bincount(card_ids, weights=np.broadcast_to(wins[:, None], ids.shape)[valid], minlength=size)
+            card_games = np.bincount(card_ids, weights=np.broadcast_to(games[:, None], ids.shape)[valid], minlength=size)
+
+            keys, inverse = np.unique(np.concatenate([self.keys, pair_keys]), return_inverse=True)
+            self.count = np.bincount(inverse, weights=np.concatenate([self.count, np.ones(len(pair_keys))]))
+            self.wins = np.bincount(inverse, weights=np.concatenate([self.wins, pair_wins]))
+            self.games = np.bincount(inverse, weights=np.concatenate([self.games, pair_games]))
+            self.keys = keys.astype(np.uint32)
+            self.card_count = self._grow(self.card_count, size) + card_delta
+            self.card_wins = self._grow(self.card_wins, size) + card_wins
+            self.card_games = self._grow(self.card_games, size) + card_games
+            self.decks += n
+            return n
+
+    @staticmethod
+    def _grow(values: np.ndarray, size: int) -> np.ndarray:
+        return np.concatenate([values, np.zeros(size - len(values))]) if len(values) < size else values
+
+    def add_battles(self, battles: Iterable) -> int:
+        """Count both decks of battles (API dicts or `Battle` records) not seen before."""
+        with self.lock:
+            cache: Dict = {}
+            decks, results = [], []
+            for b in battles:
+                battle = b if isinstance(b, Battle) else parse_battle(b, cache)
+                if not battle.team.deck or not battle.opponent.deck or battle.key in self.seen:
+                    continue
+                self.seen.add(battle.key)
+                mine, theirs = battle.team.crowns, battle.opponent.crowns
+                result = 1.0 if mine > theirs else 0.0 if mine < theirs else 0.5
+                decks += [battle.team.deck, battle.opponent.deck]
+                results += [result, 1.0 - result]
+            return self.add_decks(decks, results) // 2
+
+    def add_corpus(self, items: Iterable[Dict]) -> int:
+        """Count RoyaleAPI deck items (`cards`, optional win percent) not seen before."""
+        with self.lock:
+            decks, results = [], []
+            for item in items:
+                cards = _cards(item.get("cards") or item.get("currentDeck") or [])
+                key = "deck:" + ",".join(sorted(c.lower() for c in cards))
+                if not cards or key in self.seen:
+                    continue
+                self.seen.add(key)
+                decks.append(cards)
+                results.append(_win_rate(item))
+            return self.add_decks(decks, results)
+
+    def _row(self, idx: int) -> slice:
+        lo = int(np.searchsorted(self.keys, idx << 16))
+        hi = int(np.searchsorted(self.keys, (idx + 1) << 16))
+        return slice(lo, hi)
+
+    def _stats(self, idx: int, row: slice) -> Dict[str, np.ndarray]:
+        partners = (self.keys[row] & 0xFFFF).astype(np.int64)
+        count = self.count[row]
+        lift = count * self.decks / (self.card_count[idx] * self.card_count[partners])
+        wr_pair = (self.wins[row] + PRIOR / 2) / (self.games[row] + PRIOR)
+        wr_cards = (self.card_wins + PRIOR / 2) / (self.card_games + PRIOR)
+        return {
+            "partner": partners,
+            "count": count,
+            "lift": lift,
+            "pmi": np.log(lift),
+            "win_rate": wr_pair,
+            "synergy": wr_pair - (wr_cards[idx] + wr_cards[partners]) / 2,
+        }
+
+    def pair(self, a: str, b: str) -> Dict:
+        """Statistics of one card pair (zero counts if never seen together)."""
+        ia, ib = self.cards.id_of(a), self.cards.id_of(b)
+        row = self._row(ia)
+        stats = self._stats(ia, row)
+        hit = np.flatnonzero(stats["partner"] == ib)
+        if not len(hit):
+            return {"card": self.cards.name_of(ib), "count": 0, "lift": 0.0, "pmi": -math.inf, "win_rate": 0.5, "synergy": 0.0}
+        return self._entry(stats, int(hit[0]))
+
+    def _entry(self, stats: Dict[str, np.ndarray], i: int) -> Dict:
+        return {
+            "card": self.cards.name_of(int(stats["partner"][i])),
+            "count": int(stats["count"][i]),
+            **{k: float(stats[k][i]) for k in ("lift", "pmi", "win_rate", "synergy")},
+        }
+
+    def top_partners(self, card: str, k: int = 5, by: str = "pmi", min_count: int = MIN_COUNT) -> List[Dict]:
+        """Return the `k` best partners of `card`, ranked by `by` (see SCORES)."""
+        if by not in SCORES:
+            raise ValueError(f"by must be one of {SCORES}")
+        if card not in self.cards:
+            return []
+        idx = self.cards.id_of(card)
+        stats = self._stats(idx, self._row(idx))
+        eligible = np.flatnonzero(stats["count"] >= min_count)
+        if not len(eligible):
+            return []
+        score = stats[by][eligible]
+        if len(eligible) > k:
+            top = np.argpartition(-score, k - 1)[:k]
+        else:
+            top = np.arange(len(eligible))
+        top = top[np.argsort(-score[top], kind="stable")]
+        return [self._entry(stats, int(i)) for i in eligible[top]]
+
+    def _pmi_rows(self, ids: List[int], min_count: int) -> np.ndarray:
+        """Dense (len(ids), n_cards) PMI rows; unseen or rare pairs are 0."""
+        rows = np.zeros((len(ids), len(self.cards)))
+        for r, idx in enumerate(ids):
+            row = self._row(idx)
+            stats = self._stats(idx, row)
+            keep = stats["count"] >= min_count
+            rows[r, stats["partner"][keep]] = stats["pmi"][keep]
+        return rows
+
+    def suggest_swaps(
+        self, deck: Iterable[str], k: int = 3, pool: Optional[Iterable[str]] = None, min_count: int = MIN_COUNT
+    ) -> List[Dict]:
+        """Single-card swaps that most raise the deck's summed pairwise PMI."""
+        names = [c for c in deck if c in self.cards]
+        if not names or not len(self.keys):
+            return []
+        ids = [self.cards.id_of(c) for c in names]
+        rows = self._pmi_rows(ids, min_count)
+        total = rows.sum(axis=0)
+        # gain[i, c]: PMI of c with the deck minus card i, less what card i had
+        gain = total[None, :] - rows - total[ids][:, None]
+        allowed = np.zeros(len(self.cards), dtype=bool)
+        if pool is None:
+            allowed[:] = True
+        else:
+            allowed[[self.cards.id_of(c) for c in pool if c in self.cards]] = True
+        allowed[ids] = False
+        gain[:, ~allowed] = -np.inf
+        flat = np.argsort(-gain, axis=None)[:k]
+        swaps = []
+        for i, c in zip(*np.unravel_index(flat, gain.shape)):
+            if gain[i, c] <= 0:
+                break
+            swaps.append({"out": names[i], "in": self.cards.name_of(int(c)), "gain": float(gain[i, c])})
+        return swaps
+
+    def save(self, path: str = SYNERGY_PATH) -> None:
+        with self.lock:
+            np.savez(
+                path,
+                cards=np.array(json.dumps(self.cards.to_list())),
+                seen=np.array(sorted(self.seen), dtype=str),
+                decks=np.array(self.decks),
+                **{name: getattr(self, name) for name in (
+                    "keys", "count", "wins", "games", "card_count", "card_wins", "card_games"
+                )},
+            )
+
+    @classmethod
+    def load(cls, path: str = SYNERGY_PATH) -> "SynergyIndex":
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        with np.load(path) as data:
+            index.cards = CardIndex.from_list(json.loads(str(data["cards"])))
+            index.seen = set(data["seen"].tolist())
+            index.decks = float(data["decks"])
+            for name in ("keys", "count", "wins", "games", "card_count", "card_wins", "card_games"):
+                setattr(index, name, data[name])
+        return index
+
+
+def ingest_archives(index: Optional[SynergyIndex] = None, root: Optional[str] = None) -> int:
+    """Count every battle stored in the `battle_archive` directory."""
+    from battle_archive import ARCHIVE_DIR, load
+
+    index = get_index() if index is None else index
+    root = root or ARCHIVE_DIR
+    if not os.path.isdir(root):
+        return 0
+    return sum(
+        index.add_battles(load(os.path.join(root, name)))
+        for name in sorted(os.listdir(root))
+        if name.endswith(".crba")
+    )
+
+
+_index: Optional[SynergyIndex] = None
+_lock = threading.Lock()
+
+
+def get_index(path: Optional[str] = None) -> SynergyIndex:
+    """Return the process-wide index, loaded from CRTOOL_SYNERGY_FILE or synergy.npz."""
+    global _index
+    with _lock:
+        if _index is None:
+            _index = SynergyIndex.load(path or os.getenv("CRTOOL_SYNERGY_FILE", SYNERGY_PATH))
+        return _index
+
+
+if __name__ == "__main__":
+    path = os.getenv("CRTOOL_SYNERGY_FILE", SYNERGY_PATH)
+    added = ingest_archives(get_index(path))
+    get_index(path).save(path)
+    print(f"counted {added} new battles, {len(get_index(path))} card pairs")
@@ -14,6 +14,7 @@ from analysis import (
     reset_progress,
     card_cycle_trainer,
     elixir_diff_timeline,
+    elixir_leak,
     classify_playstyle,
 )
 
@@ -144,10 +145,23 @@ class AnalysisTests(unittest.TestCase):
         timeline = elixir_diff_timeline(events)
         self.assertAlmostEqual(timeline[-1]["diff"], timeline[-1]["player"] - timeline[-1]["opponent"])
 
+    def test_elixir_leak(self):
+        # 5 elixir refills in 14s, so 6s of the first 20s are leaked
+        events = [{"time": 20, "side": "player", "elixir": 3}]
+        self.assertAlmostEqual(elixir_leak(events), 6.0)
+        self.assertEqual(elixir_leak([{"time": 2, "side": "player", "elixir": 3}]), 0.0)
+
     def test_classify_playstyle(self):
         deck = ["Hog Rider", "Ice Spirit", "Cannon", "Log"]
         style = classify_playstyle(deck)
         self.assertIn(style, {"Cycle", "Control", "Beatdown", "Bait", "Siege"})
+        costs = [{"name": "Golem", "elixirCost": 8}, {"name": "Night Witch", "elixirCost": 4},
+                 {"name": "Hog Rider", "elixirCost": 4}, {"name": "Ice Spirit", "elixirCost": 1},
+                 {"name": "Cannon", "elixirCost": 3}, {"name": "Log", "elixirCost": 2}]
+        self.assertEqual(classify_playstyle(deck, costs), "Cycle")
+        self.assertEqual(classify_playstyle(["Golem", "Night Witch"], costs), "Beatdown")
+        self.assertEqual(classify_playstyle([{"name": "Golem", "elixirCost": 8}]), "Beatdown")
+        self.assertEqual(classify_playstyle(["Golem", "Night Witch"]), "Bait")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,172 @@
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+import instrument
+from api_server import ApiServer
+from matchups import MatchupMatrix
+
+
+async def _request(port, method, path, body=None, headers=""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = json.dumps(body).encode() if body is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: x\r\nConnection: close\r\n{headers}"
+        f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+    )
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, _, payload = raw.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    gzipped = b"Content-Encoding: gzip" in head
+    if gzipped:
+        payload = gzip.decompress(payload)
+    return status, json.loads(payload), gzipped
+
+
+class ApiServerTests(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+
+        def battlelog(tag):
+            self.calls += 1
+            return [{"type": "PvP", "team": [{"crowns": 1}], "opponent": [{"crowns": 0}]}]
+
+        self.api = ApiServer(
+            fetch_player=lambda tag: {"name": "P", "trophies": 6000},
+            fetch_battlelog=battlelog,
+            fetch_cards=lambda: [{"name": f"C{i}", "elixirCost": 3} for i in range(200)],
+            fetch_top_players=lambda: [],
+        )
+
+    def run_requests(self, *requests):
+        async def main():
+            server = await self.api.start(port=0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                return await asyncio.gather(*(_request(port, *r) for r in requests))
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        return asyncio.run(main())
+
+    def test_metrics_endpoint_is_plain_text(self):
+        instrument.enable()
+        try:
+            self.run_requests(("GET", "/players/%23abc/summary"), ("GET", "/players/%23abc/summary"))
+            status, text = asyncio.run(self.api.dispatch("GET", "/metrics", b""))
+        finally:
+            instrument.enable(False)
+            instrument.reset()
+        self.assertEqual(status, 200)
+        self.assertIn('crtool_cache_requests_total{cache="api",result="miss"} 1', text)
+        self.assertIn("crtool_http_request_seconds_count", text)
+
+    def test_summary_is_cached_and_coalesced(self):
+        results = self.run_requests(*[("GET", "/players/%23abc/summary")] * 5)
+        for status, payload, _ in results:
+            self.assertEqual(status, 200)
+            self.assertEqual(payload["win_rate"], 1.0)
+        self.assertEqual(self.calls, 1)
+
+    def test_coalesced_requests_share_the_upstream_error(self):
+        def failing(tag):
+            self.calls += 1
+            time.sleep(0.05)  # keep the first request in flight while the others arrive
+            raise ConnectionError("upstream down")
+
+        self.api.fetch_battlelog = failing
+        results = self.run_requests(*[("GET", "/players/%23abc/win_rate")] * 4)
+        self.assertEqual([r[0] for r in results], [502] * 4)
+        self.assertEqual({r[1]["error"] for r in results}, {"win_rate failed: upstream down"})
+        self.assertEqual(self.calls, 1)
+
+    def test_rating_and_errors(self):
+        (status, rating, _), (bad, _, _), (missing, _, _) = self.run_requests(
+            ("POST", "/decks/rating", {"cards": ["C1", "C2"]}),
+            ("POST", "/decks/rating", {"cards": []}),
+            ("GET", "/nope"),
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(rating["average_elixir"], 3)
+        self.assertEqual(bad, 400)
+        self.assertEqual(missing, 404)
+
+    def test_bad_input_is_a_client_error(self):
+        results = self.run_requests(
+            ("POST", "/decks/optimize", {"cards": ["C1"], "generations": "many"}),
+            ("POST", "/decks/rank", {"decks": [["C1"]], "limit": 0}),
+            ("POST", "/decks/rating", ["C1"]),
+            ("GET", "/benchmarks?league_rank=abc"),
+        )
+        self.assertEqual([r[0] for r in results], [400, 400, 400, 400])
+        self.assertIn("generations", results[0][1]["error"])
+
+    def test_oversized_body_is_rejected(self):
+        async def main():
+            server = await self.api.start(port=0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(b"POST /decks/rating HTTP/1.1\r\nHost: x\r\nContent-Length: 999999999\r\n\r\n")
+                await writer.drain()
+                raw = await reader.read()
+                writer.close()
+                return raw
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        self.assertTrue(asyncio.run(main()).startswith(b"HTTP/1.1 413"))
+
+    @patch("api_server.GZIP_MIN_BYTES", 0)
+    def test_optimize_gzip(self):
+        ((status, payload, gzipped),) = self.run_requests(
+            ("POST", "/decks/optimize", {"cards": ["C1", "C2", "C3", "C4"], "generations": 1}, "Accept-Encoding: gzip\r\n"),
+        )
+        self.assertEqual(status, 200)
+        self.assertTrue(gzipped)
+        self.assertTrue(payload["suggestions"])
+
+    def test_rank_decks(self):
+        decks = [["C1", "C2"], ["C3"], ["Knight", "Zap"]]
+        (status, payload, _), (bad, _, _) = self.run_requests(
+            ("POST", "/decks/rank", {"decks": decks, "limit": 2}),
+            ("POST", "/decks/rank", {"decks": decks, "playstyle": "Turtle"}),
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(payload["total"], 3)
+        self.assertEqual([d["cards"] for d in payload["decks"]], [["C1", "C2"], ["C3"]])
+        self.assertEqual(payload["decks"][0]["playstyle"], "Cycle")
+        self.assertEqual(bad, 400)
+
+    def test_optimize_meta_objective(self):
+        self.api.matrix = MatchupMatrix(os.path.join(tempfile.mkdtemp(), "matchups.db"))
+        (status, payload, _), (bad, _, _) = self.run_requests(
+            ("POST", "/decks/optimize", {"cards": ["C1", "C2"], "generations": 1, "objective": "meta"}),
+            ("POST", "/decks/optimize", {"cards": ["C1", "C2"], "objective": "nope"}),
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(payload["suggestions"][0]["score"], 50.0)
+        self.assertEqual(bad, 400)
+
+    def test_scouting(self):
+        (status, payload, _), = self.run_requests(("GET", "/players/abc/scouting"))
+        self.assertEqual(status, 200)
+        self.assertEqual((payload["tag"], payload["opponents"], payload["decks"]), ("ABC", 0, []))
+
+    def test_player_progress(self):
+        with patch("api_server.load_progress", return_value=[{"date": "2024-07-16"}]) as load:
+            (status, payload, _), = self.run_requests(("GET", "/players/%23abc/progress"))
+        self.assertEqual((status, payload["tag"], payload["progress"]), (200, "ABC", [{"date": "2024-07-16"}]))
+        load.assert_called_once_with(user="ABC")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import battle_archive
+from battle_archive import ArchiveReader, append, load, parse_time, save
+from benchmarks import datagen
+from card_index import CardIndex
+
+
+def verbose_battlelog(n, seed=0):
+    """datagen battles with the per-card static fields the real API repeats."""
+    log = datagen.battlelog(n, seed=seed)
+    for battle in log:
+        battle["arena"] = {"id": 54000017, "name": "Legendary Arena"}
+        for side in ("team", "opponent"):
+            player = battle[side][0]
+            player.update({"name": "P", "startingTrophies": 7000, "kingTowerHitPoints": 4000, "elixirLeaked": 1.25})
+            for card in player["cards"]:
+                card.update({"maxLevel": 14, "elixirCost": 4, "iconUrls": {"medium": f"https://cdn/{card['id']}.png"}})
+    return log
+
+
+def newest_first(log):
+    return sorted(log, key=lambda b: b["battleTime"], reverse=True)
+
+
+class CardIndexTests(unittest.TestCase):
+    def test_dense_ids_and_static_fields(self):
+        idx = CardIndex()
+        self.assertEqual(idx.encode(["Knight", "Zap", "knight"]), [0, 1, 0])
+        idx.add({"name": "Zap", "id": 28000008, "level": 11, "maxLevel": 14})
+        self.assertEqual(idx.card(1, level=9), {"name": "Zap", "id": 28000008, "maxLevel": 14, "level": 9})
+        self.assertEqual(CardIndex.from_list(idx.to_list()).decode([1, 0]), ["Zap", "Knight"])
+
+
+class BattleArchiveTests(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "history.crba")
+
+    def test_round_trip_is_lossless_and_compact(self):
+        log = verbose_battlelog(500)
+        save(self.path, log, codec="zlib")
+        self.assertEqual(load(self.path), newest_first(log))
+        self.assertGreater(len(json.dumps(log)) / os.path.getsize(self.path), 10)
+
+    def test_time_range_scan_decodes_only_overlapping_blocks(self):
+        log = verbose_battlelog(300)
+        save(self.path, log, block_size=50)
+        times = sorted(parse_time(b["battleTime"]) for b in log)
+        start, end = times[120], times[160]
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual(len(reader), 300)
+            self.assertEqual(len(reader.blocks), 6)
+            with patch.object(ArchiveReader, "_block", wraps=reader._block) as decode:
+                got = list(reader.scan(start, end))
+        self.assertEqual(len(got), 41)
+        self.assertEqual(decode.call_count, 2)
+        self.assertEqual(parse_time(got[0]["battleTime"]), start)
+
+    def test_append_adds_only_newer_battles_and_refills_last_block(self):
+        log = newest_first(verbose_battlelog(120))
+        save(self.path, log[60:], block_size=50)
+        self.assertEqual(append(self.path, log[:80], block_size=50), 60)
+        self.assertEqual(append(self.path, log[:10], block_size=50), 0)
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual([b["count"] for b in reader.blocks], [50, 50, 20])
+        self.assertEqual(load(self.path), log)
+
+    def test_append_swaps_in_a_new_file(self):
+        log = newest_first(verbose_battlelog(120))
+        save(self.path, log[60:], block_size=50)
+        with ArchiveReader(self.path) as reader:
+            append(self.path, log[:60], block_size=50)
+            # a reader opened before the append still sees the old, intact file
+            self.assertEqual(len(list(reader.scan())), 60)
+        with patch("battle_archive._write", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                append(self.path, newest_first(verbose_battlelog(5, seed=1)), block_size=50)
+        self.assertEqual(load(self.path), log)
+
+    def test_concurrent_appends(self):
+        log = newest_first(verbose_battlelog(200))
+        save(self.path, log[100:], block_size=50)
+        # writers racing on the same new battles: each battle is stored once
+        threads = [threading.Thread(target=append, args=(self.path, log[:100], None, 50)) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(load(self.path), log)
+
+    def test_record_battles_per_player(self):
+        root = tempfile.mkdtemp()
+        log = datagen.battlelog(30)
+        self.assertEqual(battle_archive.record_battles("#abc", log, root=root), 30)
+        self.assertEqual(battle_archive.record_battles("ABC", log, root=root), 0)
+        self.assertTrue(os.path.exists(os.path.join(root, "ABC.crba")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+from benchmarks import datagen
+from benchmarks.run import CASES, measure
+from benchmarks.compare import compare
+
+
+class BenchmarkTests(unittest.TestCase):
+    def test_datagen_shapes(self):
+        log = datagen.battlelog(10)
+        self.assertEqual(len(log), 10)
+        self.assertGreater(log[0]["battleTime"], log[-1]["battleTime"])
+        self.assertEqual(len(log[0]["team"][0]["cards"]), 8)
+        self.assertEqual(len(datagen.leaderboard(50)), 50)
+
+    def test_every_case_runs_at_smallest_size(self):
+        for name, spec in CASES.items():
+            result = measure(spec["setup"](min(spec["quick"])), repeat=1, min_time=0)
+            self.assertGreater(result["best_s"], 0, name)
+
+    def test_compare_flags_regressions(self):
+        old = {("a", 1): {"best_s": 1.0}, ("b", 1): {"best_s": 1.0}}
+        new = {("a", 1): {"best_s": 1.5}, ("b", 1): {"best_s": 1.0}}
+        rows = compare(old, new, threshold=1.1)
+        self.assertEqual([r["regression"] for r in rows], [True, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import threading
+import unittest
+from coach import CoachService, FakeModel, FairLimiter, normalize_context, heuristic_tips
+from coach_rules import RuleEngine
+
+
+class CoachTests(unittest.TestCase):
+    def test_normalized_cache(self):
+        model = FakeModel(reply="Cycle your spells faster.")
+        service = CoachService(model=model)
+        tokens = list(service.stream({"win_rate": 0.512, "tilt": False}))
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual("".join(tokens), "Cycle your spells faster.")
+        self.assertEqual(service.ask({"tilt": False, "win_rate": 0.498}), "Cycle your spells faster.")
+        self.assertEqual(model.calls, 1)
+        stats = service.stats()
+        self.assertEqual(stats["cache_hit_rate"], 0.5)
+        self.assertGreaterEqual(stats["avg_ttft"], 0)
+
+    def test_concurrent_identical_requests_share_one_call(self):
+        model = FakeModel(reply="a b c", delay=0.02)
+        service = CoachService(model=model, max_concurrency=2)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(service.ask({"win_rate": 0.3}))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, ["a b c"] * 4)
+        self.assertEqual(model.calls, 1)
+
+    def test_limiter_timeout(self):
+        limiter = FairLimiter(max_concurrency=1)
+        limiter.acquire()
+        with self.assertRaises(TimeoutError):
+            limiter.acquire(timeout=0.01)
+        limiter.release()
+        limiter.acquire(timeout=0.01)
+
+    def test_heuristic_and_normalize(self):
+        self.assertIn("Tilt", heuristic_tips({"win_rate": 0.5, "tilt": True}))
+        self.assertEqual(normalize_context({"aggro": float("inf"), "x": None}), {"aggro": "inf"})
+
+    def test_rule_engine(self):
+        engine = RuleEngine()
+        tips = engine.evaluate({
+            "win_rate": 0.5,
+            "tilt": False,
+            "anti_air": False,
+            "spell": True,
+            "wincon": True,
+            "playstyle": "Cycle",
+            "detected_playstyle": "Siege",
+        })
+        self.assertEqual(len(tips), 2)
+        self.assertIn("anti-air", tips[0])
+        self.assertIn("Siege", tips[1])
+        self.assertEqual(engine.evaluate({"win_rate": 0.5, "tilt": False}), [])
+        self.assertEqual(engine.stats()["hit_rate"], 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
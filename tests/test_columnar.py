@@ -0,0 +1,110 @@
+import os
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from analysis import compute_win_rate, detect_tilt
+from battle_archive import parse_time, record_battles
+from benchmarks import datagen
+from columnar import Table, battles_view, export_battles, export_leaderboard, write_table
+from meta import quartile_benchmarks
+
+
+class ColumnarTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def test_columns_are_read_only_memmaps(self):
+        export_battles(datagen.battlelog(50), os.path.join(self.dir, "t"))
+        table = Table(os.path.join(self.dir, "t"))
+        self.assertEqual(len(table), 50)
+        col = table["team_cards"]
+        self.assertIsInstance(col, np.memmap)
+        self.assertEqual(col.shape, (50, 8))
+        self.assertFalse(col.flags.writeable)
+        names = table.cards.decode(col[0])
+        self.assertEqual(len(names), 8)
+
+    def test_analysis_matches_dict_path(self):
+        for seed in range(5):
+            log = datagen.battlelog(200, seed=seed)
+            table = export_battles(log, os.path.join(self.dir, str(seed)))
+            self.assertAlmostEqual(compute_win_rate(table), compute_win_rate(log))
+            for limit, minutes in ((1, 15), (2, 60), (3, 600)):
+                self.assertEqual(detect_tilt(table, limit, minutes), detect_tilt(log, limit, minutes))
+
+    def test_time_slice_is_zero_copy(self):
+        log = datagen.battlelog(100)
+        table = export_battles(log, os.path.join(self.dir, "t"))
+        times = sorted(parse_time(b["battleTime"]) for b in log)
+        part = table.time_slice(times[10], times[19])
+        self.assertEqual(len(part), 10)
+        self.assertTrue(np.shares_memory(part["time"], table["time"]))
+        newest = [b for b in log if parse_time(b["battleTime"]) >= times[10] and parse_time(b["battleTime"]) <= times[19]]
+        self.assertAlmostEqual(compute_win_rate(part), compute_win_rate(newest))
+
+    def test_quartiles_on_leaderboard_table(self):
+        players = datagen.leaderboard(1001)
+        table = export_leaderboard(players, os.path.join(self.dir, "lb"))
+        for p in players:
+            total = p["wins"] + p["losses"]
+            p["win_rate"] = p["wins"] / total if total else 0
+        expected = quartile_benchmarks(players, key="trophies")
+        got = quartile_benchmarks(table, key="trophies")
+        self.assertEqual([q["quartile"] for q in got], [q["quartile"] for q in expected])
+        for a, b in zip(got, expected):
+            self.assertAlmostEqual(a["avg_win_rate"], b["avg_win_rate"])
+
+    def test_battles_view_follows_archive(self):
+        archive, columns = os.path.join(self.dir, "a"), os.path.join(self.dir, "c")
+        log = datagen.battlelog(40)
+        self.assertIsNone(battles_view("ABC", archive, columns))
+        record_battles("ABC", log[20:], root=archive)
+        self.assertEqual(len(battles_view("ABC", archive, columns)), 20)
+        record_battles("ABC", log, root=archive)
+        os.utime(os.path.join(archive, "ABC.crba"), (1, 1))  # mtime granularity
+        self.assertEqual(len(battles_view("ABC", archive, columns)), 40)
+
+    def test_concurrent_exports_publish_whole_versions(self):
+        path = os.path.join(self.dir, "t")
+        write_table(path, {"x": np.zeros(10, dtype=np.int32)}, {"n": 0})
+        errors = []
+
+        def export(n):
+            try:
+                for i in range(5):
+                    size = 10 + n * 5 + i
+                    write_table(path, {"x": np.full(size, size, dtype=np.int32)}, {"n": size})
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+
+        threads = [threading.Thread(target=export, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        while any(t.is_alive() for t in threads):
+            table = Table(path)
+            x = table["x"]
+            n = table.attrs["n"]
+            self.assertEqual(len(x), n or 10)
+            self.assertTrue((x == n).all())
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len([e for e in os.listdir(path) if e.startswith("v")]), 2)
+        self.assertFalse([e for e in os.listdir(path) if e.startswith(".tmp")])
+
+    def test_reads_and_replaces_unversioned_tables(self):
+        path = os.path.join(self.dir, "old")
+        os.makedirs(path)
+        np.save(os.path.join(path, "x.npy"), np.arange(3))
+        with open(os.path.join(path, "table.json"), "w") as fh:
+            fh.write('{"rows": 3, "columns": ["x"]}')
+        self.assertEqual(list(Table(path)["x"]), [0, 1, 2])
+        self.assertEqual(len(write_table(path, {"x": np.arange(5)})), 5)
+        self.assertFalse(os.path.exists(os.path.join(path, "x.npy")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import crawler
+import scheduler
+from clash_api import iter_items
+
+
+def _board(location, n):
+    return [{"tag": f"#{location.upper()}{i}", "name": f"p{i}", "trophies": 9000 - i, "rank": i + 1} for i in range(n)]
+
+
+class FakeApi:
+    """Serves `boards` in cursor pages like the official API; can fail after a number of calls."""
+
+    def __init__(self, boards, fail_after=None):
+        self.boards = boards
+        self.fail_after = fail_after
+        self.calls = []
+
+    def __call__(self, url, headers=None, params=None, timeout=None):
+        if self.fail_after is not None and len(self.calls) >= self.fail_after:
+            raise ConnectionError("network down")
+        self.calls.append((url, dict(params)))
+        items = self.boards[url.rsplit("/locations/", 1)[1].split("/")[0]]
+        start = int(params.get("after") or 0)
+        end = start + params["limit"]
+        body = {"items": items[start:end], "paging": {"cursors": {}}}
+        if end < len(items):
+            body["paging"]["cursors"]["after"] = str(end)
+        resp = MagicMock()
+        resp.json.return_value = body
+        return resp
+
+
+class PaginationTests(unittest.TestCase):
+    def setUp(self):
+        env = patch.dict(os.environ, {"CLASH_ROYALE_TOKEN": "t", "CRTOOL_CLASH_RATE": "1000"})
+        env.start()
+        self.addCleanup(env.stop)
+        scheduler._schedulers.clear()
+
+    def test_iter_items_follows_cursors_and_limit(self):
+        api = FakeApi({"global": _board("g", 25)})
+        with patch("requests.get", api):
+            items = list(iter_items("http://x/locations/global/rankings/players", page_size=10))
+            self.assertEqual([p["rank"] for p in items], list(range(1, 26)))
+            self.assertEqual([c[1].get("after") for c in api.calls], [None, "10", "20"])
+            api.calls.clear()
+            self.assertEqual(len(list(iter_items("http://x/locations/global/x", limit=12, page_size=10))), 12)
+            self.assertEqual(len(api.calls), 2)
+
+    def test_top_players_still_returns_a_list(self):
+        import meta
+
+        api = FakeApi({"global": _board("g", 5)})
+        with patch.dict(os.environ, {"ROYALEAPI_TOKEN": "t"}), patch("requests.get", api):
+            with patch.object(meta, "ROYALE_API_BASE", "http://r/locations/global"):
+                self.assertEqual(len(meta.get_top_players(limit=3)), 3)
+        self.assertEqual(api.calls[0][1]["limit"], 3)
+
+    def test_cursorless_endpoint_gets_the_whole_limit(self):
+        import meta
+        import merge_stats
+
+        calls = []
+
+        def api(url, headers=None, params=None, timeout=None):
+            calls.append(dict(params))
+            resp = MagicMock()
+            resp.json.return_value = {"items": [{"rank": i} for i in range(params["limit"])]}
+            return resp
+
+        with patch.dict(os.environ, {"ROYALEAPI_TOKEN": "t", "CRTOOL_ROYALEAPI_RATE": "1000"}), patch("requests.get", api):
+            self.assertEqual(len(meta.get_top_players(limit=1000)), 1000)
+            self.assertEqual(len(merge_stats.get_merge_leaderboard(limit=250)), 250)
+        self.assertEqual(calls, [{"limit": 1000}, {"limit": 250}])
+
+
+class CrawlerTests(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "crawl.db")
+        self.env = patch.dict(os.environ, {"CLASH_ROYALE_TOKEN": "t", "CRTOOL_CLASH_RATE": "1000"})
+        self.env.start()
+        self.addCleanup(self.env.stop)
+        scheduler._schedulers.clear()
+        # the same player is ranked in both locations
+        self.boards = {"global": _board("g", 23), "57000001": _board("g", 3) + _board("x", 7)}
+        self.locations = [{"id": "global", "name": "Global"}, {"id": 57000001, "name": "Europe"}]
+
+    def test_crawl_dedupes_players(self):
+        with patch("requests.get", FakeApi(self.boards)):
+            result = crawler.crawl(self.path, self.locations, page_size=10)
+        self.assertEqual(result["pages"], 3 + 1)
+        self.assertEqual((result["locations"], result["done"], result["players"]), (2, 2, 23 + 7))
+        top = crawler.top_players(1, path=self.path)[0]
+        self.assertEqual((top["tag"], top["rank"], top["location"]), ("G0", 1, "global"))
+
+    def test_resume_after_interruption(self):
+        with patch("requests.get", FakeApi(self.boards, fail_after=2)):
+            with self.assertRaises(ConnectionError):
+                crawler.crawl(self.path, self.locations, page_size=10)
+        self.assertEqual(crawler.progress(self.path)["players"], 20)
+        api = FakeApi(self.boards)
+        with patch("requests.get", api):
+            result = crawler.crawl(self.path, page_size=10)
+        # restarts at the saved cursor instead of the first page
+        self.assertEqual(api.calls[0][1].get("after"), "20")
+        self.assertEqual((result["done"], result["players"]), (2, 30))
+        with patch("requests.get", FakeApi(self.boards)):
+            self.assertEqual(crawler.crawl(self.path)["pages"], 0)
+        crawler.reset(self.path)
+        self.assertEqual(crawler.progress(self.path)["done"], 0)
+
+    def test_failed_location_listing_is_retried(self):
+        def locations():
+            yield {"id": 57000001, "name": "Europe"}
+            raise ConnectionError("listing failed")
+
+        with patch("crawler.iter_locations", locations), patch("requests.get", FakeApi(self.boards)):
+            with self.assertRaises(ConnectionError):
+                crawler.crawl(self.path, page_size=10)
+        self.assertEqual(crawler.progress(self.path)["locations"], 0)
+        with patch("crawler.iter_locations", lambda: iter(self.locations[1:])), patch("requests.get", FakeApi(self.boards)):
+            result = crawler.crawl(self.path, page_size=10)
+        self.assertEqual((result["locations"], result["done"]), (2, 2))
+
+    def test_failed_write_releases_the_database(self):
+        def locations():
+            yield self.locations[0]
+            raise ValueError("bad row")
+
+        with self.assertRaises(ValueError):
+            crawler.add_locations(locations(), self.path)
+        # a second writer in this process is not blocked by a leftover transaction
+        self.assertEqual(crawler.add_locations(self.locations, self.path), 2)
+
+    def test_max_pages(self):
+        with patch("requests.get", FakeApi(self.boards)):
+            self.assertEqual(crawler.crawl(self.path, self.locations, page_size=10, max_pages=2)["pages"], 2)
+            self.assertEqual(crawler.crawl(self.path, page_size=10)["pages"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+from analysis import classify_playstyle, compute_deck_rating
+from benchmarks import datagen
+from card_index import CardIndex
+from columnar import NO_CARD, export_battles
+from deck_batch import (
+    PLAYSTYLES,
+    deck_rating,
+    encode_decks,
+    playstyle_labels,
+    rank_decks,
+    rate_decks,
+    unique_decks,
+)
+
+
+class DeckBatchTests(unittest.TestCase):
+    def setUp(self):
+        self.card_data = datagen.card_pool()
+        rng = random.Random(0)
+        names = [c["name"] for c in self.card_data] + ["Bomb Building", "Unknown Card"]
+        self.decks = [rng.sample(names, 8) for _ in range(2000)] + [["Knight", "Zap"], []]
+        self.cards = CardIndex()
+        self.ids = encode_decks(self.decks, self.cards)
+        self.ratings = rate_decks(self.ids, self.card_data, self.cards)
+
+    def test_encode_pads_short_decks(self):
+        self.assertEqual(self.ids.shape, (len(self.decks), 8))
+        self.assertEqual(self.cards.decode(self.ids[-2, :2]), ["Knight", "Zap"])
+        self.assertTrue((self.ids[-2, 2:] == NO_CARD).all() and (self.ids[-1] == NO_CARD).all())
+
+    def test_matches_single_deck_functions(self):
+        labels = playstyle_labels(self.ratings)
+        for i, deck in enumerate(self.decks):
+            single = compute_deck_rating(deck, self.card_data)
+            self.assertAlmostEqual(self.ratings["score"][i], single["score"])
+            self.assertAlmostEqual(self.ratings["average_elixir"][i], single["average_elixir"])
+            self.assertEqual(labels[i], classify_playstyle(deck, self.card_data))
+            self.assertEqual(deck_rating(self.ratings, i)["tips"], single["tips"])
+        self.assertEqual(set(labels), set(PLAYSTYLES))
+
+    def test_role_counts(self):
+        ids = encode_decks([["Hog Rider", "Fireball", "Zap", "Musketeer", "Bats"]], self.cards)
+        r = deck_rating(rate_decks(ids, self.card_data, self.cards), 0)
+        self.assertEqual(r["roles"], {"anti_air": 2, "spell": 2, "wincon": 1, "building": 0})
+
+    def test_rank_and_filter(self):
+        top = rank_decks(self.ratings, limit=5)
+        scores = self.ratings["score"][top]
+        self.assertEqual(len(top), 5)
+        self.assertTrue((np.diff(scores) <= 0).all())
+        self.assertEqual(scores[0], self.ratings["score"].max())
+        siege = rank_decks(self.ratings, playstyle="Siege", limit=1000)
+        self.assertTrue((self.ratings["playstyle"][siege] == PLAYSTYLES.index("Siege")).all())
+        self.assertEqual(len(rank_decks(self.ratings, limit=10**6)), len(self.decks))
+
+    def test_columnar_table_and_unique_decks(self):
+        log = datagen.battlelog(50)
+        table = export_battles(log + log[:10], os.path.join(tempfile.mkdtemp(), "t"))
+        ratings = rate_decks(table["team_cards"], self.card_data, table.cards)
+        self.assertEqual(len(ratings["score"]), 60)
+        decks, counts = unique_decks(table["team_cards"])
+        self.assertEqual(len(decks), 50)
+        self.assertEqual(counts.sum(), 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
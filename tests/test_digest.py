@@ -1,7 +1,25 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
+from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
+
+import auth
 import digest
 
+
+def _battle(minutes_ago, won):
+    t = datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)
+    return {
+        "type": "PvP",
+        "battleTime": t.strftime("%Y%m%dT%H%M%S.000Z"),
+        "team": [{"tag": "#ME", "crowns": int(won), "cards": [{"name": "Knight"}]}],
+        "opponent": [{"tag": "#OPP", "crowns": int(not won), "cards": [{"name": "Golem"}]}],
+    }
+
 class DigestTests(unittest.TestCase):
     @patch('digest.get_battlelog')
     @patch('digest.get_player')
@@ -25,6 +43,101 @@ class DigestTests(unittest.TestCase):
     def test_has_lucky_drop(self):
         log = [{"chest": "Lucky Drop"}]
         self.assertTrue(digest.has_lucky_drop(log))
+        from records import parse_battlelog
+
+        for log in ([{"type": "PvP", "rewards": [{"chest": "Lucky Drop"}]}], [{"type": "PvP", "gameMode": {"name": "Ladder"}}]):
+            self.assertEqual(digest.has_lucky_drop(log), digest.has_lucky_drop(parse_battlelog(log)))
+        self.assertTrue(digest.has_lucky_drop(parse_battlelog([{"eventMode": {"name": "Lucky Drop Challenge"}}])))
+
+
+class BatchDigestTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "digests.db")
+        self.archive = os.path.join(self.dir, "archive")
+        self.users = os.path.join(self.dir, "users.db")
+        auth.init_db(self.users)
+        conn = sqlite3.connect(self.users)
+        conn.executemany(
+            "INSERT INTO users (email, player_tag, mute_toast) VALUES (?,?,?)",
+            [("a@x", "#aaa", 0), ("b@x", "BBB", 0), ("c@x", "#AAA", 0), ("d@x", "MUTED", 1), ("e@x", "", 0)],
+        )
+        conn.commit()
+        conn.close()
+        self.calls = []
+        self.lock = threading.Lock()
+        self.logs = {"AAA": [_battle(10, True), _battle(20, False)], "BBB": [_battle(5, True)]}
+
+    def player(self, tag):
+        with self.lock:
+            self.calls.append(tag)
+        if tag == "BBB" and "fail" in self.logs:
+            raise ConnectionError("down")
+        return {"tag": f"#{tag}", "trophies": 6000 + len(self.calls)}
+
+    def battlelog(self, tag):
+        return self.logs[tag]
+
+    def generate(self, tags=None):
+        return digest.generate_digests(tags, self.player, self.battlelog, users_path=self.users,
+                                       archive_root=self.archive, path=self.path)
+
+    def test_generates_for_registered_users(self):
+        self.assertEqual(digest.digest_tags(self.users), ["AAA", "BBB"])
+        digests = self.generate()
+        self.assertEqual(sorted(self.calls), ["AAA", "BBB"])
+        self.assertAlmostEqual(digests["AAA"]["win_rate"], 0.5)
+        self.assertEqual(digests["AAA"]["delta_trophies"], 0)
+        self.assertEqual(digest.get_digest("#aaa", path=self.path), digests["AAA"])
+        self.assertIsNone(digest.get_digest("MUTED", path=self.path))
+
+    def test_deltas_and_archived_battles(self):
+        yesterday = (datetime.now(timezone.utc) - timedelta(days=1)).date().isoformat()
+        digest.init_db(self.path)
+        conn = sqlite3.connect(self.path)
+        conn.execute("INSERT INTO digests (tag, date, trophies, league_rank) VALUES ('AAA', ?, 5900, 0)", (yesterday,))
+        conn.commit()
+        conn.close()
+        self.generate(["AAA"])
+        # the next battlelog no longer holds the loss; the archive still does
+        self.logs["AAA"] = [_battle(1, True), _battle(10, True)]
+        again = self.generate(["AAA"])["AAA"]
+        self.assertEqual(again["delta_trophies"], 6002 - 5900)
+        self.assertAlmostEqual(again["win_rate"], 2 / 3)
+
+    def test_max_age_skips_fresh_digests(self):
+        self.generate(["AAA"])
+        self.calls.clear()
+        again = digest.generate_digests(None, self.player, self.battlelog, users_path=self.users,
+                                        archive_root=self.archive, path=self.path, max_age=3600)
+        self.assertEqual(list(again), ["BBB"])
+        self.assertEqual(self.calls, ["BBB"])
+        with patch("digest.time.time", return_value=time.time() + 7200):
+            digest.generate_digests(["AAA"], self.player, self.battlelog, users_path=self.users,
+                                    archive_root=self.archive, path=self.path, max_age=3600)
+        self.assertEqual(self.calls, ["BBB", "AAA"])
+
+    def test_failed_fetch_is_left_out(self):
+        self.logs["fail"] = []
+        with self.assertLogs("digest", "WARNING") as logs:
+            self.assertEqual(list(self.generate(["AAA", "BBB"])), ["AAA"])
+        self.assertIn("fetching BBB failed", logs.output[0])
+
+    def test_archive_failure_is_logged(self):
+        with patch("digest.record_battles", side_effect=OSError("disk full")), self.assertLogs("digest") as logs:
+            digests = self.generate(["AAA"])
+        self.assertAlmostEqual(digests["AAA"]["win_rate"], 0.5)
+        self.assertIn("battle archive of AAA not updated", logs.output[0])
+
+    def test_user_digest_prefers_stored_row(self):
+        stored = self.generate(["AAA"])["AAA"]
+        fetch = patch("digest.generate_digests", side_effect=AssertionError("recomputed"))
+        with fetch:
+            self.assertEqual(digest.user_digest("AAA", {}, [], path=self.path), stored)
+        fresh = digest.user_digest("BBB", {"trophies": 7000}, self.logs["BBB"], path=self.path,
+                                   archive_root=self.archive)
+        self.assertEqual((fresh["trophies"], fresh["win_rate"]), (7000, 1.0))
+
 
 if __name__ == '__main__':
     unittest.main()
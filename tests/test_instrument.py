@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+import instrument
+from instrument import count, instrumented, observe, request_scope, timed
+
+
+class InstrumentTests(unittest.TestCase):
+    def setUp(self):
+        instrument.reset()
+        instrument.enable()
+
+    def tearDown(self):
+        instrument.enable(False)
+        instrument.reset()
+
+    def test_disabled_records_nothing(self):
+        instrument.enable(False)
+
+        @instrumented("test")
+        def f(x):
+            return x + 1
+
+        self.assertEqual(f(1), 2)
+        count("c")
+        observe("h", 0.1)
+        self.assertEqual(instrument.snapshot(), {"counters": [], "histograms": []})
+
+    def test_decorator_records_calls_and_errors(self):
+        @instrumented("test")
+        def boom():
+            raise ValueError("x")
+
+        with self.assertRaises(ValueError):
+            boom()
+        counters = {(c["name"], c["labels"]["fn"]): c["value"] for c in instrument.snapshot()["counters"]}
+        self.assertEqual(counters[("crtool_calls_total", "boom")], 1)
+        self.assertEqual(counters[("crtool_call_errors_total", "boom")], 1)
+
+    def test_request_scope_collects_timings(self):
+        with request_scope() as timings:
+            with timed("coach", "model"):
+                pass
+            with timed("coach", "model"):
+                pass
+        with timed("coach", "model"):
+            pass
+        self.assertEqual(len(timings), 2)
+        rows = instrument.summarize(timings)
+        self.assertEqual(rows[0]["name"], "coach.model")
+        self.assertEqual(rows[0]["calls"], 2)
+
+    def test_prometheus_exposition(self):
+        count("crtool_cache_requests_total", cache="video", result="hit")
+        observe("crtool_api_request_seconds", 0.003, api="clash")
+        observe("crtool_api_request_seconds", 20, api="clash")
+        text = instrument.render_prometheus()
+        self.assertIn("# TYPE crtool_cache_requests_total counter", text)
+        self.assertIn('crtool_cache_requests_total{cache="video",result="hit"} 1', text)
+        self.assertIn('crtool_api_request_seconds_bucket{api="clash",le="0.005"} 1', text)
+        self.assertIn('crtool_api_request_seconds_bucket{api="clash",le="+Inf"} 2', text)
+        self.assertIn('crtool_api_request_seconds_count{api="clash"} 2', text)
+        path = os.path.join(tempfile.mkdtemp(), "metrics.prom")
+        instrument.write_prometheus(path)
+        with open(path) as fh:
+            self.assertEqual(fh.read(), text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import jobqueue
+import worker
+
+
+class JobQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+
+    def test_idempotency_key(self):
+        a = jobqueue.enqueue("optimize", {"cards": ["A"]}, key="k", path=self.path)
+        b = jobqueue.enqueue("optimize", {"cards": ["B"]}, key="k", path=self.path)
+        self.assertEqual(a, b)
+        self.assertEqual(jobqueue.get_job(a, path=self.path)["payload"], {"cards": ["A"]})
+        self.assertNotEqual(jobqueue.enqueue("optimize", path=self.path), a)
+        self.assertEqual(jobqueue.counts(path=self.path), {jobqueue.QUEUED: 2})
+
+    def test_priority_and_kinds(self):
+        low = jobqueue.enqueue("crawl", path=self.path)
+        high = jobqueue.enqueue("optimize", priority=5, path=self.path)
+        self.assertEqual(jobqueue.claim("w", kinds=["crawl"], path=self.path)["id"], low)
+        self.assertEqual(jobqueue.claim("w", path=self.path)["id"], high)
+        self.assertIsNone(jobqueue.claim("w", path=self.path))
+
+    def test_lease_expiry_redelivers(self):
+        job_id = jobqueue.enqueue("crawl", max_attempts=2, path=self.path)
+        now = time.time()
+        job = jobqueue.claim("w1", lease=10, now=now, path=self.path)
+        self.assertEqual((job["attempts"], job["lease_owner"]), (1, "w1"))
+        # invisible to other workers while leased
+        self.assertIsNone(jobqueue.claim("w2", now=now + 5, path=self.path))
+        again = jobqueue.claim("w2", now=now + 11, path=self.path)
+        self.assertEqual((again["id"], again["attempts"]), (job_id, 2))
+        # the first worker lost its lease and cannot overwrite the result
+        self.assertFalse(jobqueue.complete(job_id, "w1", {"x": 1}, path=self.path))
+        self.assertTrue(jobqueue.complete(job_id, "w2", {"x": 2}, path=self.path))
+        done = jobqueue.get_job(job_id, path=self.path)
+        self.assertEqual((done["status"], done["result"]), (jobqueue.DONE, {"x": 2}))
+
+    def test_expired_on_last_attempt_fails(self):
+        job_id = jobqueue.enqueue("crawl", max_attempts=1, path=self.path)
+        now = time.time()
+        jobqueue.claim("w1", lease=10, now=now, path=self.path)
+        self.assertIsNone(jobqueue.claim("w2", now=now + 11, path=self.path))
+        self.assertEqual(jobqueue.get_job(job_id, path=self.path)["status"], jobqueue.FAILED)
+
+    def test_retry_with_backoff_then_fail(self):
+        job_id = jobqueue.enqueue("crawl", key="c", max_attempts=2, path=self.path)
+        jobqueue.claim("w", path=self.path)
+        self.assertTrue(jobqueue.fail(job_id, "w", "boom", backoff=60, path=self.path))
+        job = jobqueue.get_job(job_id, path=self.path)
+        self.assertEqual(job["status"], jobqueue.QUEUED)
+        self.assertIsNone(jobqueue.claim("w", path=self.path))
+        self.assertIsNotNone(jobqueue.claim("w", now=job["run_at"] + 1, path=self.path))
+        jobqueue.fail(job_id, "w", "boom again", path=self.path)
+        job = jobqueue.get_job(job_id, path=self.path)
+        self.assertEqual((job["status"], job["error"]), (jobqueue.FAILED, "boom again"))
+        # enqueueing the same key again gives a failed job a fresh start
+        self.assertEqual(jobqueue.purge(older_than=3600, path=self.path), 0)
+        self.assertEqual(jobqueue.enqueue("crawl", key="c", path=self.path), job_id)
+        job = jobqueue.get_job(job_id, path=self.path)
+        self.assertEqual((job["status"], job["attempts"], job["error"]), (jobqueue.QUEUED, 0, None))
+
+    def test_concurrent_workers_claim_each_job_once(self):
+        ids = [jobqueue.enqueue("crawl", {"i": i}, path=self.path) for i in range(60)]
+        claimed = []
+        lock = threading.Lock()
+
+        def run(name):
+            while True:
+                job = jobqueue.claim(name, path=self.path)
+                if job is None:
+                    return
+                with lock:
+                    claimed.append(job["id"])
+                jobqueue.complete(job["id"], name, path=self.path)
+
+        threads = [threading.Thread(target=run, args=(f"w{i}",)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sorted(claimed), ids)
+        self.assertEqual(jobqueue.counts(path=self.path), {jobqueue.DONE: 60})
+
+    def test_active_workers(self):
+        jobqueue.register_worker("a", ["crawl"], path=self.path)
+        jobqueue.register_worker("b", None, path=self.path)
+        self.assertEqual(sorted(jobqueue.active_workers(path=self.path)), ["a", "b"])
+        self.assertEqual(jobqueue.active_workers("optimize", path=self.path), ["b"])
+
+
+class WorkerTests(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+
+    def test_runs_handlers_and_records_failures(self):
+        def flaky(payload):
+            raise ValueError("bad payload")
+
+        with patch.dict(worker.HANDLERS, {"echo": lambda p: {"echo": p["x"]}, "flaky": flaky}):
+            ok = jobqueue.enqueue("echo", {"x": 3}, path=self.path)
+            bad = jobqueue.enqueue("flaky", max_attempts=1, path=self.path)
+            unknown = jobqueue.enqueue("nope", max_attempts=1, path=self.path)
+            while worker.work_once("w", path=self.path):
+                pass
+        self.assertEqual(jobqueue.get_job(ok, path=self.path)["result"], {"echo": 3})
+        self.assertIn("ValueError: bad payload", jobqueue.get_job(bad, path=self.path)["error"])
+        self.assertEqual(jobqueue.get_job(unknown, path=self.path)["status"], jobqueue.FAILED)
+
+    def test_long_job_keeps_its_lease(self):
+        def slow(payload):
+            time.sleep(0.3)
+            return {}
+
+        with patch.dict(worker.HANDLERS, {"slow": slow}):
+            job_id = jobqueue.enqueue("slow", path=self.path)
+            job = jobqueue.claim("w", lease=0.15, path=self.path)
+            thief = []
+            t = threading.Thread(target=lambda: (time.sleep(0.2), thief.append(jobqueue.claim("x", path=self.path))))
+            t.start()
+            self.assertTrue(worker.run_job(job, "w", lease=0.15, path=self.path))
+            t.join()
+        self.assertEqual(thief, [None])
+        self.assertEqual(jobqueue.get_job(job_id, path=self.path)["status"], jobqueue.DONE)
+
+    def test_run_inline_optimize(self):
+        cards = [{"name": f"C{i}", "elixirCost": 1 + i % 5} for i in range(20)]
+        job_id = jobqueue.enqueue(
+            "optimize", {"cards": ["C1", "C2"], "card_data": cards, "generations": 1}, path=self.path
+        )
+        job = worker.run_inline(job_id, path=self.path)
+        self.assertEqual(job["status"], jobqueue.DONE)
+        self.assertTrue(job["result"]["suggestions"])
+
+    def test_schedule_enqueues_periodic_jobs_and_purges(self):
+        old = jobqueue.enqueue("crawl", key="old", path=self.path)
+        jobqueue.claim("w", path=self.path)
+        jobqueue.complete(old, "w", {}, path=self.path)
+        conn = jobqueue._connect(self.path)
+        conn.execute("UPDATE jobs SET updated=? WHERE id=?", (time.time() - worker.JOB_RETENTION - 1, old))
+        conn.close()
+        with patch("worker.work_once", return_value=False), patch("worker.time.sleep", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                worker.run_forever(schedule=True, path=self.path)
+        self.assertIsNone(jobqueue.get_job(old, path=self.path))
+        kinds = {j["kind"] for j in jobqueue.list_jobs(status=jobqueue.QUEUED, path=self.path)}
+        self.assertEqual(kinds, {"watchlist_poll", "digests", "video_index"})
+
+    def test_video_index_job(self):
+        with patch("video_index.crawl_once", return_value=3) as crawl:
+            job_id = jobqueue.enqueue("video_index", {"channels": ["UC1"]}, path=self.path)
+            self.assertTrue(worker.work_once("w", path=self.path))
+        crawl.assert_called_once_with(["UC1"])
+        self.assertEqual(jobqueue.get_job(job_id, path=self.path)["result"], {"added": 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import random
+import tempfile
+import unittest
+
+import watchlist
+from benchmarks import datagen
+from deck_optimizer import smart_swap
+from matchups import ARCHETYPE, MatchupMatrix, archetype, meta_fitness
+from records import parse_battlelog
+
+HOG = ["Hog Rider", "Musketeer", "Ice Spirit", "Skeletons", "Cannon", "Fireball", "Log", "Ice Golem"]
+GOLEM = ["Golem", "Baby Dragon", "Lumberjack", "Night Witch", "Tornado", "Lightning", "Zap", "Mega Minion"]
+
+
+def _battle(time, team, opp, crowns=(1, 0), tags=("#A", "#B")):
+    return {
+        "type": "PvP",
+        "battleTime": time,
+        "team": [{"tag": tags[0], "crowns": crowns[0], "cards": [{"name": c} for c in team]}],
+        "opponent": [{"tag": tags[1], "crowns": crowns[1], "cards": [{"name": c} for c in opp]}],
+    }
+
+
+class MatchupMatrixTests(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "matchups.db")
+        self.matrix = MatchupMatrix(self.path)
+
+    def test_archetype(self):
+        self.assertEqual(archetype(HOG), "hog rider")
+        self.assertEqual(archetype(GOLEM + ["Miner"]), "golem+miner")
+        self.assertEqual(archetype(["Knight", "Archers"]), "bait")
+
+    def test_counts_both_perspectives(self):
+        self.matrix.add_battles([_battle("20240716T120000.000Z", HOG, GOLEM)])
+        self.assertEqual(self.matrix.archetype_matchup("hog rider", "golem"), (2 / 3, 1))
+        self.assertEqual(self.matrix.archetype_matchup("Golem", "Hog Rider"), (1 / 3, 1))
+        self.assertEqual(self.matrix.card_matchup("Cannon", "Lightning"), (2 / 3, 1))
+        self.assertEqual(self.matrix.card_matchup("Cannon", "Knight"), (0.5, 0))
+        self.assertEqual(self.matrix.meta_share(), {"hog rider": 0.5, "golem": 0.5})
+
+    def test_draws_count_half(self):
+        self.matrix.add_battles([_battle("20240716T120000.000Z", HOG, GOLEM, crowns=(1, 1))])
+        self.assertEqual(self.matrix.pairs[ARCHETYPE]["hog rider"]["golem"], [0.5, 1])
+
+    def test_same_battle_counted_once(self):
+        battle = _battle("20240716T120000.000Z", HOG, GOLEM)
+        mirrored = _battle("20240716T120000.000Z", GOLEM, HOG, crowns=(0, 1), tags=("#B", "#A"))
+        self.assertEqual(self.matrix.add_battles([battle]), 1)
+        self.assertEqual(self.matrix.add_battles([battle, mirrored]), 0)
+        self.assertEqual(len(self.matrix), 1)
+
+    def test_records_and_persistence(self):
+        log = datagen.battlelog(50)
+        self.assertEqual(self.matrix.add_battles(parse_battlelog(log[:30])), 30)
+        self.matrix.add_battles(log[30:])
+        reloaded = MatchupMatrix(self.path)
+        self.assertEqual(len(reloaded), 50)
+        self.assertEqual(reloaded.pairs, self.matrix.pairs)
+        deck = datagen.deck(random.Random(1))
+        self.assertAlmostEqual(reloaded.expected_win_rate(deck), self.matrix.expected_win_rate(deck))
+
+    def test_sync_picks_up_other_writers(self):
+        other = MatchupMatrix(self.path)
+        other.add_battles([_battle("20240716T120000.000Z", HOG, GOLEM)])
+        self.assertEqual(len(self.matrix), 0)
+        self.assertTrue(self.matrix.sync())
+        self.assertEqual(len(self.matrix), 1)
+        self.assertFalse(self.matrix.sync())
+
+    def test_expected_win_rate_tracks_results(self):
+        battles = [
+            _battle(f"20240716T12{i:02d}00.000Z", HOG, GOLEM, tags=(f"#A{i}", "#B")) for i in range(20)
+        ]
+        self.matrix.add_battles(battles)
+        self.assertGreater(self.matrix.expected_win_rate(HOG), 0.7)
+        self.assertLess(self.matrix.expected_win_rate(GOLEM), 0.3)
+        self.assertEqual(self.matrix.expected_win_rate(["Knight"] * 8), 0.5)
+        # scores are memoized and refreshed by the next update
+        before = self.matrix.card_score("Hog Rider")
+        self.matrix.add_battles([_battle("20240716T140000.000Z", GOLEM, HOG, tags=("#C", "#D"))])
+        self.assertLess(self.matrix.card_score("Hog Rider"), before)
+
+    def test_meta_fitness_drives_smart_swap(self):
+        self.matrix.add_battles(
+            [_battle(f"20240716T12{i:02d}00.000Z", HOG, GOLEM, tags=(f"#A{i}", "#B")) for i in range(20)]
+        )
+        random.seed(0)
+        start = GOLEM[:7] + ["Knight"]
+        best = smart_swap(start, HOG + GOLEM, meta_fitness(self.matrix), generations=5)
+        self.assertGreater(best[0]["score"], meta_fitness(self.matrix)(start))
+
+    def test_watchlist_feeds_matrix(self):
+        path = os.path.join(tempfile.mkdtemp(), "watch.db")
+        watchlist.watch(watchlist.PLAYER, "#A", path=path)
+        log = [_battle("20240716T120000.000Z", HOG, GOLEM)]
+        watchlist.poll_due(now=0, path=path, fetch_battlelog=lambda tag: log, matrix=self.matrix)
+        self.assertEqual(len(self.matrix), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
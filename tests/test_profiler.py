@@ -0,0 +1,67 @@
+import os
+import tempfile
+import time
+import unittest
+
+from profiler import SamplingProfiler, new_job_id, profile_job, profile_path
+
+
+def busy_leaf(seconds):
+    end = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < end:
+        n += 1
+    return n
+
+
+def busy_job():
+    return busy_leaf(0.2)
+
+
+class ProfilerTests(unittest.TestCase):
+    def test_job_ids_are_unique_on_one_thread(self):
+        ids = {new_job_id("optimize") for _ in range(100)}
+        self.assertEqual(len(ids), 100)
+
+    def test_disabled_yields_none(self):
+        out = tempfile.mkdtemp()
+        with profile_job("job", enabled=False, out_dir=out) as prof:
+            busy_leaf(0.01)
+        self.assertIsNone(prof)
+        self.assertEqual(os.listdir(out), [])
+
+    def test_writes_collapsed_stacks_per_job(self):
+        out = tempfile.mkdtemp()
+        with profile_job("swap/1", enabled=True, interval=0.001, out_dir=out) as prof:
+            busy_job()
+        self.assertEqual(prof.path, profile_path("swap/1", out))
+        self.assertTrue(prof.path.endswith("swap_1.folded"))
+        with open(prof.path) as fh:
+            lines = fh.read().splitlines()
+        self.assertTrue(lines)
+        stack, _, count = lines[0].rpartition(" ")
+        self.assertGreater(int(count), 0)
+        self.assertTrue(any("busy_job" in l and "busy_leaf" in l for l in lines))
+        # root-first: the caller precedes the callee
+        hot = next(l for l in lines if "busy_leaf" in l)
+        self.assertLess(hot.index("busy_job"), hot.index("busy_leaf"))
+        self.assertTrue(prof.top_frames(1)[0][0].startswith("busy_leaf"))
+
+    def test_profile_written_when_job_fails(self):
+        out = tempfile.mkdtemp()
+        with self.assertRaises(ValueError):
+            with profile_job("fails", enabled=True, interval=0.001, out_dir=out):
+                busy_leaf(0.02)
+                raise ValueError("boom")
+        self.assertTrue(os.path.exists(os.path.join(out, "fails.folded")))
+
+    def test_sampler_skips_its_own_thread(self):
+        prof = SamplingProfiler(interval=0.001, all_threads=True).start()
+        busy_leaf(0.05)
+        prof.stop()
+        self.assertTrue(prof.stacks)
+        self.assertFalse(any("_run (profiler.py" in s for s in prof.stacks))
+
+
+if __name__ == "__main__":
+    unittest.main()
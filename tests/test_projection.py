@@ -0,0 +1,64 @@
+import os
+import tempfile
+import time
+import unittest
+
+from benchmarks import datagen
+from columnar import export_battles
+from projection import ladder_stats, project_goals, simulate
+from records import parse_battlelog
+
+
+def _stats(wins, losses, gain=30, drop=30):
+    return {"wins": wins, "losses": losses, "gains": [gain], "drops": [drop], "battles_per_day": 10.0}
+
+
+class LadderStatsTests(unittest.TestCase):
+    def test_dicts_records_and_columns_agree(self):
+        log = datagen.battlelog(200)
+        stats = ladder_stats(log)
+        self.assertEqual(ladder_stats(parse_battlelog(log)), stats)
+        table = export_battles(log, os.path.join(tempfile.mkdtemp(), "t"))
+        columnar = ladder_stats(table)
+        self.assertEqual((columnar["wins"], columnar["losses"]), (stats["wins"], stats["losses"]))
+        self.assertEqual(sorted(columnar["gains"]), sorted(stats["gains"]))
+        self.assertTrue(all(g > 0 for g in stats["gains"]) and all(d > 0 for d in stats["drops"]))
+        self.assertGreater(stats["battles_per_day"], 1)
+
+    def test_empty(self):
+        self.assertEqual(ladder_stats([])["wins"], 0)
+
+
+class ProjectionTests(unittest.TestCase):
+    def test_always_winning_is_deterministic(self):
+        hit = simulate(5000, _stats(10**6, 0), [5300, 5000], paths=100, seed=0)
+        self.assertTrue((hit[0] == 10).all())
+        self.assertTrue((hit[1] == 0).all())
+
+    def test_floor_stops_the_slide(self):
+        # always losing from 5010: one drop to the 5000 gate, then stuck there
+        hit = simulate(5010, _stats(0, 10**6), [5010, 5100], paths=50, horizon=100, seed=0)
+        self.assertTrue((hit[0] == 0).all())
+        self.assertTrue((hit[1] == -1).all())
+
+    def test_goals_and_uncertainty(self):
+        goals = project_goals({"Near": 5300, "Far": 7500}, 5000, _stats(55, 45), paths=5000, seed=1)
+        near, far = goals
+        self.assertGreater(near["probability"], far["probability"])
+        self.assertLess(near["battles"]["p50"], far["battles"]["p50"])
+        self.assertLessEqual(far["battles"]["p10"], far["battles"]["p50"])
+        self.assertAlmostEqual(far["days"]["p50"], far["battles"]["p50"] / 10.0)
+        # a 40% win rate measured over few games still reaches the goal on some paths
+        few = project_goals({"Far": 6000}, 5000, _stats(4, 6), paths=5000, seed=1)[0]
+        many = project_goals({"Far": 6000}, 5000, _stats(400, 600), paths=5000, seed=1)[0]
+        self.assertGreater(few["probability"], many["probability"])
+        self.assertEqual(project_goals({}, 5000, _stats(1, 1)), [])
+
+    def test_default_size_is_fast(self):
+        start = time.perf_counter()
+        project_goals({"Champion": 7500, "Ultimate": 9000}, 5000, _stats(45, 55))
+        self.assertLess(time.perf_counter() - start, 2.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import digest
+import gc_coach
+from analysis import aggro_meter, analyze_cycle, collect_event_stats, compute_win_rate, daily_event_wr, detect_tilt, elixir_leak
+from benchmarks import datagen
+from player_watch import _deck_from_battle
+from records import DeckRef, parse_battle, parse_battlelog, parse_events, parse_player
+
+
+def recent_log(n, seed=0):
+    """datagen battles shifted so the newest one is a few minutes old."""
+    log = datagen.battlelog(n, seed=seed)
+    shift = datetime.now(timezone.utc) - datagen.START - timedelta(minutes=5)
+    for b in log:
+        ts = datetime.strptime(b["battleTime"], "%Y%m%dT%H%M%S.000Z").replace(tzinfo=timezone.utc) + shift
+        b["battleTime"] = ts.strftime("%Y%m%dT%H%M%S.000Z")
+    return log
+
+
+class RecordTests(unittest.TestCase):
+    def test_parse_battle_fields(self):
+        raw = datagen.battlelog(1)[0]
+        b = parse_battle(raw)
+        self.assertEqual(b.battle_time, raw["battleTime"])
+        self.assertEqual(b.team.crowns, raw["team"][0]["crowns"])
+        self.assertEqual(list(b.team.deck), [c["name"] for c in raw["team"][0]["cards"]])
+        self.assertEqual(b.won, raw["team"][0]["crowns"] > raw["opponent"][0]["crowns"])
+        empty = parse_battle({"type": "PvP", "battleTime": "bad"})
+        self.assertEqual((empty.time, empty.team.crowns, len(empty.team.deck)), (0, 0, 0))
+
+    def test_repeated_decks_are_shared(self):
+        raw = datagen.battlelog(2)
+        raw[1]["team"][0]["cards"] = [dict(c) for c in raw[0]["team"][0]["cards"]]
+        a, b = parse_battlelog(raw)
+        self.assertIs(a.team.deck, b.team.deck)
+        self.assertEqual(DeckRef(("Zap", "Log")).key, ("log", "zap"))
+
+    def test_analysis_matches_dict_results(self):
+        for seed in range(4):
+            log = recent_log(150, seed)
+            records = parse_battlelog(log)
+            self.assertEqual(compute_win_rate(records), compute_win_rate(log))
+            for limit, minutes in ((1, 15), (2, 120), (3, 600)):
+                self.assertEqual(detect_tilt(records, limit, minutes), detect_tilt(log, limit, minutes))
+            self.assertEqual(daily_event_wr(records, days=30), daily_event_wr(log, days=30))
+            path = os.path.join(tempfile.mkdtemp(), "events.json")
+            self.assertEqual(collect_event_stats(records, path=path), collect_event_stats(log, path=path))
+
+    def test_match_events(self):
+        plays = datagen.events(200)
+        events = parse_events(plays)
+        self.assertEqual(analyze_cycle(events), analyze_cycle(plays))
+        self.assertEqual(aggro_meter(events), aggro_meter(plays))
+        self.assertAlmostEqual(elixir_leak(events), elixir_leak(plays))
+
+    def test_digest_watch_and_gc_accept_records(self):
+        log = recent_log(30)
+        path = os.path.join(tempfile.mkdtemp(), "progress.json")
+        player = {"tag": "#A", "trophies": 6000, "leagueRank": 4}
+        from_dicts = digest.daily_digest_info("A", progress_path=path, player=player, battles=log)
+        from_records = digest.daily_digest_info("A", progress_path=path, player=parse_player(player), battles=parse_battlelog(log))
+        self.assertEqual(from_records, from_dicts)
+        self.assertEqual(_deck_from_battle(parse_battle(log[0])), _deck_from_battle(log[0]))
+
+        cwd = os.getcwd()
+        os.chdir(tempfile.mkdtemp())
+        try:
+            battle = parse_battle(log[0])
+            run_id = gc_coach.start_run(battle.team.deck)
+            gc_coach.record_battle(run_id, battle)
+            summary = gc_coach.summarize_run(run_id)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(summary["total"], 1)
+        self.assertEqual(summary["wins"], int(battle.won))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import requests
+
+import clash_api
+from replay import FixtureStore, offline_env, request_key, start_stand_in, synthesize
+
+
+class ReplayTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = FixtureStore(self.dir)
+        self.servers = []
+        self.env = patch.dict(os.environ, {"NO_PROXY": "127.0.0.1,localhost"})
+        self.env.start()
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.env.stop()
+
+    def start(self, store=None, **options):
+        server = start_stand_in(store or self.store, **options)
+        self.servers.append(server)
+        return server
+
+    def test_fixtures_are_gzipped_and_normalized(self):
+        path = self.store.add_json("clash", "/players/#ABC", {"name": "A"})
+        with gzip.open(path, "rt") as fh:
+            self.assertEqual(json.load(fh)["request"]["path"], "/players/#ABC")
+        reloaded = FixtureStore(self.dir)
+        self.assertIsNotNone(reloaded.find(request_key("GET", "clash", "/players/%23ABC")))
+        # any recording of the same path answers when the query differs
+        self.assertIsNotNone(reloaded.find(request_key("GET", "clash", "/players/%23ABC", "x=1")))
+        self.assertIsNone(reloaded.find(request_key("GET", "clash", "/players/%23XYZ")))
+
+    def test_modules_replay_through_stand_in(self):
+        tags = synthesize(self.store, players=2)
+        server = self.start()
+        env = offline_env(server.base_url)
+        with patch.object(clash_api, "API_BASE", env["CLASH_API_BASE"]), patch.dict(os.environ, env):
+            player = clash_api.get_player(tags[1])
+            battles = clash_api.get_battlelog(tags[1])
+            cards = clash_api.get_cards()
+        self.assertEqual(player["tag"], f"#{tags[1]}")
+        self.assertEqual(len(battles), 25)
+        self.assertTrue(cards)
+        self.assertEqual(server.stats["served"], 3)
+
+    def test_injected_errors_and_rate_limit(self):
+        self.store.add_json("clash", "/cards", {"items": []})
+        failing = self.start(error_rate=1.0)
+        self.assertEqual(requests.get(f"{failing.base_url}/clash/cards").status_code, 503)
+        throttled = self.start(rate_limit=1, burst=2)
+        codes = [requests.get(f"{throttled.base_url}/clash/cards").status_code for _ in range(4)]
+        self.assertEqual(codes[:2], [200, 200])
+        self.assertEqual(codes[2], 429)
+        self.assertEqual(throttled.stats["throttled"], 2)
+
+    def test_record_mode_proxies_and_stores(self):
+        upstream_store = FixtureStore(tempfile.mkdtemp())
+        upstream_store.add_json("royaleapi", "/player/top", {"items": [1, 2]}, query="limit=2")
+        upstream = self.start(upstream_store)
+        recorder = self.start(record=True, upstreams={"royaleapi": f"{upstream.base_url}/royaleapi"})
+        resp = requests.get(f"{recorder.base_url}/royaleapi/player/top?limit=2", headers={"Authorization": "Bearer t"})
+        self.assertEqual(resp.json(), {"items": [1, 2]})
+        self.assertEqual(recorder.stats["recorded"], 1)
+        replayed = FixtureStore(self.dir).find(request_key("GET", "royaleapi", "/player/top", "limit=2"))
+        self.assertEqual(json.loads(replayed["body"]), {"items": [1, 2]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import scheduler
+from scheduler import CLASH, CRAWL, INTERACTIVE, WATCHLIST, Scheduler, TokenBucket
+
+
+def _response(status, retry_after=None):
+    resp = MagicMock(status_code=status, headers={"Retry-After": retry_after} if retry_after else {})
+    return resp
+
+
+class TokenBucketTests(unittest.TestCase):
+    def test_take_and_pause(self):
+        bucket = TokenBucket(10.0, 2.0)
+        self.assertEqual(bucket.take(), 0.0)
+        self.assertGreater(bucket.take(need=2.0), 0.0)
+        bucket.pause(1.0)
+        self.assertGreater(bucket.take(), 1.0)
+
+
+class SchedulerTests(unittest.TestCase):
+    def test_rotates_across_tokens(self):
+        sched = Scheduler("t", ["a", "b", "c"], rate=1.0, burst=5)
+        tokens = [sched.acquire() for _ in range(6)]
+        self.assertEqual(sorted(tokens), ["a", "a", "b", "b", "c", "c"])
+        self.assertEqual(sched.stats()["per_token"], [2, 2, 2])
+
+    def test_background_keeps_a_reserve(self):
+        sched = Scheduler("t", ["a"], rate=1.0, burst=4, reserve=0.5)
+        # crawl may use the burst only down to half of it
+        sched.acquire(CRAWL)
+        sched.acquire(CRAWL)
+        self.assertEqual(sched.acquire(INTERACTIVE), "a")
+        self.assertEqual(sched.stats()["lanes"]["crawl"]["served"], 2)
+
+    def test_interactive_jumps_the_background_queue(self):
+        sched = Scheduler("t", ["a", "b"], rate=40.0, burst=2)
+        order = []
+        lock = threading.Lock()
+
+        def worker(lane, name):
+            sched.acquire(lane)
+            with lock:
+                order.append(name)
+
+        background = [threading.Thread(target=worker, args=(CRAWL if i % 2 else WATCHLIST, f"bg{i}")) for i in range(30)]
+        for t in background:
+            t.start()
+        time.sleep(0.05)
+        self.assertGreater(sum(sched.stats()["lanes"][n]["depth"] for n in ("crawl", "watchlist")), 10)
+        waits = []
+        for i in range(3):
+            start = time.perf_counter()
+            worker(INTERACTIVE, f"ui{i}")
+            waits.append(time.perf_counter() - start)
+        for t in background:
+            t.join()
+        # each interactive request waits for at most about one refill, not for the backlog
+        self.assertLess(max(waits), 0.2)
+        self.assertLess(order.index("ui2"), 20)
+        # watchlist requests are served ahead of crawl requests queued at the same time
+        late = [n for n in order if n.startswith("bg")][-5:]
+        self.assertTrue(all(int(n[2:]) % 2 for n in late))
+        self.assertEqual(sched.stats()["lanes"]["crawl"]["depth"], 0)
+
+
+class GetTests(unittest.TestCase):
+    def setUp(self):
+        env = patch.dict(os.environ, {"CLASH_ROYALE_TOKENS": "a, b", "CRTOOL_CLASH_RATE": "1000"})
+        env.start()
+        self.addCleanup(env.stop)
+        scheduler._schedulers.clear()
+
+    def test_throttled_token_is_paused_and_request_retried(self):
+        responses = [_response(429, "5"), _response(200)]
+        with patch("requests.get", side_effect=responses) as get:
+            resp = scheduler.get(CLASH, "http://x/cards")
+        self.assertEqual(resp.status_code, 200)
+        first, second = (c.kwargs["headers"]["Authorization"] for c in get.call_args_list)
+        self.assertNotEqual(first, second)
+        # the throttled token sits out while the other one serves
+        with patch("requests.get", return_value=_response(200)) as get:
+            for _ in range(3):
+                scheduler.get(CLASH, "http://x/cards")
+        self.assertEqual({c.kwargs["headers"]["Authorization"] for c in get.call_args_list}, {second})
+
+    def test_token_pool_configuration(self):
+        self.assertEqual(scheduler.configured_tokens(CLASH), ["a", "b"])
+        with patch.dict(os.environ, {"CLASH_ROYALE_TOKENS": "", "CLASH_ROYALE_TOKEN": "c"}):
+            self.assertEqual(scheduler.get_scheduler(CLASH).tokens, ["c"])
+        with patch.dict(os.environ, {"CLASH_ROYALE_TOKENS": "", "CLASH_ROYALE_TOKEN": ""}):
+            with self.assertRaises(RuntimeError):
+                scheduler.get(CLASH, "http://x/cards")
+
+    def test_lane_context(self):
+        self.assertEqual(scheduler.current_lane(), INTERACTIVE)
+        with scheduler.lane(CRAWL):
+            self.assertEqual(scheduler.current_lane(), CRAWL)
+            with patch("requests.get", return_value=_response(200)):
+                scheduler.get(CLASH, "http://x/cards")
+        self.assertEqual(scheduler.get_scheduler(CLASH).stats()["lanes"]["crawl"]["served"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
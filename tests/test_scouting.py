@@ -0,0 +1,115 @@
+import threading
+import time
+import unittest
+
+from scouting import ScoutCache, faced_decks, opponent_tags, scout, scout_battlelogs
+
+HOG = ["Hog Rider", "Musketeer", "Ice Spirit", "Skeletons", "Cannon", "Fireball", "Log", "Ice Golem"]
+GOLEM = ["Golem", "Baby Dragon", "Lumberjack", "Night Witch", "Tornado", "Lightning", "Zap", "Mega Minion"]
+
+
+def _battle(i, me, opp, my_deck=HOG, opp_deck=GOLEM, trophies=6000, won=True):
+    return {
+        "type": "PvP",
+        "battleTime": f"20240716T12{i // 60:02d}{i % 60:02d}.000Z",
+        "team": [{"tag": f"#{me}", "startingTrophies": trophies, "crowns": int(won), "cards": [{"name": c} for c in my_deck]}],
+        "opponent": [{"tag": f"#{opp}", "startingTrophies": trophies, "crowns": int(not won), "cards": [{"name": c} for c in opp_deck]}],
+    }
+
+
+class FakeApi:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def _enter(self, kind, tag):
+        with self.lock:
+            self.calls.append((kind, tag))
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+
+    def player(self, tag):
+        self._enter("player", tag)
+        return {"tag": f"#{tag}", "trophies": 6000}
+
+    def battlelog(self, tag):
+        self._enter("battlelog", tag)
+        return [_battle(1, tag, "OTHER")]
+
+
+class ScoutingTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = ScoutCache()
+
+    def scout(self, tags, api, **kwargs):
+        return scout(tags, api.player, api.battlelog, cache=self.cache, **kwargs)
+
+    def test_opponent_tags(self):
+        log = [_battle(3, "ME", "A"), _battle(2, "ME", "b"), _battle(1, "ME", "A"), {"type": "PvP"}]
+        self.assertEqual(opponent_tags(log), ["A", "B"])
+        self.assertEqual(opponent_tags(log, limit=1), ["A"])
+        self.assertEqual(opponent_tags([]), [])
+
+    def test_shared_across_users_and_bounded(self):
+        api = FakeApi(delay=0.01)
+        logs = [[_battle(i, "U1", f"T{i}") for i in range(6)], [_battle(i, "U2", f"T{i + 3}") for i in range(6)]]
+        per_user = scout_battlelogs(logs, per_log=6, fetch_player=api.player, fetch_battlelog=api.battlelog,
+                                    workers=3, cache=self.cache)
+        self.assertEqual([len(u) for u in per_user], [6, 6])
+        # 9 distinct opponents, each fetched once
+        self.assertEqual(len(api.calls), 9 * 2)
+        self.assertLessEqual(api.peak, 3)
+        # a later user facing the same opponents is served from the cache
+        self.assertEqual(len(self.scout(["#t0", "T8"], api)), 2)
+        self.assertEqual(len(api.calls), 18)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        fetches = []
+
+        def fetch(tag):
+            fetches.append(tag)
+            time.sleep(0.05)
+            return {"tag": tag}
+
+        threads = [threading.Thread(target=self.cache.get_or_fetch, args=("X", fetch)) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(fetches, ["X"])
+
+    def test_failures_are_dropped_and_not_cached(self):
+        api = FakeApi()
+        failing = [True]
+
+        def player(tag):
+            if failing:
+                failing.pop()
+                raise ConnectionError("boom")
+            return api.player(tag)
+
+        self.assertEqual(scout(["A"], player, api.battlelog, cache=self.cache), {})
+        self.assertEqual(list(scout(["A"], player, api.battlelog, cache=self.cache)), ["A"])
+
+    def test_faced_decks(self):
+        a = [_battle(1, "A", "B"), _battle(2, "A", "C", my_deck=HOG, opp_deck=HOG, won=False),
+             _battle(3, "A", "D", trophies=7000)]
+        # B's log holds the same A-vs-B battle: counted once
+        b = [_battle(1, "B", "A", my_deck=GOLEM, opp_deck=HOG, won=False)]
+        decks = faced_decks([{"battlelog": a}, {"battlelog": b}], trophies=6100)
+        self.assertEqual(decks[0]["deck"], sorted(HOG))
+        self.assertEqual(decks[0]["count"], 3)
+        self.assertAlmostEqual(decks[0]["share"], 3 / 4)
+        self.assertAlmostEqual(decks[0]["win_rate"], 2 / 3)
+        self.assertEqual(decks[1]["count"], 1)
+        self.assertEqual(faced_decks([], trophies=6000), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
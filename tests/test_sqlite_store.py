@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import sqlite_store
+
+SCHEMA = ("CREATE TABLE IF NOT EXISTS t (k TEXT PRIMARY KEY)",)
+
+
+class SqliteStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "sub", "t.db")
+
+    def test_creates_schema_once_with_wal(self):
+        with patch("sqlite_store.init_db", wraps=sqlite_store.init_db) as init:
+            for _ in range(3):
+                conn = sqlite_store.connect(self.path, SCHEMA)
+                conn.execute("INSERT OR REPLACE INTO t VALUES ('a')")
+                conn.commit()
+                conn.close()
+        self.assertEqual(init.call_count, 1)
+        conn = sqlite_store.connect(self.path, SCHEMA)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        conn.close()
+
+    def test_forget_recreates_a_deleted_file(self):
+        sqlite_store.connect(self.path, SCHEMA).close()
+        os.remove(self.path)
+        sqlite_store.forget(self.path)
+        conn = sqlite_store.connect(self.path, SCHEMA)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM t").fetchone()[0], 0)
+        conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,16 @@
+import importlib.util
+import unittest
+from benchmarks.startup import eager_imports, leaked_modules
+
+
+class StartupTests(unittest.TestCase):
+    def test_eager_imports_exist(self):
+        for module in eager_imports():
+            self.assertIsNotNone(importlib.util.find_spec(module), module)
+
+    def test_feature_modules_stay_lazy(self):
+        self.assertEqual(leaked_modules(eager_imports()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
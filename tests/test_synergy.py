@@ -0,0 +1,114 @@
+import math
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from benchmarks import datagen
+from records import parse_battlelog
+from synergy import SynergyIndex
+
+HOG = ["Hog Rider", "Musketeer", "Ice Spirit", "Skeletons", "Cannon", "Fireball", "Log", "Ice Golem"]
+GOLEM = ["Golem", "Baby Dragon", "Lumberjack", "Night Witch", "Tornado", "Lightning", "Zap", "Mega Minion"]
+
+
+def _battle(i, team, opp, won=True):
+    return {
+        "type": "PvP",
+        "battleTime": f"20240716T12{i // 60:02d}{i % 60:02d}.000Z",
+        "team": [{"tag": f"#A{i}", "crowns": 1 if won else 0, "cards": [{"name": c} for c in team]}],
+        "opponent": [{"tag": "#B", "crowns": 0 if won else 1, "cards": [{"name": c} for c in opp]}],
+    }
+
+
+class SynergyIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.index = SynergyIndex()
+
+    def test_concurrent_sessions_count_each_battle_once(self):
+        class SlowSet(set):
+            def __contains__(self, key):
+                found = super().__contains__(key)
+                time.sleep(0.0001)  # widen the gap between the check and the insert
+                return found
+
+        log = datagen.battlelog(200, seed=3)
+        self.index.seen = SlowSet()
+        start = threading.Barrier(4)
+
+        def session():
+            start.wait()
+            self.index.add_battles(log)
+
+        threads = [threading.Thread(target=session) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        expected = SynergyIndex()
+        expected.add_battles(log)
+        self.assertEqual(self.index.decks, expected.decks)
+        self.assertEqual(len(set(self.index.cards.names)), len(self.index.cards))
+        self.assertEqual(self.index.card_count.sum(), expected.card_count.sum())
+
+    def test_lift_and_pmi(self):
+        self.index.add_decks([HOG, HOG, GOLEM, GOLEM])
+        pair = self.index.pair("Hog Rider", "Cannon")
+        self.assertEqual(pair["count"], 2)
+        # 2 of 4 decks each, always together: lift 2
+        self.assertAlmostEqual(pair["lift"], 2.0)
+        self.assertAlmostEqual(pair["pmi"], math.log(2))
+        self.assertEqual(self.index.pair("Hog Rider", "Golem")["count"], 0)
+        self.assertEqual(len(self.index), 2 * 28)
+
+    def test_top_partners(self):
+        self.index.add_decks([HOG] * 3 + [HOG[:7] + ["Zap"]] * 3 + [GOLEM] * 6)
+        top = self.index.top_partners("hog rider", k=3)
+        self.assertEqual(len(top), 3)
+        self.assertEqual(top[0]["count"], 6)
+        self.assertNotIn("Golem", [p["card"] for p in top])
+        self.assertEqual(self.index.top_partners("Hog Rider", min_count=7), [])
+        self.assertEqual(self.index.top_partners("Unknown"), [])
+        with self.assertRaises(ValueError):
+            self.index.top_partners("Hog Rider", by="nope")
+
+    def test_win_synergy_from_battles(self):
+        wins = [_battle(i, HOG, GOLEM) for i in range(10)]
+        mixed = [_battle(10 + i, HOG[:6] + ["Zap", "Knight"], GOLEM, won=i % 2 == 0) for i in range(10)]
+        self.assertEqual(self.index.add_battles(wins + mixed), 20)
+        # Log only shows up in winning decks, Zap only in half-won decks
+        self.assertGreater(
+            self.index.pair("Hog Rider", "Log")["synergy"], self.index.pair("Hog Rider", "Zap")["synergy"]
+        )
+        self.assertIn(self.index.top_partners("Hog Rider", k=1, by="synergy")[0]["card"], ("Log", "Ice Golem"))
+
+    def test_battles_and_corpus_counted_once(self):
+        log = datagen.battlelog(20)
+        self.assertEqual(self.index.add_battles(parse_battlelog(log)), 20)
+        self.assertEqual(self.index.add_battles(log), 0)
+        self.assertEqual(self.index.decks, 40)
+        corpus = [{"cards": [{"name": c} for c in HOG], "winPercent": 55}, {"cards": HOG}]
+        self.assertEqual(self.index.add_corpus(corpus), 1)
+
+    def test_suggest_swaps(self):
+        self.index.add_decks([HOG] * 5 + [HOG[:7] + ["Tesla"]] * 5 + [GOLEM] * 5)
+        swaps = self.index.suggest_swaps(HOG[:7] + ["Golem"])
+        self.assertEqual(swaps[0]["out"], "Golem")
+        self.assertIn(swaps[0]["in"], ("Ice Golem", "Tesla"))
+        self.assertGreater(swaps[0]["gain"], 0)
+        self.assertEqual(self.index.suggest_swaps(HOG[:7] + ["Golem"], pool=["Tesla"])[0]["in"], "Tesla")
+        self.assertEqual(self.index.suggest_swaps(HOG), [])
+
+    def test_save_and_load(self):
+        self.index.add_battles(datagen.battlelog(30))
+        path = os.path.join(tempfile.mkdtemp(), "synergy.npz")
+        self.index.save(path)
+        loaded = SynergyIndex.load(path)
+        self.assertEqual(loaded.seen, self.index.seen)
+        self.assertEqual(loaded.top_partners("Hog Rider"), self.index.top_partners("Hog Rider"))
+        self.assertEqual(loaded.add_battles(datagen.battlelog(30)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import user_store
+
+
+class UserStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def test_shards_are_stable_and_spread(self):
+        self.assertEqual(user_store.shard_path("#abc", self.root), user_store.shard_path("ABC", self.root))
+        shards = {user_store.shard_path(f"P{i}", self.root) for i in range(200)}
+        self.assertEqual(len(shards), user_store.SHARDS)
+
+    def test_progress_is_partitioned(self):
+        for user, trophies in (("A", 6000), ("B", 5000)):
+            for day in (15, 16, 17):
+                user_store.record_progress(user, {"date": f"2024-07-{day}", "trophies": trophies + day}, self.root)
+        user_store.record_progress("#a", {"date": "2024-07-16", "trophies": 1, "win_rate": 0.5}, self.root)
+        a = user_store.load_progress("A", root=self.root)
+        self.assertEqual([(p["date"], p["trophies"]) for p in a], [("2024-07-15", 6015), ("2024-07-16", 1), ("2024-07-17", 6017)])
+        self.assertEqual(len(user_store.load_progress("A", start="2024-07-16", end="2024-07-16", root=self.root)), 1)
+        user_store.reset_progress("A", self.root)
+        self.assertEqual(user_store.load_progress("A", root=self.root), [])
+        self.assertEqual(len(user_store.load_progress("B", root=self.root)), 3)
+
+    def test_concurrent_users(self):
+        def write(user):
+            for day in range(1, 21):
+                user_store.record_progress(user, {"date": f"2024-07-{day:02d}", "trophies": day}, self.root)
+
+        threads = [threading.Thread(target=write, args=(f"U{i}",)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertTrue(all(len(user_store.load_progress(f"U{i}", root=self.root)) == 20 for i in range(8)))
+
+    def test_event_stats_and_watch_state(self):
+        stats = [{"event_id": "1", "wins": 2, "losses": 1, "deck": ["Knight"], "date": "20240716T120000.000Z", "WR": 2 / 3}]
+        user_store.save_event_stats("A", stats, self.root)
+        user_store.save_event_stats("A", [dict(stats[0], wins=3, WR=0.75)], self.root)
+        self.assertEqual(user_store.load_event_stats("A", self.root), [dict(stats[0], wins=3, WR=0.75)])
+        self.assertEqual(user_store.load_event_stats("B", self.root), [])
+        user_store.set_state("a@x", "video_last", "cid", "v1", self.root)
+        self.assertEqual(user_store.get_state("a@x", "video_last", "cid", self.root), "v1")
+        self.assertIsNone(user_store.get_state("b@x", "video_last", "cid", self.root))
+
+    def test_gc_runs(self):
+        user_store.create_run("a@x", "1", ["Knight"], self.root)
+        user_store.create_run("b@x", "1", ["Golem"], self.root)
+        self.assertTrue(user_store.add_match("a@x", "1", True, 6000, self.root))
+        self.assertFalse(user_store.add_match("a@x", "2", True, 6000, self.root))
+        run = user_store.get_run("a@x", "1", self.root)
+        self.assertEqual((run["deck"], run["matches"]), (["Knight"], [{"win": True, "elo": 6000}]))
+        self.assertEqual(user_store.get_run("b@x", "1", self.root)["matches"], [])
+        self.assertEqual(user_store.list_runs("a@x", self.root), ["1"])
+
+
+class UserPartitionTests(unittest.TestCase):
+    """The `user=` variants of the analysis, GC and watch helpers write to the store."""
+
+    def setUp(self):
+        cwd = os.getcwd()
+        os.chdir(tempfile.mkdtemp())
+        self.addCleanup(os.chdir, cwd)
+
+    def test_progress_and_events(self):
+        from analysis import collect_event_stats, load_progress, record_daily_progress, reset_progress
+
+        now = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.000Z")
+        log = [{"type": "challenge", "eventMode": {"id": 7}, "team": [{"crowns": 1}], "opponent": [{"crowns": 0}], "battleTime": now}]
+        record_daily_progress(log, 6000, 3, user="A")
+        record_daily_progress([], 5000, 1, user="B")
+        self.assertEqual([p["trophies"] for p in load_progress(user="A")], [6000])
+        reset_progress(user="B")
+        self.assertEqual(load_progress(user="B"), [])
+        collect_event_stats(log, user="A")
+        self.assertEqual(user_store.load_event_stats("A")[0]["wins"], 1)
+        self.assertFalse(os.path.exists("progress.json") or os.path.exists("event_stats.json"))
+
+    def test_gc_run(self):
+        import gc_coach
+
+        run_id = gc_coach.start_run(["Knight"], user="a@x")
+        self.assertTrue(gc_coach.record_match(run_id, True, 6000, user="a@x"))
+        self.assertFalse(gc_coach.record_match(run_id, True, 6000, user="b@x"))
+        self.assertEqual(gc_coach.summarize_run(run_id, user="a@x")["total"], 1)
+        self.assertEqual(gc_coach.summarize_run(run_id, user="b@x")["total"], 0)
+        self.assertFalse(os.path.exists("gc_runs"))
+
+    def test_runs_started_together_stay_apart(self):
+        import gc_coach
+
+        with patch("gc_coach.time.time", return_value=1_700_000_000):
+            first = gc_coach.start_run(["Knight"], user="a@x")
+            second = gc_coach.start_run(["Archers"], user="a@x")
+        self.assertNotEqual(first, second)
+        gc_coach.record_match(first, True, 6000, user="a@x")
+        self.assertEqual(gc_coach.summarize_run(first, user="a@x")["total"], 1)
+        self.assertEqual(gc_coach.summarize_run(second, user="a@x")["total"], 0)
+        with self.assertRaises(sqlite3.IntegrityError):
+            user_store.create_run("a@x", first, ["Knight"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from video_index import MatchupVideoIndex, crawl_once, pair_key
+
+
+class VideoIndexTests(unittest.TestCase):
+    def test_lookup_by_pair_and_channel(self):
+        index = MatchupVideoIndex()
+        index.add({"videoId": "a", "title": "Hog Rider vs Giant - how to defend", "channelId": "PRO", "published": 2})
+        index.add({"videoId": "b", "title": "GIANT vs hog!! ladder push", "channelId": "OTHER", "published": 3})
+        index.add({"videoId": "c", "title": "X-Bow cycle guide", "channelId": "PRO", "published": 1})
+        self.assertEqual(pair_key("Giant", "hog"), ("giant", "hog rider"))
+        self.assertEqual([v["videoId"] for v in index.lookup("giant", "Hog Rider")], ["b", "a"])
+        self.assertEqual([v["videoId"] for v in index.lookup("hog", "giant", channels={"PRO"})], ["a"])
+        # substring channel ids must not match
+        self.assertFalse(index.lookup("hog", "giant", channels={"PR"}))
+        self.assertEqual(len(index.channel_videos("PRO")), 2)
+
+    def test_any_card_pair_from_the_card_list(self):
+        path = os.path.join(tempfile.mkdtemp(), "index.json")
+        video = {"videoId": "k", "title": "Knight vs Valkyrie: who wins?", "channelId": "PRO", "published": 1}
+
+        class Client:
+            async def channel_latest(self, channel_id):
+                return [video]
+
+        cards = [{"name": "Knight"}, {"name": "Valkyrie"}, {"name": "P.E.K.K.A"}]
+        with patch("video_index.get_cards", return_value=cards), patch("video_index.get_client", return_value=Client()):
+            self.assertEqual(crawl_once(["PRO"], path=path), 1)
+        # the card list is saved with the videos, so a plain load indexes the pair too
+        index = MatchupVideoIndex.load(path)
+        self.assertEqual([v["videoId"] for v in index.lookup("valkyrie", "Knight")], ["k"])
+        index.add({"videoId": "p", "title": "PEKKA vs Knight", "channelId": "PRO"})
+        self.assertEqual([v["videoId"] for v in index.lookup("P.E.K.K.A", "Knight")], ["p"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+from view_models import ViewModels, battle_version
+
+
+class ViewModelTests(unittest.TestCase):
+    def test_memoized_per_key(self):
+        session = {}
+        calls = []
+        compute = lambda: calls.append(1) or len(calls)
+        vm = ViewModels(session)
+        self.assertEqual(vm.get("events", ("TAG", 1), compute), 1)
+        self.assertEqual(vm.computed, ["events"])
+        # a rerun builds a new ViewModels over the same session
+        vm = ViewModels(session)
+        self.assertEqual(vm.get("events", ("TAG", 1), compute), 1)
+        self.assertEqual(vm.computed, [])
+        self.assertEqual(vm.get("events", ("TAG", 2), compute), 2)
+        vm.invalidate("events")
+        self.assertEqual(vm.get("events", ("TAG", 2), compute), 3)
+
+    def test_battle_version(self):
+        log = [{"battleTime": "20240716T120000.000Z"}, {"battleTime": "20240716T110000.000Z"}]
+        self.assertEqual(battle_version(log), ("20240716T120000.000Z", 2))
+        self.assertEqual(battle_version([]), ("", 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import os
+import sqlite_store
+import watchlist
+
+
+def _battle(time, cards):
+    return {"battleTime": time, "team": [{"cards": [{"name": c} for c in cards]}]}
+
+
+class WatchlistTests(unittest.TestCase):
+    def setUp(self):
+        self.path = "/tmp/watchlist_test.db"
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        sqlite_store.forget(self.path)
+
+    def test_deck_change_feed(self):
+        watchlist.watch(watchlist.PLAYER, "#abc", path=self.path)
+        logs = [
+            [_battle("20240716T120000.000Z", "ABCDEFGH")],
+            [_battle("20240716T130000.000Z", "ABCDWXYZ")],
+        ]
+        fetch = lambda tag: logs.pop(0)
+        self.assertEqual(watchlist.poll_due(now=0, path=self.path, fetch_battlelog=fetch), 0)
+        # not due yet
+        self.assertEqual(watchlist.poll_due(now=1, path=self.path, fetch_battlelog=fetch), 0)
+        self.assertEqual(watchlist.poll_due(now=10_000, path=self.path, fetch_battlelog=fetch), 1)
+        feed = watchlist.recent_changes(path=self.path)
+        self.assertEqual(feed[0]["key"], "ABC")
+        self.assertEqual(feed[0]["deck"], sorted("ABCDWXYZ"))
+
+    def test_idle_backoff(self):
+        watchlist.watch(watchlist.CHANNEL, "cid", path=self.path)
+        fetch = lambda cid: {"videoId": "v1", "title": "t"}
+        watchlist.poll_due(now=0, path=self.path, fetch_video=fetch)
+        first = watchlist.list_watched(path=self.path)[0]["interval"]
+        watchlist.poll_due(now=first, path=self.path, fetch_video=fetch)
+        second = watchlist.list_watched(path=self.path)[0]["interval"]
+        self.assertEqual(first, watchlist.MIN_INTERVAL)
+        self.assertEqual(second, watchlist.MIN_INTERVAL * watchlist.BACKOFF)
+        self.assertFalse(watchlist.recent_changes(path=self.path))
+
+    def test_subscriptions_are_per_user(self):
+        watchlist.watch(watchlist.PLAYER, "#abc", user="a@x", path=self.path)
+        watchlist.watch(watchlist.PLAYER, "ABC", user="b@x", path=self.path)
+        watchlist.watch(watchlist.CHANNEL, "cid", user="b@x", path=self.path)
+        logs = [[_battle("20240716T120000.000Z", "ABCDEFGH")], [_battle("20240716T130000.000Z", "ABCDWXYZ")]]
+        fetch = lambda tag: logs.pop(0)
+        video = lambda cid: {"videoId": "v1", "title": "t"}
+        watchlist.poll_due(now=0, path=self.path, fetch_battlelog=fetch, fetch_video=video)
+        watchlist.poll_due(now=10_000, path=self.path, fetch_battlelog=fetch, fetch_video=video)
+        # one shared entity per player, polled once
+        self.assertEqual(len(watchlist.list_watched(path=self.path)), 2)
+        self.assertEqual([w["key"] for w in watchlist.list_watched(user="a@x", path=self.path)], ["ABC"])
+        self.assertEqual(len(watchlist.list_watched(user="b@x", path=self.path)), 2)
+        self.assertEqual([c["key"] for c in watchlist.recent_changes(user="a@x", path=self.path)], ["ABC"])
+        self.assertFalse(watchlist.recent_changes(user="c@x", path=self.path))
+        watchlist.unwatch(watchlist.PLAYER, "abc", user="a@x", path=self.path)
+        self.assertFalse(watchlist.list_watched(user="a@x", path=self.path))
+        self.assertEqual(len(watchlist.list_watched(path=self.path)), 2)
+        watchlist.unwatch(watchlist.PLAYER, "abc", user="b@x", path=self.path)
+        self.assertEqual([w["kind"] for w in watchlist.list_watched(path=self.path)], [watchlist.CHANNEL])
+
+
+if __name__ == '__main__':
+    unittest.main()
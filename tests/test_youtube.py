@@ -1,5 +1,7 @@
+import asyncio
+import os
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 import youtube_api
 
 class YouTubeTests(unittest.TestCase):
@@ -13,5 +15,42 @@ class YouTubeTests(unittest.TestCase):
         self.assertEqual(len(vids), 1)
         self.assertEqual(vids[0]["url"], "https://www.youtube.com/watch?v=abc")
 
+    @patch("youtube_api.requests.get")
+    def test_client_failover_and_cache(self, mock_get):
+        def fake_get(url, params=None, timeout=None):
+            if url.startswith("https://down"):
+                raise ConnectionError("down")
+            resp = MagicMock()
+            resp.json.return_value = [{"videoId": "abc", "title": "t", "authorId": "ch"}]
+            return resp
+
+        mock_get.side_effect = fake_get
+        path = "/tmp/video_cache_test.db"
+        if os.path.exists(path):
+            os.remove(path)
+        client = youtube_api.VideoSearchClient(
+            instances=["https://down.example", "https://up.example"],
+            cache=youtube_api.QueryCache(path),
+            hedge_delay=0.01,
+        )
+        vids = asyncio.run(client.search("hog vs giant"))
+        self.assertEqual(vids[0]["channelId"], "ch")
+        self.assertEqual(client.ranked_instances()[0], "https://up.example")
+        calls = mock_get.call_count
+        self.assertEqual(asyncio.run(client.search("Hog vs Giant ")), vids)
+        self.assertEqual(mock_get.call_count, calls)
+
+    @patch("youtube_api.requests.get")
+    def test_search_videos_inside_running_loop(self, mock_get):
+        mock_get.return_value.json.return_value = [{"videoId": "abc", "title": "t", "authorId": "ch"}]
+        client = youtube_api.VideoSearchClient(instances=["https://up.example"], hedge_delay=0.01)
+
+        async def handler():
+            return youtube_api.search_videos("hog", max_results=1)
+
+        with patch("youtube_api.get_client", return_value=client):
+            vids = asyncio.run(handler())
+        self.assertEqual(vids[0]["videoId"], "abc")
+
 if __name__ == '__main__':
     unittest.main()
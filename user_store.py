@@ -0,0 +1,202 @@
+"""Per-user storage for progress, event stats, watch state and GC runs.
+
+Replaces the shared `progress.json`, `event_stats.json`, `watch.json` and
+`gc_runs/` files, where every user overwrote everyone else's data. Each row
+is keyed by its user (the player tag for progress and event stats, the
+account for watch state and GC runs) and users are spread over `SHARDS`
+SQLite files by a stable hash of that key, so writes of different users
+rarely wait on the same database lock and per-user queries are primary-key
+lookups however many users there are.
+
+    record_progress("2PP", {"date": "2024-07-16", "trophies": 6000, ...})
+    load_progress("2PP", start="2024-07-01")
+"""
+import json
+import os
+import sqlite3
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import sqlite_store
+from records import norm_tag
+
+STORE_DIR = os.getenv("CRTOOL_USER_STORE", "user_store")
+SHARDS = 16
+
+
+def shard_path(user: str, root: str = STORE_DIR, shards: int = SHARDS) -> str:
+    """Database file holding `user`'s rows (crc32, so stable across processes)."""
+    shard = zlib.crc32(norm_tag(user).encode()) % shards
+    return os.path.join(root, f"shard-{shard:02d}.db")
+
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS progress (user TEXT, date TEXT, trophies INTEGER, league_rank INTEGER, "
+    "win_rate REAL, updated REAL, PRIMARY KEY (user, date))",
+    "CREATE TABLE IF NOT EXISTS event_stats (user TEXT, event_id TEXT, wins INTEGER, losses INTEGER, "
+    "deck TEXT, date TEXT, wr REAL, PRIMARY KEY (user, event_id))",
+    "CREATE INDEX IF NOT EXISTS idx_event_stats_date ON event_stats(user, date)",
+    "CREATE TABLE IF NOT EXISTS watch_state (user TEXT, kind TEXT, key TEXT, value TEXT, updated REAL, "
+    "PRIMARY KEY (user, kind, key))",
+    "CREATE TABLE IF NOT EXISTS gc_runs (user TEXT, run_id TEXT, deck TEXT, created REAL, "
+    "PRIMARY KEY (user, run_id))",
+    "CREATE TABLE IF NOT EXISTS gc_matches (id INTEGER PRIMARY KEY AUTOINCREMENT, user TEXT, run_id TEXT, "
+    "win INTEGER, elo INTEGER, created REAL)",
+    "CREATE INDEX IF NOT EXISTS idx_gc_matches_run ON gc_matches(user, run_id)",
+)
+
+
+def _connect(user: str, root: str) -> sqlite3.Connection:
+    return sqlite_store.connect(shard_path(user, root), SCHEMA)
+
+
+def init_db(path: str) -> None:
+    sqlite_store.init_db(path, SCHEMA)
+
+
+# --- daily progress ---
+
+
+def record_progress(user: str, entry: Dict, root: str = STORE_DIR) -> None:
+    """Insert or replace the user's progress entry for `entry["date"]`."""
+    conn = _connect(user, root)
+    conn.execute(
+        "INSERT OR REPLACE INTO progress VALUES (?,?,?,?,?,?)",
+        (norm_tag(user), entry["date"], entry.get("trophies", 0), entry.get("league_rank", 0),
+         entry.get("win_rate", 0.0), time.time()),
+    )
+    conn.commit()
+    conn.close()
+
+
+def load_progress(
+    user: str, start: Optional[str] = None, end: Optional[str] = None, root: str = STORE_DIR
+) -> List[Dict]:
+    """The user's progress entries between ISO dates `start` and `end` (inclusive), oldest first."""
+    sql = "SELECT date, trophies, league_rank, win_rate FROM progress WHERE user=?"
+    args: List = [norm_tag(user)]
+    if start is not None:
+        sql += " AND date >= ?"
+        args.append(start)
+    if end is not None:
+        sql += " AND date <= ?"
+        args.append(end)
+    conn = _connect(user, root)
+    rows = conn.execute(sql + " ORDER BY date", args).fetchall()
+    conn.close()
+    return [{"date": r[0], "trophies": r[1], "league_rank": r[2], "win_rate": r[3]} for r in rows]
+
+
+def reset_progress(user: str, root: str = STORE_DIR) -> None:
+    conn = _connect(user, root)
+    conn.execute("DELETE FROM progress WHERE user=?", (norm_tag(user),))
+    conn.commit()
+    conn.close()
+
+
+# --- event stats ---
+
+
+def save_event_stats(user: str, stats: List[Dict], root: str = STORE_DIR) -> None:
+    """Upsert per-event stats as returned by `analysis.collect_event_stats`."""
+    key = norm_tag(user)
+    conn = _connect(user, root)
+    conn.executemany(
+        "INSERT OR REPLACE INTO event_stats VALUES (?,?,?,?,?,?,?)",
+        [
+            (key, s["event_id"], s["wins"], s["losses"], json.dumps(s.get("deck", [])), s.get("date"), s.get("WR", 0))
+            for s in stats
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+def load_event_stats(user: str, root: str = STORE_DIR) -> List[Dict]:
+    """The user's event stats, most recently played first."""
+    conn = _connect(user, root)
+    rows = conn.execute(
+        "SELECT event_id, wins, losses, deck, date, wr FROM event_stats WHERE user=? ORDER BY date DESC",
+        (norm_tag(user),),
+    ).fetchall()
+    conn.close()
+    return [
+        {"event_id": r[0], "wins": r[1], "losses": r[2], "deck": json.loads(r[3]), "date": r[4], "WR": r[5]}
+        for r in rows
+    ]
+
+
+# --- watch state ---
+
+
+def get_state(user: str, kind: str, key: str, root: str = STORE_DIR):
+    """Last value stored for the user's watched `key` of `kind` (e.g. "video_last"), or None."""
+    conn = _connect(user, root)
+    r = conn.execute(
+        "SELECT value FROM watch_state WHERE user=? AND kind=? AND key=?", (norm_tag(user), kind, key)
+    ).fetchone()
+    conn.close()
+    return json.loads(r[0]) if r else None
+
+
+def set_state(user: str, kind: str, key: str, value, root: str = STORE_DIR) -> None:
+    conn = _connect(user, root)
+    conn.execute(
+        "INSERT OR REPLACE INTO watch_state VALUES (?,?,?,?,?)",
+        (norm_tag(user), kind, key, json.dumps(value), time.time()),
+    )
+    conn.commit()
+    conn.close()
+
+
+# --- Grand Challenge runs ---
+
+
+def create_run(user: str, run_id: str, deck: List[str], root: str = STORE_DIR) -> None:
+    """Store a new run; an existing `run_id` of the user raises `sqlite3.IntegrityError`."""
+    conn = _connect(user, root)
+    conn.execute(
+        "INSERT INTO gc_runs VALUES (?,?,?,?)", (norm_tag(user), run_id, json.dumps(list(deck)), time.time())
+    )
+    conn.commit()
+    conn.close()
+
+
+def add_match(user: str, run_id: str, win: bool, elo: int, root: str = STORE_DIR) -> bool:
+    """Append a match to the run; False when the user has no such run."""
+    key = norm_tag(user)
+    conn = _connect(user, root)
+    if conn.execute("SELECT 1 FROM gc_runs WHERE user=? AND run_id=?", (key, run_id)).fetchone() is None:
+        conn.close()
+        return False
+    conn.execute(
+        "INSERT INTO gc_matches (user, run_id, win, elo, created) VALUES (?,?,?,?,?)",
+        (key, run_id, int(win), elo, time.time()),
+    )
+    conn.commit()
+    conn.close()
+    return True
+
+
+def get_run(user: str, run_id: str, root: str = STORE_DIR) -> Optional[Dict]:
+    """The run with its matches in play order, or None."""
+    key = norm_tag(user)
+    conn = _connect(user, root)
+    r = conn.execute("SELECT deck FROM gc_runs WHERE user=? AND run_id=?", (key, run_id)).fetchone()
+    if r is None:
+        conn.close()
+        return None
+    matches = conn.execute(
+        "SELECT win, elo FROM gc_matches WHERE user=? AND run_id=? ORDER BY id", (key, run_id)
+    ).fetchall()
+    conn.close()
+    return {"run_id": run_id, "deck": json.loads(r[0]), "matches": [{"win": bool(w), "elo": e} for w, e in matches]}
+
+
+def list_runs(user: str, root: str = STORE_DIR) -> List[str]:
+    """The user's run ids, newest first."""
+    conn = _connect(user, root)
+    rows = conn.execute("SELECT run_id FROM gc_runs WHERE user=? ORDER BY created DESC", (norm_tag(user),)).fetchall()
+    conn.close()
+    return [r[0] for r in rows]
@@ -0,0 +1,191 @@
+"""Local index of pro channel uploads keyed by channel and card pair.
+
+The `video_index` worker job (scheduled by `worker.py --schedule`) pulls
+the latest uploads of each pro channel, extracts the card names mentioned in
+each title and stores the video under every normalized card pair. Match-up lookups are then plain dictionary reads.
+The crawl fetches the full card list from the API and saves it with the
+videos, so titles about any card pair are indexed, not just the role cards
+`analysis` knows about.
+"""
+import asyncio
+import itertools
+import json
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from analysis import ANTI_AIR, SPELLS, WIN_CONDITIONS
+from clash_api import get_cards
+from youtube_api import get_client
+
+INDEX_PATH = "video_index.json"
+
+ALIASES = {
+    "hog": "hog rider",
+    "xbow": "x-bow",
+    "x bow": "x-bow",
+    "pekka": "p.e.k.k.a",
+    "the log": "log",
+    "rg": "royal giant",
+    "egiant": "electro giant",
+    "e giant": "electro giant",
+    "ewiz": "electro wizard",
+    "e wiz": "electro wizard",
+    "lavaloon": "lava hound",
+    "loon": "balloon",
+    "mk": "mega knight",
+    "gy": "graveyard",
+}
+
+_WORD = re.compile(r"[a-z0-9.\-]+")
+
+
+def _words(text: str) -> List[str]:
+    return [w.strip(".-") for w in _WORD.findall(text.lower()) if w.strip(".-")]
+
+
+def normalize_card(name: str) -> str:
+    n = " ".join(_words(name))
+    return ALIASES.get(n, n)
+
+
+def pair_key(card_a: str, card_b: str) -> Tuple[str, str]:
+    a, b = normalize_card(card_a), normalize_card(card_b)
+    return (a, b) if a <= b else (b, a)
+
+
+class MatchupVideoIndex:
+    """Videos stored by channel id and by normalized card pair."""
+
+    def __init__(self, card_names: Optional[Iterable[str]] = None):
+        self.card_names = sorted(set(card_names or ()))
+        names = set(self.card_names) | ANTI_AIR | SPELLS | WIN_CONDITIONS
+        self.vocab = {normalize_card(n) for n in names} | set(ALIASES)
+        self.max_words = max(len(v.split()) for v in self.vocab)
+        self.videos: Dict[str, Dict] = {}
+        self.by_channel: Dict[str, List[str]] = {}
+        self.by_pair: Dict[Tuple[str, str], List[str]] = {}
+
+    def cards_in_title(self, title: str) -> List[str]:
+        words = _words(title)
+        found = []
+        i = 0
+        while i < len(words):
+            for n in range(min(self.max_words, len(words) - i), 0, -1):
+                phrase = " ".join(words[i:i + n])
+                if phrase in self.vocab:
+                    card = ALIASES.get(phrase, phrase)
+                    if card not in found:
+                        found.append(card)
+                    i += n
+                    break
+            else:
+                i += 1
+        return found
+
+    def add(self, video: Dict) -> bool:
+        vid = video.get("videoId")
+        if not vid or vid in self.videos:
+            return False
+        self.videos[vid] = video
+        self.by_channel.setdefault(video.get("channelId", ""), []).append(vid)
+        cards = self.cards_in_title(video.get("title", ""))
+        for a, b in itertools.combinations(cards, 2):
+            self.by_pair.setdefault(pair_key(a, b), []).append(vid)
+        return True
+
+    def lookup(
+        self,
+        card_a: str,
+        card_b: str,
+        channels: Optional[Iterable[str]] = None,
+        max_results: int = 5,
+    ) -> List[Dict]:
+        """Return indexed videos for a card pair, newest first."""
+        allowed = set(channels) if channels else None
+        hits = []
+        for vid in self.by_pair.get(pair_key(card_a, card_b), ()):
+            video = self.videos[vid]
+            if allowed is None or video.get("channelId") in allowed:
+                hits.append(video)
+        hits.sort(key=lambda v: v.get("published", 0), reverse=True)
+        return hits[:max_results]
+
+    def channel_videos(self, channel_id: str) -> List[Dict]:
+        return [self.videos[v] for v in self.by_channel.get(channel_id, ())]
+
+    def save(self, path: str = INDEX_PATH) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump({"cards": self.card_names, "videos": list(self.videos.values())}, fh)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = INDEX_PATH, card_names: Optional[Iterable[str]] = None) -> "MatchupVideoIndex":
+        """Load the saved videos, indexed with the saved card list plus `card_names`."""
+        try:
+            with open(path) as fh:
+                data = json.load(fh)
+        except Exception:
+            data = {}
+        if isinstance(data, list):  # files written before the card list was saved
+            data = {"videos": data}
+        index = cls(set(data.get("cards", ())) | set(card_names or ()))
+        for v in data.get("videos", ()):
+            index.add(v)
+        return index
+
+
+async def crawl_channels(index: MatchupVideoIndex, channels: Iterable[str], client=None) -> int:
+    """Add the latest uploads of each channel to the index; return new video count."""
+    client = client or get_client()
+    channels = list(channels)
+    results = await asyncio.gather(
+        *(client.channel_latest(cid) for cid in channels), return_exceptions=True
+    )
+    added = 0
+    for cid, videos in zip(channels, results):
+        if isinstance(videos, Exception):
+            continue
+        for v in videos:
+            added += index.add(dict(v, channelId=v.get("channelId") or cid))
+    return added
+
+
+_index: Optional[MatchupVideoIndex] = None
+_index_mtime = 0.0
+_lock = threading.Lock()
+
+
+def get_index(path: str = INDEX_PATH) -> MatchupVideoIndex:
+    """Return the shared index, reloading it when the crawler rewrote the file."""
+    global _index, _index_mtime
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = 0.0
+    with _lock:
+        if _index is None or mtime > _index_mtime:
+            _index = MatchupVideoIndex.load(path)
+            _index_mtime = mtime
+        return _index
+
+
+def crawl_once(channels: Iterable[str], path: str = INDEX_PATH, card_names: Optional[Iterable[str]] = None) -> int:
+    """Crawl `channels` into the index at `path` with the current card list; return new video count."""
+    if card_names is None:
+        try:
+            card_names = [c["name"] for c in get_cards()]
+        except Exception:
+            card_names = ()  # keep the card list saved by the last crawl
+    index = MatchupVideoIndex.load(path, card_names)
+    added = asyncio.run(crawl_channels(index, channels))
+    index.save(path)
+    return added
+
+
+if __name__ == "__main__":
+    from meta import PRO_CHANNELS
+
+    print(crawl_once(PRO_CHANNELS))
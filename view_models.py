@@ -0,0 +1,55 @@
+"""Per-session memoization of the data behind each Streamlit view.
+
+Each view's data is computed on demand and stored in the session under
+its name together with the key it was computed for (data version plus the
+inputs it depends on). A rerun with the same key reuses the stored value,
+so a widget interaction only recomputes the views that depend on it.
+"""
+import os
+import time
+from typing import Any, Callable, Dict, Hashable, List, MutableMapping
+
+STATE_KEY = "_view_models"
+
+
+class ViewModels:
+    """Memo of view data living in a session state mapping."""
+
+    def __init__(self, session: MutableMapping):
+        if STATE_KEY not in session:
+            session[STATE_KEY] = {}
+        self.entries: Dict[str, tuple] = session[STATE_KEY]
+        self.computed: List[str] = []
+
+    def get(self, name: str, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the value of view `name` for `key`, computing it on a miss."""
+        entry = self.entries.get(name)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        value = compute()
+        self.entries[name] = (key, value)
+        self.computed.append(name)
+        return value
+
+    def invalidate(self, *names: str) -> None:
+        for name in names:
+            self.entries.pop(name, None)
+
+
+def battle_version(battles: List[Dict]) -> tuple:
+    """Cheap version of a battlelog: its newest battle time and length."""
+    if not battles:
+        return ("", 0)
+    return (battles[0].get("battleTime", ""), len(battles))
+
+
+def time_version(seconds: float) -> int:
+    """Version that changes every `seconds`, for data refreshed on a TTL."""
+    return int(time.time() // seconds)
+
+
+def file_version(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
@@ -0,0 +1,260 @@
+"""Watchlist of players and channels polled on adaptive schedules.
+
+Each watched entity is a row in a small SQLite store indexed by its next
+poll time. Polling a due entity updates only its own row and appends to a
+change feed (deck switches, new videos) that the UI reads without any
+network access. Entities are polled once however many users follow them;
+each user's subscriptions decide which entities and changes they see.
+"""
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import sqlite_store
+from clash_api import get_battlelog
+from player_watch import _deck_from_battle, deck_similarity, fetch_latest_video, video_info
+from profiler import new_job_id, profile_job
+from records import norm_tag
+from scheduler import WATCHLIST, lane
+
+WATCH_DB = "watchlist.db"
+
+PLAYER = "player"
+CHANNEL = "channel"
+
+MIN_INTERVAL = 300.0
+MAX_INTERVAL = 6 * 3600.0
+BACKOFF = 2.0
+
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS entities (kind TEXT, key TEXT, last_seen TEXT, last_value TEXT, "
+    "interval REAL, next_poll REAL, PRIMARY KEY (kind, key))",
+    "CREATE INDEX IF NOT EXISTS idx_entities_next_poll ON entities(next_poll)",
+    "CREATE TABLE IF NOT EXISTS changes (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, key TEXT, "
+    "payload TEXT, created REAL)",
+    "CREATE INDEX IF NOT EXISTS idx_changes_entity ON changes(kind, key)",
+    "CREATE TABLE IF NOT EXISTS subscriptions (user TEXT, kind TEXT, key TEXT, created REAL, "
+    "PRIMARY KEY (user, kind, key))",
+    "CREATE INDEX IF NOT EXISTS idx_subscriptions_entity ON subscriptions(kind, key)",
+)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    return sqlite_store.connect(path, SCHEMA)
+
+
+def _norm_key(kind: str, key: str) -> str:
+    return norm_tag(key) if kind == PLAYER else key.strip()
+
+
+def init_db(path: str = WATCH_DB) -> None:
+    sqlite_store.init_db(path, SCHEMA)
+
+
+def watch(kind: str, key: str, user: Optional[str] = None, path: str = WATCH_DB) -> None:
+    """Start watching a player tag or channel id (for `user`); it is polled on the next run."""
+    if kind not in (PLAYER, CHANNEL):
+        raise ValueError(f"unknown watch kind: {kind}")
+    key = _norm_key(kind, key)
+    conn = _connect(path)
+    conn.execute(
+        "INSERT OR IGNORE INTO entities (kind, key, interval, next_poll) VALUES (?,?,?,0)",
+        (kind, key, MIN_INTERVAL),
+    )
+    if user is not None:
+        conn.execute(
+            "INSERT OR IGNORE INTO subscriptions VALUES (?,?,?,?)", (norm_tag(user), kind, key, time.time())
+        )
+    conn.commit()
+    conn.close()
+
+
+def unwatch(kind: str, key: str, user: Optional[str] = None, path: str = WATCH_DB) -> None:
+    """Stop `user` watching an entity; it stops being polled once nobody follows it."""
+    key = _norm_key(kind, key)
+    conn = _connect(path)
+    if user is None:
+        conn.execute("DELETE FROM subscriptions WHERE kind=? AND key=?", (kind, key))
+    else:
+        conn.execute("DELETE FROM subscriptions WHERE user=? AND kind=? AND key=?", (norm_tag(user), kind, key))
+    if conn.execute("SELECT 1 FROM subscriptions WHERE kind=? AND key=?", (kind, key)).fetchone() is None:
+        conn.execute("DELETE FROM entities WHERE kind=? AND key=?", (kind, key))
+    conn.commit()
+    conn.close()
+
+
+def list_watched(user: Optional[str] = None, path: str = WATCH_DB) -> List[Dict]:
+    """Watched entities, only those `user` subscribed to when given."""
+    conn = _connect(path)
+    if user is None:
+        cur = conn.execute("SELECT kind, key, interval, next_poll FROM entities ORDER BY kind, key")
+    else:
+        cur = conn.execute(
+            "SELECT e.kind, e.key, e.interval, e.next_poll FROM subscriptions s "
+            "JOIN entities e ON e.kind = s.kind AND e.key = s.key WHERE s.user=? ORDER BY e.kind, e.key",
+            (norm_tag(user),),
+        )
+    rows = [
+        {"kind": r[0], "key": r[1], "interval": r[2], "next_poll": r[3]}
+        for r in cur.fetchall()
+    ]
+    conn.close()
+    return rows
+
+
+def due_entities(now: float | None = None, limit: int = 50, path: str = WATCH_DB) -> List[Dict]:
+    """Return entities whose next poll time has passed, oldest first."""
+    now = time.time() if now is None else now
+    conn = _connect(path)
+    cur = conn.execute(
+        "SELECT kind, key, last_seen, last_value, interval FROM entities "
+        "WHERE next_poll <= ? ORDER BY next_poll LIMIT ?",
+        (now, limit),
+    )
+    rows = [
+        {"kind": r[0], "key": r[1], "last_seen": r[2], "last_value": r[3], "interval": r[4]}
+        for r in cur.fetchall()
+    ]
+    conn.close()
+    return rows
+
+
+def next_interval(interval: float, active: bool) -> float:
+    """Poll active entities at the minimum interval and back off idle ones."""
+    if active:
+        return MIN_INTERVAL
+    return min(MAX_INTERVAL, max(MIN_INTERVAL, interval * BACKOFF))
+
+
+def _poll_player(entity: Dict, fetch: Callable[[str], list], similarity: float) -> Dict:
+    battles = fetch(entity["key"])
+    if not battles:
+        return {"active": False}
+    seen = battles[0].get("battleTime")
+    if seen == entity["last_seen"]:
+        return {"active": False}
+    deck = sorted(_deck_from_battle(battles[0]))
+    prev = json.loads(entity["last_value"]) if entity["last_value"] else []
+    update = {"active": True, "last_seen": seen, "battles": battles}
+    if deck_similarity(deck, prev) < similarity:
+        update["last_value"] = json.dumps(deck)
+        if prev:
+            update["change"] = {"deck": deck, "previous": prev}
+    return update
+
+
+def _poll_channel(entity: Dict, fetch: Callable[[str], Optional[Dict]]) -> Dict:
+    latest = fetch(entity["key"])
+    if not latest or latest.get("videoId") == entity["last_value"]:
+        return {"active": False}
+    update = {"active": True, "last_value": latest.get("videoId")}
+    if entity["last_value"]:
+        update["change"] = video_info(latest)
+    return update
+
+
+def poll_due(
+    now: float | None = None,
+    path: str = WATCH_DB,
+    limit: int = 50,
+    workers: int = 4,
+    similarity: float = 0.75,
+    fetch_battlelog: Callable[[str], list] = get_battlelog,
+    fetch_video: Callable[[str], Optional[Dict]] = fetch_latest_video,
+    matrix=None,
+) -> int:
+    """Poll every due entity concurrently and return the number of new changes.
+
+    The first poll of an entity only records a baseline; changes are
+    published from the second poll on. New battles of watched players are
+    counted in `matrix` (a `matchups.MatchupMatrix`) when one is given.
+    """
+    now = time.time() if now is None else now
+    entities = due_entities(now, limit=limit, path=path)
+    if not entities:
+        return 0
+
+    def poll(entity: Dict) -> Dict:
+        try:
+            with lane(WATCHLIST):
+                if entity["kind"] == PLAYER:
+                    return _poll_player(entity, fetch_battlelog, similarity)
+                return _poll_channel(entity, fetch_video)
+        except Exception:
+            return {"active": False}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        updates = list(pool.map(poll, entities))
+
+    conn = _connect(path)
+    cur = conn.cursor()
+    changes = 0
+    for entity, update in zip(entities, updates):
+        interval = next_interval(entity["interval"] or MIN_INTERVAL, update["active"])
+        cur.execute(
+            "UPDATE entities SET last_seen=?, last_value=?, interval=?, next_poll=? WHERE kind=? AND key=?",
+            (
+                update.get("last_seen", entity["last_seen"]),
+                update.get("last_value", entity["last_value"]),
+                interval,
+                now + interval,
+                entity["kind"],
+                entity["key"],
+            ),
+        )
+        if "change" in update:
+            cur.execute(
+                "INSERT INTO changes (kind, key, payload, created) VALUES (?,?,?,?)",
+                (entity["kind"], entity["key"], json.dumps(update["change"]), now),
+            )
+            changes += 1
+    conn.commit()
+    conn.close()
+    if matrix is not None:
+        for update in updates:
+            if update.get("battles"):
+                matrix.add_battles(update["battles"])
+    return changes
+
+
+def recent_changes(
+    since_id: int = 0, limit: int = 50, user: Optional[str] = None, path: str = WATCH_DB
+) -> List[Dict]:
+    """Return the newest feed entries after `since_id` (of `user`'s subscriptions); never touches the network."""
+    conn = _connect(path)
+    if user is None:
+        cur = conn.execute(
+            "SELECT id, kind, key, payload, created FROM changes WHERE id > ? ORDER BY id DESC LIMIT ?",
+            (since_id, limit),
+        )
+    else:
+        cur = conn.execute(
+            "SELECT c.id, c.kind, c.key, c.payload, c.created FROM subscriptions s "
+            "JOIN changes c ON c.kind = s.kind AND c.key = s.key WHERE s.user=? AND c.id > ? "
+            "ORDER BY c.id DESC LIMIT ?",
+            (norm_tag(user), since_id, limit),
+        )
+    rows = [
+        {"id": r[0], "kind": r[1], "key": r[2], "created": r[4], **json.loads(r[3])}
+        for r in cur.fetchall()
+    ]
+    conn.close()
+    return rows
+
+
+def run_forever(path: str = WATCH_DB, idle_sleep: float = 30.0) -> None:
+    """Poll due entities until interrupted."""
+    from matchups import get_matrix
+
+    matrix = get_matrix()
+    while True:
+        with profile_job(new_job_id("watchlist_poll"), all_threads=True):
+            poll_due(path=path, matrix=matrix)
+        time.sleep(idle_sleep)
+
+
+if __name__ == "__main__":
+    run_forever()
@@ -0,0 +1,204 @@
+"""Worker process for the `jobqueue` background jobs.
+
+    python worker.py                       # run every job kind until interrupted
+    python worker.py --kinds crawl         # only crawls (e.g. on a separate host)
+    python worker.py --schedule            # also enqueue the periodic watchlist poll, digests and video crawl
+
+Start as many as needed, on any host that shares the job database
+(CRTOOL_JOB_DB) and the data files the jobs use. Each job runs inside a
+profiler job (forced on or off by a `profile` payload flag) and in the
+request scheduler lane of its kind, and its lease is renewed while it runs.
+"""
+import argparse
+import os
+import threading
+import time
+import traceback
+from typing import Callable, Dict, Iterable, Optional
+
+import jobqueue
+from profiler import new_job_id, profile_job
+from scheduler import CRAWL, WATCHLIST, lane
+
+WATCHLIST_PERIOD = 30.0
+# hourly, but each run only refreshes tags without a digest younger than digest.MAX_AGE
+DIGEST_PERIOD = 3600.0
+VIDEO_INDEX_PERIOD = 3600.0
+# scheduling workers delete jobs finished more than JOB_RETENTION seconds ago
+PURGE_PERIOD = 3600.0
+JOB_RETENTION = 2 * 86400.0
+
+
+def _optimize(payload: Dict) -> Dict:
+    from analysis import compute_deck_rating
+    from deck_optimizer import smart_swap
+
+    card_data = payload.get("card_data")
+    if card_data is None:
+        from clash_api import get_cards
+
+        card_data = get_cards()
+    pool = payload.get("pool") or [c["name"] for c in card_data]
+    if payload.get("objective") == "meta":
+        from matchups import get_matrix, meta_fitness
+
+        matrix = get_matrix()
+        matrix.sync()
+        fitness = meta_fitness(matrix)
+    else:
+        fitness = lambda d: compute_deck_rating(d, card_data)["score"]
+    return {"suggestions": smart_swap(payload["cards"], pool, fitness, generations=int(payload.get("generations", 3)))}
+
+
+def _upgrades(payload: Dict) -> Dict:
+    from deck_optimizer import upgrade_optimizer
+
+    return {"upgrades": upgrade_optimizer(payload["levels"], payload["costs"], int(payload["gold"]))}
+
+
+def _watchlist_poll(payload: Dict) -> Dict:
+    import watchlist
+    from matchups import get_matrix
+
+    return {"changes": watchlist.poll_due(limit=int(payload.get("limit", 50)), matrix=get_matrix())}
+
+
+def _digests(payload: Dict) -> Dict:
+    from digest import MAX_AGE, generate_digests
+
+    digests = generate_digests(
+        payload.get("tags"), workers=int(payload.get("workers", 4)), max_age=float(payload.get("max_age", MAX_AGE))
+    )
+    return {"digests": len(digests)}
+
+
+def _video_index(payload: Dict) -> Dict:
+    from meta import PRO_CHANNELS
+    from video_index import crawl_once
+
+    return {"added": crawl_once(payload.get("channels") or sorted(PRO_CHANNELS))}
+
+
+def _crawl(payload: Dict) -> Dict:
+    from crawler import crawl
+
+    return crawl(board=payload.get("board", "rankings/players"), max_pages=payload.get("max_pages"))
+
+
+def _archives(payload: Dict) -> Dict:
+    import matchups
+    import synergy
+
+    path = os.getenv("CRTOOL_SYNERGY_FILE", synergy.SYNERGY_PATH)
+    index = synergy.get_index(path)
+    result = {"matchups": matchups.ingest_archives(), "synergy": synergy.ingest_archives(index)}
+    index.save(path)
+    return result
+
+
+# job kind -> handler taking the payload and returning a JSON-serializable result
+HANDLERS: Dict[str, Callable[[Dict], object]] = {
+    "optimize": _optimize,
+    "upgrades": _upgrades,
+    "watchlist_poll": _watchlist_poll,
+    "digests": _digests,
+    "video_index": _video_index,
+    "crawl": _crawl,
+    "archives": _archives,
+}
+
+# scheduler lane for a job kind's upstream requests (default: watchlist)
+LANES = {"crawl": CRAWL}
+
+
+def run_job(job: Dict, worker_id: str, lease: float = jobqueue.LEASE, path: str = jobqueue.JOB_DB) -> bool:
+    """Run one claimed job, renewing its lease meanwhile; True when it completed."""
+    handler = HANDLERS.get(job["kind"])
+    if handler is None:
+        return jobqueue.fail(job["id"], worker_id, f"no handler for job kind {job['kind']!r}", path=path)
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(lease / 3):
+            if not jobqueue.heartbeat(job["id"], worker_id, lease, path=path):
+                return
+
+    renewer = threading.Thread(target=renew, daemon=True)
+    renewer.start()
+    try:
+        with lane(LANES.get(job["kind"], WATCHLIST)):
+            with profile_job(new_job_id(job["kind"]), enabled=job["payload"].get("profile")) as prof:
+                result = handler(job["payload"])
+        if prof is not None and isinstance(result, dict):
+            result["profile"] = {"path": prof.path, "samples": prof.samples}
+    except Exception:
+        jobqueue.fail(job["id"], worker_id, traceback.format_exc(limit=5), path=path)
+        return False
+    finally:
+        stop.set()
+        renewer.join()
+    return jobqueue.complete(job["id"], worker_id, result, path=path)
+
+
+def work_once(
+    worker_id: str,
+    kinds: Optional[Iterable[str]] = None,
+    lease: float = jobqueue.LEASE,
+    path: str = jobqueue.JOB_DB,
+) -> bool:
+    """Claim and run one ready job; False when there was none."""
+    job = jobqueue.claim(worker_id, kinds, lease=lease, path=path)
+    if job is None:
+        return False
+    run_job(job, worker_id, lease, path)
+    return True
+
+
+def run_inline(job_id: int, path: str = jobqueue.JOB_DB) -> Optional[Dict]:
+    """Run one specific job in this process (when no worker is running) and return it."""
+    worker_id = f"inline-{jobqueue.new_worker_id()}"
+    job = jobqueue.claim(worker_id, job_id=job_id, path=path)
+    if job is not None:
+        run_job(job, worker_id, path=path)
+    return jobqueue.get_job(job_id, path=path)
+
+
+def run_forever(
+    kinds: Optional[Iterable[str]] = None,
+    schedule: bool = False,
+    idle_sleep: float = 2.0,
+    path: str = jobqueue.JOB_DB,
+) -> None:
+    """Pull and run jobs until interrupted."""
+    worker_id = jobqueue.new_worker_id()
+    kinds = list(kinds) if kinds else None
+    last_seen = last_purge = 0.0
+    while True:
+        now = time.time()
+        if now - last_seen > jobqueue.WORKER_TTL / 3:
+            jobqueue.register_worker(worker_id, kinds, path=path)
+            last_seen = now
+        if schedule:
+            # one poll per period however many workers schedule it
+            jobqueue.enqueue("watchlist_poll", key=f"watchlist_poll:{int(now // WATCHLIST_PERIOD)}", path=path)
+            jobqueue.enqueue("digests", key=f"digests:{int(now // DIGEST_PERIOD)}", path=path)
+            jobqueue.enqueue("video_index", key=f"video_index:{int(now // VIDEO_INDEX_PERIOD)}", path=path)
+            if now - last_purge > PURGE_PERIOD:
+                # the periodic jobs above add thousands of rows a day
+                jobqueue.purge(JOB_RETENTION, path=path)
+                last_purge = now
+        if not work_once(worker_id, kinds, path=path):
+            time.sleep(idle_sleep)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run background jobs from the job queue")
+    parser.add_argument("--kinds", nargs="*", choices=sorted(HANDLERS), help="job kinds to take (default: all)")
+    parser.add_argument("--schedule", action="store_true", help="enqueue the periodic watchlist poll, daily digests and video index crawl")
+    parser.add_argument("--db", default=jobqueue.JOB_DB, help="job database path")
+    args = parser.parse_args(argv)
+    run_forever(args.kinds, args.schedule, path=args.db)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,230 @@
+import asyncio
+import hashlib
+import json
 import os
+import sqlite3
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from instrument import count, observe
 
 
 DEFAULT_INVIDIOUS = "https://yewtu.be"
 
+CACHE_PATH = "video_cache.db"
+CACHE_TTL = 6 * 3600
 
-def search_videos(query: str, max_results: int = 5, base_url: str | None = None) -> list:
-    """Return a list of video dicts using the Invidious API."""
-    base = base_url or os.getenv("INVIDIOUS_BASE", DEFAULT_INVIDIOUS)
-    params = {
-        "q": query,
-        "type": "video",
-    }
-    resp = requests.get(f"{base}/api/v1/search", params=params, timeout=10)
-    resp.raise_for_status()
-    items = resp.json()[:max_results]
+
+def get_instances() -> List[str]:
+    """Return Invidious instances from INVIDIOUS_INSTANCES (comma separated) or INVIDIOUS_BASE."""
+    raw = os.getenv("INVIDIOUS_INSTANCES", "")
+    instances = [i.strip().rstrip("/") for i in raw.split(",") if i.strip()]
+    return instances or [os.getenv("INVIDIOUS_BASE", DEFAULT_INVIDIOUS)]
+
+
+def _parse_results(items: list, max_results: int) -> list:
     results = []
     for it in items:
+        if len(results) >= max_results:
+            break
         vid = it.get("videoId")
         if not vid:
             continue
-        title = it.get("title", "")
-        channel_id = it.get("authorId", "")
         results.append(
             {
-                "title": title,
+                "title": it.get("title", ""),
                 "url": f"https://www.youtube.com/watch?v={vid}",
-                "channelId": channel_id,
+                "channelId": it.get("authorId", ""),
+                "videoId": vid,
+                "published": it.get("published", 0),
             }
         )
     return results
+
+
+class QueryCache:
+    """On-disk TTL cache of parsed Invidious responses."""
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, created REAL)")
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def key(*parts) -> str:
+        return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+    def get(self, key: str):
+        conn = sqlite3.connect(self.path, timeout=30)
+        row = conn.execute("SELECT value, created FROM cache WHERE key=?", (key,)).fetchone()
+        conn.close()
+        if row is None or time.time() - row[1] > self.ttl:
+            count("crtool_cache_requests_total", cache="video", result="miss")
+            return None
+        count("crtool_cache_requests_total", cache="video", result="hit")
+        return json.loads(row[0])
+
+    def put(self, key: str, value) -> None:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, created) VALUES (?,?,?)",
+            (key, json.dumps(value), time.time()),
+        )
+        conn.commit()
+        conn.close()
+
+
+class InstanceHealth:
+    """Exponentially weighted success rate and latency of one instance."""
+
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = alpha
+        self.success = 1.0
+        self.latency = 1.0
+
+    def record(self, ok: bool, latency: float) -> None:
+        a = self.alpha
+        self.success = (1 - a) * self.success + a * (1.0 if ok else 0.0)
+        self.latency = (1 - a) * self.latency + a * latency
+
+    @property
+    def score(self) -> float:
+        return self.success / (0.1 + self.latency)
+
+
+class VideoSearchClient:
+    """Async Invidious client with hedged requests and a query cache.
+
+    Requests go to the healthiest instance first; if it has not answered
+    after `hedge_delay` seconds the next instance is queried in parallel
+    and the first good response wins.
+    """
+
+    def __init__(
+        self,
+        instances: Optional[List[str]] = None,
+        cache: Optional[QueryCache] = None,
+        hedge_delay: float = 0.5,
+        timeout: float = 10,
+    ):
+        self.instances = instances or get_instances()
+        self.cache = cache
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+        self.health: Dict[str, InstanceHealth] = {i: InstanceHealth() for i in self.instances}
+
+    def ranked_instances(self) -> List[str]:
+        return sorted(self.instances, key=lambda i: self.health[i].score, reverse=True)
+
+    def _fetch(self, base: str, path: str, params: Optional[Dict]):
+        start = time.perf_counter()
+        endpoint = path.split("/")[3] if path.count("/") >= 3 else path
+        try:
+            resp = requests.get(f"{base}{path}", params=params, timeout=self.timeout)
+            resp.raise_for_status()
+            data = resp.json()
+        except Exception:
+            self.health[base].record(False, time.perf_counter() - start)
+            count("crtool_api_requests_total", api="invidious", endpoint=endpoint, status="error")
+            raise
+        elapsed = time.perf_counter() - start
+        self.health[base].record(True, elapsed)
+        count("crtool_api_requests_total", api="invidious", endpoint=endpoint, status="ok")
+        observe("crtool_api_request_seconds", elapsed, api="invidious", endpoint=endpoint)
+        return data
+
+    async def get_json(self, path: str, params: Optional[Dict] = None):
+        """Return the first successful response across instances."""
+        pending = set()
+        error: Optional[Exception] = None
+        for base in self.ranked_instances():
+            pending.add(asyncio.ensure_future(asyncio.to_thread(self._fetch, base, path, params)))
+            done, pending = await asyncio.wait(
+                pending, timeout=self.hedge_delay, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    for p in pending:
+                        p.cancel()
+                    return task.result()
+                error = task.exception()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for p in pending:
+                        p.cancel()
+                    return task.result()
+                error = task.exception()
+        raise error or RuntimeError("no Invidious instance configured")
+
+    async def _cached(self, key: str, path: str, params: Optional[Dict], parse):
+        if self.cache is not None:
+            hit = self.cache.get(key)
+            if hit is not None:
+                return hit
+        result = parse(await self.get_json(path, params))
+        if self.cache is not None:
+            self.cache.put(key, result)
+        return result
+
+    async def search(self, query: str, max_results: int = 5) -> list:
+        key = QueryCache.key("search", query.strip().lower(), max_results)
+        params = {"q": query, "type": "video"}
+        return await self._cached(key, "/api/v1/search", params, lambda items: _parse_results(items, max_results))
+
+    async def channel_latest(self, channel_id: str, max_results: int = 30) -> list:
+        def parse(items):
+            if isinstance(items, dict):
+                items = items.get("videos", [])
+            return [dict(v, channelId=v.get("channelId") or channel_id) for v in _parse_results(items, max_results)]
+
+        key = QueryCache.key("latest", channel_id, max_results)
+        return await self._cached(key, f"/api/v1/channels/{channel_id}/latest", None, parse)
+
+
+_client: Optional[VideoSearchClient] = None
+
+
+def get_client() -> VideoSearchClient:
+    """Return the shared client for the configured instances."""
+    global _client
+    if _client is None or _client.instances != get_instances():
+        _client = VideoSearchClient(cache=QueryCache())
+    return _client
+
+
+def _run_sync(coro):
+    """Run `coro` to completion from synchronous code.
+
+    `asyncio.run` refuses to start inside a running event loop (Jupyter,
+    async web handlers), so there the coroutine gets its own loop on a
+    helper thread while the caller blocks as usual.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+
+def search_videos(query: str, max_results: int = 5, base_url: str | None = None) -> list:
+    """Return a list of video dicts using the Invidious API.
+
+    Without `base_url` the shared cached, hedged client is used.
+    """
+    if base_url is None:
+        return _run_sync(get_client().search(query, max_results=max_results))
+    params = {
+        "q": query,
+        "type": "video",
+    }
+    resp = requests.get(f"{base_url}/api/v1/search", params=params, timeout=10)
+    resp.raise_for_status()
+    return _parse_results(resp.json(), max_results)